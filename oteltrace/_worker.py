@@ -15,11 +15,25 @@
 import atexit
 import threading
 import os
+import weakref
 
+from .internal import forksafe
 from .internal.logger import get_logger
 
 _LOG = get_logger(__name__)
 
+# DEV: a weak set, so that the exit hook does not keep the discarded workers alive
+_WORKERS = weakref.WeakSet()
+
+
+@atexit.register
+def _atexit():
+    for worker in list(_WORKERS):
+        try:
+            worker._atexit()
+        except Exception:
+            _LOG.debug('error while stopping %r at exit', worker, exc_info=True)
+
 
 class PeriodicWorkerThread(object):
     """Periodic worker thread.
@@ -30,6 +44,8 @@ class PeriodicWorkerThread(object):
     The method `on_shutdown` will be called on worker shutdown. The worker will be shutdown when the program exits and
     can be waited for with the `exit_timeout` parameter.
 
+    A worker running when the process forks is started again in the child process.
+
     """
 
     _DEFAULT_INTERVAL = 1.0
@@ -48,7 +64,23 @@ class PeriodicWorkerThread(object):
         self._stop = threading.Event()
         self.interval = interval
         self.exit_timeout = exit_timeout
-        atexit.register(self._atexit)
+        _WORKERS.add(self)
+        forksafe.register(self)
+
+    def _after_fork(self):
+        """Create the thread of the worker again in a forked process, and start it if it was running."""
+        # DEV: only the thread which forked exists in the child, the events may have been copied
+        # while another thread held their lock
+        started = self._thread.ident is not None
+        stopped = self._stop.is_set()
+        thread = self._thread
+        self._thread = threading.Thread(target=self._target, name=thread.name)
+        self._thread.daemon = thread.daemon
+        self._stop = threading.Event()
+        if stopped:
+            self._stop.set()
+        elif started:
+            self.start()
 
     def _atexit(self):
         self.stop()
@@ -12,12 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+# stdlib
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 # project
+from .internal.export import ExportPipeline, EXPORT_SUCCESS, EXPORT_RETRY, EXPORT_DROP
 from .internal.logger import get_logger
 
 # opentelemetry
 from opentelemetry import trace as trace_api
-from opentelemetry.sdk import trace
+from opentelemetry.sdk.trace.export import SpanExportResult
 
 log = get_logger(__name__)
 
@@ -39,15 +46,48 @@ class Response(object):
 class APIOtel(object):
     """
     Export data to OpenTelemetry using an SDK exporter
+
+    The exporter is called on a pool of background threads so that a slow
+    backend does not block the writer, see :class:`oteltrace.internal.export.ExportPipeline`.
     """
 
-    def __init__(self, exporter):
+    def __init__(self, exporter, workers=2, max_in_flight=4, max_retries=3, retry_buffer_size=16,
+                 submit_timeout=None):
+        """
+        :param exporter: OpenTelemetry SDK span exporter.
+        :param int workers: number of threads calling the exporter.
+        :param int max_in_flight: maximum number of batches waiting to be exported before
+            ``send_traces()`` blocks.
+        :param int max_retries: maximum number of times a batch failing with a retryable error is
+            exported again.
+        :param int retry_buffer_size: maximum number of failed batches kept for retry.
+        :param float submit_timeout: maximum time in seconds ``send_traces()`` waits for a free slot
+            before dropping the batch, ``None`` waits forever.
+        """
         self._exporter = exporter
+        self._submit_timeout = submit_timeout
+        self._pipeline = ExportPipeline(
+            self._export,
+            workers=workers,
+            max_in_flight=max_in_flight,
+            max_retries=max_retries,
+            retry_buffer_size=retry_buffer_size,
+            name='APIOtelExporter',
+        )
+
+    @property
+    def pipeline(self):
+        """The :class:`oteltrace.internal.export.ExportPipeline` exporting the spans."""
+        return self._pipeline
 
-    def send_traces(self, traces):
+    def send_traces(self, traces, done=None):
         """Send traces to the API.
 
+        The spans are exported asynchronously, this only blocks when too many
+        batches are already waiting to be exported.
+
         :param traces: A list of traces.
+        :param done: function called without argument once the spans are exported or dropped.
         :return: The list of API HTTP responses.
         """
         responses = []
@@ -56,65 +96,156 @@ class APIOtel(object):
         for tr in traces:
             for span in tr:
                 spans.append(self._span_to_otel_span(span))
-        self._exporter.export(spans)
+        if spans:
+            self._pipeline.submit(spans, timeout=self._submit_timeout, done=done)
+        elif done is not None:
+            done()
         return responses
 
+    def flush(self, timeout=None):
+        """Wait for the spans sent so far to be exported."""
+        return self._pipeline.flush(timeout)
+
+    def shutdown(self, timeout=None):
+        """Export the pending spans and stop the export threads."""
+        return self._pipeline.shutdown(timeout)
+
+    def _export(self, spans):
+        result = self._exporter.export(spans)
+        if result == SpanExportResult.FAILED_RETRYABLE:
+            return EXPORT_RETRY
+        elif result == SpanExportResult.FAILED_NOT_RETRYABLE:
+            return EXPORT_DROP
+        # DEV: some exporters do not return any result
+        return EXPORT_SUCCESS
+
     def _span_to_otel_span(self, span):
-        # create out-of-band span (it would be better to create a SpanView)
+        return SpanView(span)
 
-        # context for current span
-        context = trace_api.SpanContext(
-            trace_id=span.trace_id, span_id=span.span_id
-        )
 
-        # parent (if one is set)
-        parent = None
-        if span.parent_id is not None:
-            parent = trace_api.SpanContext(
-                trace_id=span.trace_id, span_id=span.parent_id
-            )
+# Tags renamed when exported to OpenTelemetry
+_TAG_TO_ATTRIBUTE = {
+    'out.host': 'peer.hostname',
+    'out.port': 'peer.port',
+}
+_ATTRIBUTE_TO_TAG = {v: k for k, v in _TAG_TO_ATTRIBUTE.items()}
 
-        # attributes
-        attributes = {}
-        # ddog members to opentelemetry attributes.
+
+class _SpanAttributes(Mapping):
+    """
+    Read-only mapping of the OpenTelemetry attributes of a span, computed from
+    the span members and tags when they are read.
+    """
+    __slots__ = ('_span', )
+
+    def __init__(self, span):
+        self._span = span
+
+    def _members(self):
+        # oteltrace members to opentelemetry attributes.
         # https://github.com/DataDog/dd-trace-py/blob/1f04d0fcfb3974611967004a22882b55db77433e/oteltrace/opentracer/span.py#L113
-        # TODO: use constants
+        span = self._span
+        # TODO(Mauricio): OpenTracing maps to 'span.type', I think
+        # component is the right one for OpenTelemetry
         if span.span_type is not None:
-            # TODO(Mauricio): OpenTracing maps to 'span.type', I think
-            # component is the right one for OpenTelemetry
-            attributes['component'] = span.span_type
-
+            yield 'component', span.span_type
         if span.service is not None:
-            attributes['service.name'] = span.service
-
+            yield 'service.name', span.service
         if span.resource is not None:
-            attributes['resource.name'] = span.resource
-
-        if span.context.sampling_priority is not None:
-            attributes['sampling.priority'] = span.context.sampling_priority
-
-        # tags
-        for tag in span.meta.items():
-            key = tag[0]
-            value = tag[1]
-
-            if key == 'out.host':
-                key = 'peer.hostname'
-            elif key == 'out.port':
-                key = 'peer.port'
-
-            attributes[key] = value
-
-        # build span with all that info
-        otel_span = trace.Span(
-            name=span.name,
-            context=context,
-            parent=parent,
-            attributes=attributes
-            # TODO: attributes, events? links?
-        )
-
-        otel_span.start_time = int(span.start * 10**9)
-        otel_span.end_time = int((span.start + span.duration) * 10**9)
+            yield 'resource.name', span.resource
+        context = span.context
+        if context is not None and context.sampling_priority is not None:
+            yield 'sampling.priority', context.sampling_priority
+
+    def __getitem__(self, key):
+        span = self._span
+        # tags have precedence over the span members, renamed tags are only reachable by their new name
+        tag = _ATTRIBUTE_TO_TAG.get(key)
+        if tag is not None:
+            value = span.get_tag(tag)
+            if value is not None:
+                return value
+        if key not in _TAG_TO_ATTRIBUTE:
+            value = span.get_tag(key)
+            if value is not None:
+                return value
+        for name, value in self._members():
+            if name == key:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        span = self._span
+        for name, _ in self._members():
+            if span.get_tag(name) is None:
+                yield name
+        for tag, _ in span._meta_items():
+            if tag in _TAG_TO_ATTRIBUTE:
+                yield _TAG_TO_ATTRIBUTE[tag]
+            elif span.get_tag(_ATTRIBUTE_TO_TAG.get(tag)) is None:
+                yield tag
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class SpanView(object):
+    """
+    Read-only view of a :class:`oteltrace.span.Span` exposing the interface
+    of :class:`opentelemetry.sdk.trace.Span` read by the SDK exporters.
 
-        return otel_span
+    Nothing is copied when the view is created: the span contexts and the
+    attributes are built from the underlying span when the exporter reads them.
+    """
+    __slots__ = ('_span', )
+
+    kind = trace_api.SpanKind.INTERNAL
+    status = trace_api.Status()
+    resource = None
+    events = ()
+    links = ()
+
+    def __init__(self, span):
+        self._span = span
+
+    @property
+    def name(self):
+        return self._span.name
+
+    @property
+    def context(self):
+        span = self._span
+        return trace_api.SpanContext(trace_id=span.trace_id, span_id=span.span_id)
+
+    def get_context(self):
+        return self.context
+
+    @property
+    def parent(self):
+        span = self._span
+        if span.parent_id is None:
+            return None
+        return trace_api.SpanContext(trace_id=span.trace_id, span_id=span.parent_id)
+
+    @property
+    def attributes(self):
+        return _SpanAttributes(self._span)
+
+    @property
+    def start_time(self):
+        return int(self._span.start * 10**9)
+
+    @property
+    def end_time(self):
+        span = self._span
+        return int((span.start + (span.duration or 0)) * 10**9)
+
+    @staticmethod
+    def is_recording_events():
+        return False
+
+    def __repr__(self):
+        return '{}(name="{}", context={})'.format(type(self).__name__, self.name, self.context)
@@ -26,6 +26,7 @@ import importlib
 from oteltrace.propagation.datadog import DatadogHTTPPropagator
 from oteltrace.propagation.w3c import W3CHTTPPropagator
 from oteltrace.propagation.b3 import B3HTTPPropagator
+from oteltrace.propagation.composite import CompositeHTTPPropagator
 
 from oteltrace import api_otel_exporter
 
@@ -148,9 +149,22 @@ OTEL_TRACER_PROPAGATOR_MAP = {
 
 
 def get_http_propagator_factory():
-    """Returns an http propagator factory based on set env variables"""
+    """Returns an http propagator factory based on set env variables
+
+    ``OTEL_TRACER_PROPAGATOR`` may list several comma-separated formats by
+    decreasing priority, e.g. ``w3c,b3,datadog``: they are all extracted and
+    injected by a single ``CompositeHTTPPropagator``.
+    """
     prop = os.getenv(OTEL_TRACER_PROPAGATOR, OTEL_TRACER_PROPAGATOR_DEFAULT)
-    return OTEL_TRACER_PROPAGATOR_MAP[prop.lower()]
+    factories = [OTEL_TRACER_PROPAGATOR_MAP[name.strip().lower()] for name in prop.split(',') if name.strip()]
+    if not factories:
+        return OTEL_TRACER_PROPAGATOR_MAP[OTEL_TRACER_PROPAGATOR_DEFAULT]
+    if len(factories) == 1:
+        return factories[0]
+
+    # DEV: propagators are stateless, share the composite instead of building it for every request
+    propagator = CompositeHTTPPropagator([factory() for factory in factories])
+    return lambda: propagator
 
 
 try:
@@ -176,9 +190,24 @@ try:
 
     opts['http_propagator'] = get_http_propagator_factory()
 
+    flush_max_spans = os.environ.get('OPENTELEMETRY_FLUSH_MAX_SPANS')
+    flush_max_bytes = os.environ.get('OPENTELEMETRY_FLUSH_MAX_BYTES')
+    flush_max_age = os.environ.get('OPENTELEMETRY_FLUSH_MAX_AGE')
+    if flush_max_spans:
+        opts['flush_max_spans'] = int(flush_max_spans)
+    if flush_max_bytes:
+        opts['flush_max_bytes'] = int(flush_max_bytes)
+    if flush_max_age:
+        opts['flush_max_age'] = float(flush_max_age)
+
     if opts:
         tracer.configure(**opts)
 
+    # Export the traces of all the processes using the same relay path from one of them
+    if asbool(get_env('trace_relay', 'enabled')):
+        from oteltrace.internal.relay import DEFAULT_PATH, Relay
+        relay = Relay(tracer, get_env('trace_relay', 'path', DEFAULT_PATH))
+
     if logs_injection:
         EXTRA_PATCHED_MODULES.update({'logging': True})
 
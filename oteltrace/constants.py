@@ -14,6 +14,7 @@
 
 FILTERS_KEY = 'FILTERS'
 SAMPLE_RATE_METRIC_KEY = '_sample_rate'
+TAIL_SAMPLE_RATE_METRIC_KEY = '_otel.tail_sr'
 SAMPLING_PRIORITY_KEY = '_sampling_priority_v1'
 ANALYTICS_SAMPLE_RATE_KEY = '_otel1.sr.eausr'
 SAMPLING_AGENT_DECISION = '_otel.agent_psr'
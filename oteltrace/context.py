@@ -13,16 +13,65 @@
 # limitations under the License.
 
 import logging
+import operator
 import threading
+import time
 
 from .constants import HOSTNAME_KEY, SAMPLING_PRIORITY_KEY, ORIGIN_KEY
 from .internal.logger import get_logger
 from .internal import hostname
 from .settings import config
 from .utils.formats import asbool, get_env
+from .vendor.six.moves._thread import get_ident
 
 log = get_logger(__name__)
 
+_seq = operator.itemgetter(0)
+
+
+class PartialFlushPolicy(object):
+    """
+    Conditions triggering the flush of the finished spans of a trace which is
+    not finished yet, checked every time a span of the trace finishes.
+
+    The finished spans are flushed when any of the enabled thresholds is
+    reached, a threshold set to ``0`` or ``None`` is disabled.
+    """
+    __slots__ = ('enabled', 'min_spans', 'max_bytes', 'max_age')
+
+    def __init__(self, enabled=False, min_spans=500, max_bytes=None, max_age=None):
+        """
+        :param bool enabled: whether partial flush is enabled.
+        :param int min_spans: flush when at least this number of spans are finished.
+        :param int max_bytes: flush when the finished spans are estimated to use at least this many
+            bytes, see ``Span._estimate_size()``.
+        :param float max_age: flush when the oldest finished span finished at least this number of
+            seconds ago.
+        """
+        self.enabled = enabled
+        self.min_spans = min_spans
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def __repr__(self):
+        return '{}(enabled={!r}, min_spans={!r}, max_bytes={!r}, max_age={!r})'.format(
+            self.__class__.__name__, self.enabled, self.min_spans, self.max_bytes, self.max_age,
+        )
+
+    @classmethod
+    def from_env(cls):
+        """Return the policy configured with the environment variables."""
+        max_age = get_env('tracer', 'partial_flush_max_age')
+        return cls(
+            enabled=asbool(get_env('tracer', 'partial_flush_enabled', 'false')),
+            min_spans=int(get_env('tracer', 'partial_flush_min_spans', 500)),
+            max_bytes=int(get_env('tracer', 'partial_flush_max_bytes', 0)),
+            max_age=float(max_age) if max_age else None,
+        )
+
+
+_default_partial_flush = PartialFlushPolicy.from_env()
+
 
 class Context(object):
     """
@@ -37,10 +86,20 @@ class Context(object):
     generates the job itself. On the other hand, if it's part of the same
     ``Context``, it will be related to the original trace.
 
-    This data structure is thread-safe.
+    This data structure is thread-safe. In the common case every span of a
+    trace is created and closed by the thread that created the context: this
+    thread owns the context and updates it without taking the lock. The first
+    time another thread updates the context, for instance when a trace is
+    continued in a ``concurrent.futures`` executor, the context switches to a
+    shared mode where every update takes the lock. Tasks of an event loop
+    running in the owner thread never interleave within an update and don't
+    need the lock.
     """
-    _partial_flush_enabled = asbool(get_env('tracer', 'partial_flush_enabled', 'false'))
-    _partial_flush_min_spans = int(get_env('tracer', 'partial_flush_min_spans', 500))
+    # partial flush settings used by ``get()`` when no ``PartialFlushPolicy`` is given
+    _partial_flush_enabled = _default_partial_flush.enabled
+    _partial_flush_min_spans = _default_partial_flush.min_spans
+    _partial_flush_max_bytes = _default_partial_flush.max_bytes
+    _partial_flush_max_age = _default_partial_flush.max_age
 
     def __init__(self, trace_id=None, span_id=None, sampling_priority=None, _otel_origin=None):
         """
@@ -49,59 +108,121 @@ class Context(object):
         :param int trace_id: trace_id of parent span
         :param int span_id: span_id of parent span
         """
-        self._trace = []
-        self._finished_spans = 0
+        # span id of the spans which are not finished -> their creation sequence number and the span
+        # DEV: a dictionary rather than a list, so that closing a span or flushing the finished ones
+        # doesn't scan the open spans. Spans are identified by their id, a span may be closed through a
+        # proxy object and spans which define `__eq__` are not hashable
+        self._open = {}
+        # spans which are finished and not flushed yet, in the order they were closed, and their
+        # creation sequence numbers
+        self._finished = []
+        self._finished_seqs = []
+        # sequence number of the next span added to the context
+        self._next_seq = 0
+        # first span of the trace which is not flushed yet
+        self._root = None
+        # estimated size of the first ``_finished_sized`` spans of ``_finished``
+        self._finished_size = 0
+        self._finished_sized = 0
+        # whether a span of the trace is sampled
+        self._sampled = False
         self._current_span = None
         self._lock = threading.Lock()
+        # thread updating the context without the lock, ``None`` once the context is shared
+        self._owner = get_ident()
+        # whether the owner thread is updating the context without the lock
+        self._busy = False
 
         self._parent_trace_id = trace_id
         self._parent_span_id = span_id
         self._sampling_priority = sampling_priority
         self._otel_origin = _otel_origin
 
+    # DEV: the update methods follow the same pattern, inlined for performance:
+    #
+    #     if self._owner == get_ident():
+    #         self._busy = True
+    #         if self._owner is not None:
+    #             <update>
+    #             self._busy = False
+    #             return
+    #         self._busy = False
+    #     self._share()
+    #     with self._lock:
+    #         <update>
+    #
+    # The owner thread flags itself busy before checking that it still owns the context, while
+    # `_share()` clears the owner before waiting for the owner thread not to be busy: either the
+    # owner sees that the context is shared and takes the lock, or `_share()` waits for the
+    # update of the owner to be over. Once shared, a context never goes back to the owned mode.
+
+    def _share(self):
+        """Switch the context to the shared mode, waiting for the owner thread to finish its update."""
+        if self._owner is not None:
+            self._owner = None
+            while self._busy:
+                time.sleep(0)
+
+    # DEV: reading a single attribute is atomic, properties don't need the lock
     @property
     def trace_id(self):
         """Return current context trace_id."""
-        with self._lock:
-            return self._parent_trace_id
+        return self._parent_trace_id
 
     @property
     def span_id(self):
         """Return current context span_id."""
-        with self._lock:
-            return self._parent_span_id
+        return self._parent_span_id
 
     @property
     def sampling_priority(self):
         """Return current context sampling priority."""
-        with self._lock:
-            return self._sampling_priority
+        return self._sampling_priority
 
     @sampling_priority.setter
     def sampling_priority(self, value):
         """Set sampling priority."""
-        with self._lock:
-            self._sampling_priority = value
+        # DEV: setting a single attribute is atomic as well
+        self._sampling_priority = value
 
     def clone(self):
         """
         Partially clones the current context.
         It copies everything EXCEPT the registered and finished spans.
         """
+        if self._owner == get_ident():
+            self._busy = True
+            if self._owner is not None:
+                new_ctx = self._clone()
+                self._busy = False
+                return new_ctx
+            self._busy = False
+        self._share()
         with self._lock:
-            new_ctx = Context(
-                trace_id=self._parent_trace_id,
-                span_id=self._parent_span_id,
-                sampling_priority=self._sampling_priority,
-            )
-            new_ctx._current_span = self._current_span
-            return new_ctx
+            return self._clone()
+
+    def _clone(self):
+        new_ctx = Context(
+            trace_id=self._parent_trace_id,
+            span_id=self._parent_span_id,
+            sampling_priority=self._sampling_priority,
+        )
+        new_ctx._current_span = self._current_span
+        return new_ctx
+
+    @property
+    def _trace(self):
+        """Spans of the context which are not flushed yet, in the order they were added."""
+        spans = list(self._open.values())
+        spans.extend(zip(self._finished_seqs, self._finished))
+        spans.sort(key=lambda item: item[0])
+        return [span for _, span in spans]
 
     def get_current_root_span(self):
         """
         Return the root span of the context or None if it does not exist.
         """
-        return self._trace[0] if len(self._trace) > 0 else None
+        return self._root
 
     def get_current_span(self):
         """
@@ -110,8 +231,7 @@ class Context(object):
         span in asynchronous environments, because some spans can be closed
         earlier while child spans still need to finish their traced execution.
         """
-        with self._lock:
-            return self._current_span
+        return self._current_span
 
     def _set_current_span(self, span):
         """
@@ -130,101 +250,188 @@ class Context(object):
         """
         Add a span to the context trace list, keeping it as the last active span.
         """
+        if self._owner == get_ident():
+            self._busy = True
+            if self._owner is not None:
+                self._add_span(span)
+                self._busy = False
+                return
+            self._busy = False
+        self._share()
         with self._lock:
-            self._set_current_span(span)
-
-            self._trace.append(span)
-            span._context = self
+            self._add_span(span)
+
+    def _add_span(self, span):
+        self._set_current_span(span)
+        self._open[span.span_id] = (self._next_seq, span)
+        self._next_seq += 1
+        if self._root is None:
+            self._root = span
+        if span.sampled:
+            self._sampled = True
+        span._context = self
 
     def close_span(self, span):
         """
         Mark a span as a finished, increasing the internal counter to prevent
         cycles inside _trace list.
         """
-        with self._lock:
-            self._finished_spans += 1
-            self._set_current_span(span._parent)
-
-            # notify if the trace is not closed properly; this check is executed only
-            # if the debug logging is enabled and when the root span is closed
-            # for an unfinished trace. This logging is meant to be used for debugging
-            # reasons, and it doesn't mean that the trace is wrongly generated.
-            # In asynchronous environments, it's legit to close the root span before
-            # some children. On the other hand, asynchronous web frameworks still expect
-            # to close the root span after all the children.
-            if span.tracer and span.tracer.log.isEnabledFor(logging.DEBUG) and span._parent is None:
-                unfinished_spans = [x for x in self._trace if not x.finished]
-                if unfinished_spans:
-                    log.debug('Root span "%s" closed, but the trace has %d unfinished spans:',
-                              span.name, len(unfinished_spans))
-                    for wrong_span in unfinished_spans:
-                        log.debug('\n%s', wrong_span.pprint())
-
-    def _is_sampled(self):
-        return any(span.sampled for span in self._trace)
-
-    def get(self):
+        owned = False
+        if self._owner == get_ident():
+            self._busy = True
+            owned = self._owner is not None
+            if owned:
+                self._close_span(span)
+            self._busy = False
+        if not owned:
+            self._share()
+            with self._lock:
+                self._close_span(span)
+
+        # notify if the trace is not closed properly; this check is executed only
+        # if the debug logging is enabled and when the root span is closed
+        # for an unfinished trace. This logging is meant to be used for debugging
+        # reasons, and it doesn't mean that the trace is wrongly generated.
+        # In asynchronous environments, it's legit to close the root span before
+        # some children. On the other hand, asynchronous web frameworks still expect
+        # to close the root span after all the children.
+        if span.tracer and span.tracer.log.isEnabledFor(logging.DEBUG) and span._parent is None:
+            unfinished_spans = [x for _, x in sorted(list(self._open.values()), key=_seq)]
+            if unfinished_spans:
+                log.debug('Root span "%s" closed, but the trace has %d unfinished spans:',
+                          span.name, len(unfinished_spans))
+                for wrong_span in unfinished_spans:
+                    log.debug('\n%s', wrong_span.pprint())
+
+    def _close_span(self, span):
+        item = self._open.pop(span.span_id, None)
+        if item is None:
+            # not added to this context, or closed twice
+            seq = self._next_seq
+            self._next_seq += 1
+        else:
+            seq = item[0]
+        self._finished.append(span)
+        self._finished_seqs.append(seq)
+        self._set_current_span(span._parent)
+
+    def _pop_finished(self):
+        """Remove and return the finished spans, in the order they were added."""
+        finished, seqs = self._finished, self._finished_seqs
+        self._finished = []
+        self._finished_seqs = []
+        self._finished_size = self._finished_sized = 0
+        if len(finished) > 1:
+            # DEV: spans are mostly closed in the reverse order of their creation, the sort is linear then
+            finished = [finished[i] for i in sorted(range(len(seqs)), key=seqs.__getitem__)]
+        return finished
+
+    def get(self, partial_flush=None):
         """
         Returns a tuple containing the trace list generated in the current context and
         if the context is sampled or not. It returns (None, None) if the ``Context`` is
         not finished. If a trace is returned, the ``Context`` will be reset so that it
         can be re-used immediately.
 
+        If the trace is not finished but the ``partial_flush`` policy is met, the
+        finished spans are returned and removed from the context.
+
         This operation is thread-safe.
+
+        :param PartialFlushPolicy partial_flush: partial flush policy, defaults to the
+            policy configured with the environment variables.
         """
+        if self._owner == get_ident():
+            self._busy = True
+            if self._owner is not None:
+                try:
+                    return self._get(partial_flush)
+                finally:
+                    self._busy = False
+            self._busy = False
+        self._share()
         with self._lock:
-            # All spans are finished?
-            if self._finished_spans == len(self._trace):
-                # get the trace
-                trace = self._trace
-                sampled = self._is_sampled()
-                sampling_priority = self._sampling_priority
-                # attach the sampling priority to the context root span
-                if sampled and sampling_priority is not None and trace:
-                    trace[0].set_metric(SAMPLING_PRIORITY_KEY, sampling_priority)
-                origin = self._otel_origin
-                # attach the origin to the root span tag
-                if sampled and origin is not None and trace:
-                    trace[0].set_tag(ORIGIN_KEY, origin)
-
-                # Set hostname tag if they requested it
-                if config.report_hostname:
-                    # DEV: `get_hostname()` value is cached
-                    trace[0].set_tag(HOSTNAME_KEY, hostname.get_hostname())
-
-                # clean the current state
-                self._trace = []
-                self._finished_spans = 0
-                self._parent_trace_id = None
-                self._parent_span_id = None
-                self._sampling_priority = None
-                return trace, sampled
-
-            elif self._partial_flush_enabled:
-                finished_spans = [t for t in self._trace if t.finished]
-                if len(finished_spans) >= self._partial_flush_min_spans:
-                    # partial flush when enabled and we have more than the minimal required spans
-                    trace = self._trace
-                    sampled = self._is_sampled()
-                    sampling_priority = self._sampling_priority
-                    # attach the sampling priority to the context root span
-                    if sampled and sampling_priority is not None and trace:
-                        trace[0].set_metric(SAMPLING_PRIORITY_KEY, sampling_priority)
-                    origin = self._otel_origin
-                    # attach the origin to the root span tag
-                    if sampled and origin is not None and trace:
-                        trace[0].set_tag(ORIGIN_KEY, origin)
-
-                    # Set hostname tag if they requested it
-                    if config.report_hostname:
-                        # DEV: `get_hostname()` value is cached
-                        trace[0].set_tag(HOSTNAME_KEY, hostname.get_hostname())
-
-                    self._finished_spans = 0
-
-                    # Any open spans will remain as `self._trace`
-                    # Any finished spans will get returned to be flushed
-                    self._trace = [t for t in self._trace if not t.finished]
-
-                    return finished_spans, sampled
-            return None, None
+            return self._get(partial_flush)
+
+    def _get(self, partial_flush):
+        # All spans are finished?
+        if not self._open:
+            sampled = self._sampled
+            self._tag_root_span(self._root, sampled)
+            trace = self._pop_finished()
+
+            # clean the current state
+            self._next_seq = 0
+            self._root = None
+            self._sampled = False
+            self._parent_trace_id = None
+            self._parent_span_id = None
+            self._sampling_priority = None
+            return trace, sampled
+
+        elif self._partial_flush_due(self._finished, partial_flush):
+            sampled = self._sampled
+            self._tag_root_span(self._root, sampled)
+
+            # Any open spans will remain in the context
+            # Any finished spans will get returned to be flushed
+            finished = self._pop_finished()
+            if self._root.span_id not in self._open:
+                # DEV: only when the root span finished before some of its children
+                self._root = min(self._open.values(), key=_seq)[1]
+            return finished, sampled
+        return None, None
+
+    def _partial_flush_due(self, finished, policy):
+        if policy is None:
+            if not self._partial_flush_enabled:
+                return False
+            min_spans = self._partial_flush_min_spans
+            max_bytes = self._partial_flush_max_bytes
+            max_age = self._partial_flush_max_age
+        else:
+            if not policy.enabled:
+                return False
+            min_spans = policy.min_spans
+            max_bytes = policy.max_bytes
+            max_age = policy.max_age
+
+        if not finished:
+            return False
+
+        if min_spans and len(finished) >= min_spans:
+            return True
+
+        if max_bytes:
+            # DEV: only the spans finished since the previous call are estimated
+            size = self._finished_size
+            for i in range(self._finished_sized, len(finished)):
+                size += finished[i]._estimate_size()
+            self._finished_size = size
+            self._finished_sized = len(finished)
+            if size >= max_bytes:
+                return True
+
+        if max_age:
+            oldest = finished[0]
+            if time.time() - oldest.start - (oldest.duration or 0) >= max_age:
+                return True
+
+        return False
+
+    def _tag_root_span(self, root, sampled):
+        if root is None:
+            return
+        sampling_priority = self._sampling_priority
+        # attach the sampling priority to the context root span
+        if sampled and sampling_priority is not None:
+            root.set_metric(SAMPLING_PRIORITY_KEY, sampling_priority)
+        origin = self._otel_origin
+        # attach the origin to the root span tag
+        if sampled and origin is not None:
+            root.set_tag(ORIGIN_KEY, origin)
+
+        # Set hostname tag if they requested it
+        if config.report_hostname:
+            # DEV: `get_hostname()` value is cached
+            root.set_tag(HOSTNAME_KEY, hostname.get_hostname())
@@ -42,6 +42,7 @@ class TracePlugin(object):
             if not self.tracer or not self.tracer.enabled:
                 return callback(*args, **kwargs)
 
+            integration_config = config.bottle.snapshot()
             resource = '{} {}'.format(request.method, route.rule)
 
             # Propagate headers such as x-datadog-trace-id.
@@ -55,7 +56,7 @@ class TracePlugin(object):
                 # set analytics sample rate with global config enabled
                 s.set_tag(
                     ANALYTICS_SAMPLE_RATE_KEY,
-                    config.bottle.get_analytics_sample_rate(use_global_config=True)
+                    integration_config.get_analytics_sample_rate(use_global_config=True)
                 )
 
                 code = 0
@@ -79,7 +80,7 @@ class TracePlugin(object):
                     s.set_tag(http.STATUS_CODE, response_code)
                     s.set_tag(http.URL, request.urlparts._replace(query='').geturl())
                     s.set_tag(http.METHOD, request.method)
-                    if config.bottle.trace_query_string:
+                    if integration_config.trace_query_string:
                         s.set_tag(http.QUERY_STRING, request.query_string)
 
         return wrapped
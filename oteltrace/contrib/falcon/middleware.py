@@ -32,6 +32,7 @@ class TraceMiddleware(object):
         self._distributed_tracing = distributed_tracing
 
     def process_request(self, req, resp):
+        integration_config = config.falcon.snapshot()
         if self._distributed_tracing:
             # Falcon uppercases all header names.
             headers = dict((k.lower(), v) for k, v in iteritems(req.headers))
@@ -50,16 +51,16 @@ class TraceMiddleware(object):
         # set analytics sample rate with global config enabled
         span.set_tag(
             ANALYTICS_SAMPLE_RATE_KEY,
-            config.falcon.get_analytics_sample_rate(use_global_config=True)
+            integration_config.get_analytics_sample_rate(use_global_config=True)
         )
 
         span.set_tag(httpx.METHOD, req.method)
         span.set_tag(httpx.URL, req.url)
-        if config.falcon.trace_query_string:
+        if integration_config.trace_query_string:
             span.set_tag(httpx.QUERY_STRING, req.query_string)
 
         # Note: any request header set after this line will not be stored in the span
-        store_request_headers(req.headers, span, config.falcon)
+        store_request_headers(req.headers, span, integration_config)
 
     def process_resource(self, req, resp, resource, params):
         span = self.tracer.current_span()
@@ -74,10 +75,11 @@ class TraceMiddleware(object):
         if not span:
             return  # unexpected
 
+        integration_config = config.falcon.snapshot()
         status = httpx.normalize_status_code(resp.status)
 
         # Note: any response header set after this line will not be stored in the span
-        store_response_headers(resp._headers, span, config.falcon)
+        store_response_headers(resp._headers, span, integration_config)
 
         # FIXME[matt] falcon does not map errors or unmatched routes
         # to proper status codes, so we we have to try to infer them
@@ -105,7 +107,7 @@ class TraceMiddleware(object):
 
         # Emit span hook for this response
         # DEV: Emit before closing so they can overwrite `span.resource` if they want
-        config.falcon.hooks._emit('request', span, req, resp)
+        integration_config.hooks._emit('request', span, req, resp)
 
         # Close the span
         span.finish()
@@ -285,9 +285,10 @@ def traced_wsgi_app(pin, wrapped, instance, args, kwargs):
     # Create a werkzeug request from the `environ` to make interacting with it easier
     # DEV: This executes before a request context is created
     request = werkzeug.Request(environ)
+    integration_config = config.flask.snapshot()
 
     # Configure distributed tracing
-    if config.flask.get('distributed_tracing_enabled', False):
+    if integration_config.get('distributed_tracing_enabled', False):
         propagator = HTTPPropagator()
         context = propagator.extract(request.headers)
         # Only need to activate the new context if something was propagated
@@ -303,7 +304,7 @@ def traced_wsgi_app(pin, wrapped, instance, args, kwargs):
         # set analytics sample rate with global config enabled
         s.set_tag(
             ANALYTICS_SAMPLE_RATE_KEY,
-            config.flask.get_analytics_sample_rate(use_global_config=True)
+            integration_config.get_analytics_sample_rate(use_global_config=True)
         )
 
         s.set_tag(FLASK_VERSION, flask_version_str)
@@ -333,7 +334,7 @@ def traced_wsgi_app(pin, wrapped, instance, args, kwargs):
                 s.set_tag(http.STATUS_CODE, code)
                 if 500 <= code < 600:
                     s.error = 1
-                elif code in config.flask.get('extra_error_codes', set()):
+                elif code in integration_config.get('extra_error_codes', set()):
                     s.error = 1
                 return func(status_code, headers)
             return traced_start_response
@@ -343,7 +344,7 @@ def traced_wsgi_app(pin, wrapped, instance, args, kwargs):
         # DEV: Use `request.base_url` and not `request.url` to keep from leaking any query string parameters
         s.set_tag(http.URL, request.base_url)
         s.set_tag(http.METHOD, request.method)
-        if config.flask.trace_query_string:
+        if integration_config.trace_query_string:
             s.set_tag(http.QUERY_STRING, compat.to_unicode(request.query_string))
 
         return wrapped(environ, start_response)
@@ -89,8 +89,10 @@ def patch_app_call(wrapped, instance, args, kwargs):
     request = molten.http.Request.from_environ(environ)
     resource = func_name(wrapped)
 
+    integration_config = config.molten.snapshot()
+
     # Configure distributed tracing
-    if config.molten.get('distributed_tracing', True):
+    if integration_config.get('distributed_tracing', True):
         propagator = HTTPPropagator()
         # request.headers is type Iterable[Tuple[str, str]]
         context = propagator.extract(dict(request.headers))
@@ -102,7 +104,7 @@ def patch_app_call(wrapped, instance, args, kwargs):
         # set analytics sample rate with global config enabled
         span.set_tag(
             ANALYTICS_SAMPLE_RATE_KEY,
-            config.molten.get_analytics_sample_rate(use_global_config=True)
+            integration_config.get_analytics_sample_rate(use_global_config=True)
         )
 
         @wrapt.function_wrapper
@@ -140,7 +142,7 @@ def patch_app_call(wrapped, instance, args, kwargs):
         span.set_tag(http.URL, '%s://%s:%s%s' % (
             request.scheme, request.host, request.port, request.path,
         ))
-        if config.molten.trace_query_string:
+        if integration_config.trace_query_string:
             span.set_tag(http.QUERY_STRING, urlencode(dict(request.params)))
         span.set_tag('molten.version', molten.__version__)
         return wrapped(environ, start_response, **kwargs)
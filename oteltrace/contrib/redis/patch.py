@@ -77,6 +77,10 @@ def traced_execute_command(func, instance, args, kwargs):
         return func(*args, **kwargs)
 
     with pin.tracer.trace(redisx.CMD, service=pin.service, span_type=redisx.TYPE) as s:
+        # the trace is dropped, don't format the command
+        if not s.is_recording:
+            return func(*args, **kwargs)
+
         query = format_command_args(args)
         s.resource = query
         s.set_tag(redisx.RAWCMD, query)
@@ -106,11 +110,16 @@ def traced_execute_pipeline(func, instance, args, kwargs):
     if not pin or not pin.enabled():
         return func(*args, **kwargs)
 
-    # FIXME[matt] done in the agent. worth it?
-    cmds = [format_command_args(c) for c, _ in instance.command_stack]
-    resource = '\n'.join(cmds)
     tracer = pin.tracer
-    with tracer.trace(redisx.CMD, resource=resource, service=pin.service) as s:
+    with tracer.trace(redisx.CMD, service=pin.service) as s:
+        # the trace is dropped, don't format the commands
+        if not s.is_recording:
+            return func(*args, **kwargs)
+
+        # FIXME[matt] done in the agent. worth it?
+        cmds = [format_command_args(c) for c, _ in instance.command_stack]
+        resource = '\n'.join(cmds)
+        s.resource = resource
         s.span_type = redisx.TYPE
         s.set_tag(redisx.RAWCMD, resource)
         s.set_tags(_get_tags(instance))
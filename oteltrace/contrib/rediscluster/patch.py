@@ -57,10 +57,15 @@ def traced_execute_pipeline(func, instance, args, kwargs):
     if not pin or not pin.enabled():
         return func(*args, **kwargs)
 
-    cmds = [format_command_args(c.args) for c in instance.command_stack]
-    resource = '\n'.join(cmds)
     tracer = pin.tracer
-    with tracer.trace(redisx.CMD, resource=resource, service=pin.service) as s:
+    with tracer.trace(redisx.CMD, service=pin.service) as s:
+        # the trace is dropped, don't format the commands
+        if not s.is_recording:
+            return func(*args, **kwargs)
+
+        cmds = [format_command_args(c.args) for c in instance.command_stack]
+        resource = '\n'.join(cmds)
+        s.resource = resource
         s.span_type = redisx.TYPE
         s.set_tag(redisx.RAWCMD, resource)
         s.set_metric(redisx.PIPELINE_LEN, len(instance.command_stack))
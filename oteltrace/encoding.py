@@ -0,0 +1,309 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Columnar encoding of a batch of traces.
+
+:func:`encode_traces` turns the traces flushed by the writer into a
+:class:`SpanBatch` in a single pass: the numeric fields of every span are
+written into ``array`` columns and the strings (service, name, resource, span
+type, tag keys and values) are replaced by indexes into a table where each
+distinct string is stored once.
+
+A batch can be serialized with :meth:`SpanBatch.to_bytes` and loaded back
+without copying the columns with :meth:`SpanBatch.from_bytes`. The columns use
+the native byte order, the serialized form is meant to be read on the same
+host.
+
+The batch is only used to hand the traces over to the relay process: it is
+smaller than the pickled spans, not faster to build than the per-span export
+of the writer, which does not use it.
+"""
+import array
+import operator
+import struct
+from itertools import chain, repeat
+
+from .compat import to_unicode
+from .internal.intern import intern_string
+from .span import Span
+
+_MAGIC = b'OTB1'
+# magic, number of spans, traces, strings, tags and metrics
+_HEADER = struct.Struct('<4sIIIII')
+_STRING_LENGTH = struct.Struct('<i')
+_MASK_64 = (1 << 64) - 1
+
+# columns in serialization order, with the typecode of their array
+_SPAN_COLUMNS = (
+    ('trace_ids', 'Q'),
+    ('trace_ids_high', 'Q'),
+    ('span_ids', 'Q'),
+    ('parent_ids', 'Q'),
+    ('starts', 'd'),
+    ('durations', 'd'),
+    ('errors', 'B'),
+    ('services', 'I'),
+    ('names', 'I'),
+    ('resources', 'I'),
+    ('span_types', 'I'),
+    ('meta_counts', 'I'),
+    ('metric_counts', 'I'),
+)
+_TRACE_COLUMNS = (
+    ('trace_lengths', 'I'),
+)
+_META_COLUMNS = (
+    ('meta_keys', 'I'),
+    ('meta_values', 'I'),
+)
+_METRIC_COLUMNS = (
+    ('metric_keys', 'I'),
+    ('metric_values', 'd'),
+)
+
+
+class SpanBatch(object):
+    """
+    Columnar representation of a list of traces.
+
+    The span at position ``i`` of the batch is described by the ``i``-th item
+    of every span column, e.g. ``trace_ids[i]``, ``starts[i]`` or
+    ``strings[names[i]]``. ``trace_ids`` holds the lower 64 bits of the trace
+    ids and ``trace_ids_high`` the upper 64 bits of 128 bits trace ids, ``0``
+    otherwise. Parent ids of root spans are ``0``, times are in
+    seconds like on the spans. Its tags are the next ``meta_counts[i]`` items of
+    ``meta_keys``/``meta_values`` and its metrics the next ``metric_counts[i]``
+    items of ``metric_keys``/``metric_values``.
+    """
+    __slots__ = tuple(name for name, _ in _SPAN_COLUMNS + _TRACE_COLUMNS + _META_COLUMNS + _METRIC_COLUMNS) + (
+        'strings',
+    )
+
+    def __init__(self):
+        for name, typecode in _SPAN_COLUMNS + _TRACE_COLUMNS + _META_COLUMNS + _METRIC_COLUMNS:
+            setattr(self, name, array.array(typecode))
+        self.strings = [None]
+
+    def __len__(self):
+        return len(self.trace_ids)
+
+    @property
+    def nbytes(self):
+        """Size in bytes of the serialized batch."""
+        size = _HEADER.size + _STRING_LENGTH.size * len(self.strings)
+        for name, _ in _SPAN_COLUMNS + _TRACE_COLUMNS + _META_COLUMNS + _METRIC_COLUMNS:
+            column = getattr(self, name)
+            size += len(column) * column.itemsize
+        for string in self.strings:
+            if string is not None:
+                size += len(to_unicode(string).encode('utf-8'))
+        return size
+
+    def iter_dicts(self):
+        """Yield every span of the batch as the dictionary returned by ``Span.to_dict()``."""
+        strings = self.strings
+        meta_offset = metric_offset = 0
+        for i in range(len(self)):
+            d = {
+                'trace_id': self.trace_ids_high[i] << 64 | self.trace_ids[i],
+                'parent_id': self.parent_ids[i] or None,
+                'span_id': self.span_ids[i],
+                'service': strings[self.services[i]],
+                'resource': strings[self.resources[i]],
+                'name': strings[self.names[i]],
+                'error': self.errors[i],
+            }
+            if self.starts[i]:
+                d['start'] = int(self.starts[i] * 1e9)  # ns
+            if self.durations[i]:
+                d['duration'] = int(self.durations[i] * 1e9)  # ns
+
+            meta_count = self.meta_counts[i]
+            if meta_count:
+                d['meta'] = {
+                    strings[self.meta_keys[j]]: strings[self.meta_values[j]]
+                    for j in range(meta_offset, meta_offset + meta_count)
+                }
+                meta_offset += meta_count
+
+            metric_count = self.metric_counts[i]
+            if metric_count:
+                d['metrics'] = {
+                    strings[self.metric_keys[j]]: self.metric_values[j]
+                    for j in range(metric_offset, metric_offset + metric_count)
+                }
+                metric_offset += metric_count
+
+            if self.span_types[i]:
+                d['type'] = strings[self.span_types[i]]
+            yield d
+
+    def traces(self):
+        """Return the traces of the batch as lists of finished :class:`oteltrace.span.Span`."""
+        traces = []
+        spans = enumerate(self.iter_dicts())
+        for length in self.trace_lengths:
+            trace = []
+            for _ in range(length):
+                i, d = next(spans)
+                span = Span(
+                    None,
+                    d['name'],
+                    service=d['service'],
+                    resource=d['resource'],
+                    span_type=d.get('type'),
+                    trace_id=d['trace_id'],
+                    span_id=d['span_id'],
+                    parent_id=d['parent_id'],
+                    start=self.starts[i],
+                )
+                span.duration = self.durations[i]
+                span.error = d['error']
+                span.meta.update(d.get('meta', ()))
+                span.metrics.update(d.get('metrics', ()))
+                span.finished = True
+                trace.append(span)
+            traces.append(trace)
+        return traces
+
+    def to_bytes(self):
+        """Serialize the batch."""
+        chunks = [_HEADER.pack(
+            _MAGIC, len(self), len(self.trace_lengths), len(self.strings), len(self.meta_keys), len(self.metric_keys),
+        )]
+        for name, _ in _SPAN_COLUMNS + _TRACE_COLUMNS + _META_COLUMNS + _METRIC_COLUMNS:
+            chunks.append(memoryview(getattr(self, name)).tobytes())
+        for string in self.strings:
+            if string is None:
+                chunks.append(_STRING_LENGTH.pack(-1))
+            else:
+                data = to_unicode(string).encode('utf-8')
+                chunks.append(_STRING_LENGTH.pack(len(data)))
+                chunks.append(data)
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a batch serialized with :meth:`to_bytes`, the columns are memoryviews over ``data``.
+
+        The decoded strings are interned, so that batches loaded over and over share the same strings.
+        """
+        view = memoryview(data)
+        magic, n_spans, n_traces, n_strings, n_meta, n_metrics = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            raise ValueError('not a serialized span batch')
+
+        batch = cls.__new__(cls)
+        offset = _HEADER.size
+        for columns, count in (
+            (_SPAN_COLUMNS, n_spans), (_TRACE_COLUMNS, n_traces), (_META_COLUMNS, n_meta), (_METRIC_COLUMNS, n_metrics),
+        ):
+            for name, typecode in columns:
+                size = count * array.array(typecode).itemsize
+                setattr(batch, name, view[offset:offset + size].cast(typecode))
+                offset += size
+
+        strings = []
+        for _ in range(n_strings):
+            length, = _STRING_LENGTH.unpack_from(view, offset)
+            offset += _STRING_LENGTH.size
+            if length < 0:
+                strings.append(None)
+            else:
+                strings.append(intern_string(view[offset:offset + length].tobytes().decode('utf-8')))
+                offset += length
+        batch.strings = strings
+        return batch
+
+
+def encode_traces(traces):
+    """Encode a list of traces into a :class:`SpanBatch`."""
+    batch = SpanBatch()
+    spans = [span for trace in traces for span in trace]
+    batch.trace_lengths.extend(map(len, traces))
+
+    # DEV: each column is built at once from an iterator over the spans: `map()`, `attrgetter()`
+    # and `array.extend()` run the loops in C, which is much faster than appending every value
+    # of every span from Python code
+    trace_ids = list(map(_trace_id, spans))
+    try:
+        batch.trace_ids.extend(trace_ids)
+        batch.trace_ids_high.extend(repeat(0, len(spans)))
+    except OverflowError:
+        # 128 bits trace ids
+        del batch.trace_ids[:]
+        batch.trace_ids.extend(map(operator.and_, trace_ids, repeat(_MASK_64)))
+        batch.trace_ids_high.extend(map(operator.rshift, trace_ids, repeat(64)))
+    batch.span_ids.extend(map(_span_id, spans))
+    batch.parent_ids.extend([span.parent_id or 0 for span in spans])
+    batch.starts.extend(map(_start, spans))
+    batch.durations.extend([span.duration or 0 for span in spans])
+    batch.errors.extend(map(bool, map(_error, spans)))
+
+    metas = _flat_tags(map(_meta, spans))
+    metrics = _flat_tags(map(_metrics, spans))
+    batch.meta_counts.extend(map(operator.floordiv, map(len, metas), repeat(2)))
+    batch.metric_counts.extend(map(operator.floordiv, map(len, metrics), repeat(2)))
+
+    # intern every string of the batch
+    services = list(map(_service, spans))
+    names = list(map(_name, spans))
+    resources = list(map(_resource, spans))
+    span_types = list(map(_span_type, spans))
+    meta_items = list(chain.from_iterable(metas))
+    meta_keys = meta_items[::2]
+    meta_values = meta_items[1::2]
+    metric_items = list(chain.from_iterable(metrics))
+    metric_keys = metric_items[::2]
+
+    unique = set(chain(services, names, resources, span_types, meta_keys, meta_values, metric_keys))
+    unique.discard(None)
+    strings = [None]
+    strings.extend(unique)
+    index = {string: i for i, string in enumerate(strings)}.__getitem__
+
+    batch.services.extend(map(index, services))
+    batch.names.extend(map(index, names))
+    batch.resources.extend(map(index, resources))
+    batch.span_types.extend(map(index, span_types))
+    batch.meta_keys.extend(map(index, meta_keys))
+    batch.meta_values.extend(map(index, meta_values))
+    batch.metric_keys.extend(map(index, metric_keys))
+    batch.metric_values.extend(metric_items[1::2])
+
+    batch.strings = strings
+    return batch
+
+
+_trace_id = operator.attrgetter('trace_id')
+_span_id = operator.attrgetter('span_id')
+_start = operator.attrgetter('start')
+_error = operator.attrgetter('error')
+# DEV: read the tags of the spans as they are stored, without converting them to dictionaries,
+# see `Span.set_tag()`
+_meta = operator.attrgetter('_meta')
+_metrics = operator.attrgetter('_metrics')
+_service = operator.attrgetter('service')
+_name = operator.attrgetter('name')
+_resource = operator.attrgetter('resource')
+_span_type = operator.attrgetter('span_type')
+
+
+def _flat_tags(tags):
+    """Return the tags of every span as flat ``(key, value, ...)`` tuples, see ``Span.set_tag()``."""
+    tags = list(tags)
+    if dict in set(map(type, tags)):
+        tags = [t if type(t) is tuple else tuple(chain.from_iterable(t.items())) for t in tags]
+    return tags
@@ -18,6 +18,38 @@ import re
 from .ext import http
 
 
+class PerTraceFilter(object):
+    """Adapter applying a filter which only implements ``process_trace()`` to a batch of traces."""
+    __slots__ = ('filter', )
+
+    def __init__(self, filtr):
+        self.filter = filtr
+
+    def process_traces(self, traces):
+        process_trace = self.filter.process_trace
+        filtered_traces = []
+        for trace in traces:
+            trace = process_trace(trace)
+            if trace is not None:
+                filtered_traces.append(trace)
+        return filtered_traces
+
+
+def batch_filter(filtr):
+    """
+    Return an object implementing ``process_traces(traces)`` for the given
+    filter: the filter itself when it implements it, a :class:`PerTraceFilter`
+    calling its ``process_trace(trace)`` method otherwise.
+
+    ``process_traces`` is called by the writer once per flush with the list
+    of flushed traces, and returns the list of the traces to keep, which is
+    fed to the next filter.
+    """
+    if hasattr(filtr, 'process_traces'):
+        return filtr
+    return PerTraceFilter(filtr)
+
+
 class FilterRequestsOnUrl(object):
     """Filter out traces from incoming http requests based on the request's url.
     This class takes as argument a list of regular expression patterns
@@ -44,10 +76,39 @@ class FilterRequestsOnUrl(object):
         FilterRequestOnUrl([r'http://test\\.example\\.com', r'http://example\\.com/healthcheck'])
     """
 
+    # maximum number of urls whose decision is cached, the cache is cleared when it is full
+    CACHE_SIZE = 1024
+
     def __init__(self, regexps):
         if isinstance(regexps, str):
             regexps = [regexps]
         self._regexps = [re.compile(regexp) for regexp in regexps]
+        self._match = _combine(self._regexps)
+        self._cache = {}
+
+    def _is_filtered(self, url):
+        cache = self._cache
+        try:
+            return cache[url]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable tag value
+            return self._match(url)
+
+        filtered = self._match(url)
+        if len(cache) >= self.CACHE_SIZE:
+            cache.clear()
+        cache[url] = filtered
+        return filtered
+
+    def _keep(self, trace):
+        for span in trace:
+            if span.parent_id is None:
+                url = span.get_tag(http.URL)
+                if url is not None and self._is_filtered(url):
+                    return False
+        return True
 
     def process_trace(self, trace):
         """
@@ -56,10 +117,35 @@ class FilterRequestsOnUrl(object):
         be fed to the next filter in the list. If process_trace returns None,
         the whole trace is discarded.
         """
-        for span in trace:
-            if span.parent_id is None and span.get_tag(http.URL) is not None:
-                url = span.get_tag(http.URL)
-                for regexp in self._regexps:
-                    if regexp.match(url):
-                        return None
-        return trace
+        return trace if self._keep(trace) else None
+
+    def process_traces(self, traces):
+        """Return the traces which are not filtered out, see :func:`batch_filter`."""
+        return list(filter(self._keep, traces))
+
+
+# backreferences are numbered from the start of the pattern, they can't be combined with other patterns
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def _combine(regexps):
+    """Return a function telling whether a string matches one of the given compiled regular expressions."""
+    if not regexps:
+        return lambda string: False
+
+    # DEV: one regular expression with an alternative for every pattern is much faster than
+    # trying the patterns one by one. Inline flags (e.g. `(?i)`) would apply to the whole combined
+    # expression, these patterns are tried one by one.
+    default_flags = re.compile('').flags
+    if all(
+        regexp.flags == default_flags and isinstance(regexp.pattern, str) and not _BACKREFERENCE.search(regexp.pattern)
+        for regexp in regexps
+    ):
+        try:
+            match = re.compile('|'.join('(?:{})'.format(regexp.pattern) for regexp in regexps)).match
+        except re.error:
+            pass
+        else:
+            return lambda string: match(string) is not None
+
+    return lambda string: any(regexp.match(string) for regexp in regexps)
@@ -54,6 +54,53 @@ def store_response_headers(headers, span, integration_config):
     _store_headers(headers, span, integration_config, RESPONSE)
 
 
+class HeaderCapturePlan(object):
+    """
+    Compiled whitelist of the headers stored as tags of a span: maps the names
+    of the headers, as spelled in the headers objects, to the name of their
+    tag, or to ``None`` for the headers which are not traced.
+
+    The tag name of every spelling of a header name is computed the first time
+    it is seen, storing headers then takes one dictionary lookup by header.
+    """
+    # maximum number of header name spellings cached, the cache is cleared when it is full
+    # DEV: header names are controlled by the clients, don't let them grow the cache forever
+    CACHE_SIZE = 1024
+
+    __slots__ = ('whitelist', 'request_or_response', 'tag_names')
+
+    def __init__(self, whitelist, request_or_response):
+        """
+        :param whitelist: normalized names of the traced headers, see `normalize_header_name()`.
+        :param str request_or_response: context of the headers: request|response
+        """
+        self.whitelist = frozenset(whitelist)
+        self.request_or_response = request_or_response
+        # header name as spelled in the headers objects -> tag name, or None
+        self.tag_names = {}
+
+    def __repr__(self):
+        return '{}({!r}, {!r})'.format(self.__class__.__name__, sorted(self.whitelist), self.request_or_response)
+
+    def add(self, header_name):
+        """Cache and return the tag name of ``header_name``, ``None`` if it is not traced."""
+        try:
+            normalized_name = normalize_header_name(header_name)
+        except AttributeError:
+            # not a string
+            normalized_name = None
+
+        tag_name = None
+        if normalized_name in self.whitelist:
+            tag_name = _normalize_tag_name(self.request_or_response, header_name)
+
+        tag_names = self.tag_names
+        if len(tag_names) >= self.CACHE_SIZE:
+            tag_names.clear()
+        tag_names[header_name] = tag_name
+        return tag_name
+
+
 def _store_headers(headers, span, integration_config, request_or_response):
     """
     :param headers: A dict of http headers to be stored in the span
@@ -63,21 +110,42 @@ def _store_headers(headers, span, integration_config, request_or_response):
     :param integration_config: An integration specific config object.
     :type integration_config: oteltrace.settings.IntegrationConfig
     """
-    if not isinstance(headers, dict):
-        try:
-            headers = dict(headers)
-        except Exception:
-            return
-
     if integration_config is None:
         log.debug('Skipping headers tracing as no integration config was provided')
         return
 
-    for header_name, header_value in headers.items():
-        if not integration_config.header_is_traced(header_name):
-            continue
-        tag_name = _normalize_tag_name(request_or_response, header_name)
-        span.set_tag(tag_name, header_value)
+    plan = integration_config._header_capture_plan(request_or_response)
+    if not headers or not plan.whitelist:
+        return
+
+    # DEV: headers objects of frameworks (multi-dicts, environ based headers...) are read without being
+    # copied to a dict, but like with a dict the last value of a repeated header is stored
+    items = headers.items() if hasattr(headers, 'items') else headers
+    tag_names = plan.tag_names
+    tags = None
+    try:
+        for header_name, header_value in items:
+            try:
+                tag_name = tag_names[header_name]
+            except KeyError:
+                tag_name = plan.add(header_name)
+            except TypeError:
+                # unhashable header name
+                continue
+            if tag_name is None:
+                continue
+
+            if tags is None:
+                tags = {}
+            tags[tag_name] = header_value
+    except (TypeError, ValueError):
+        # DEV: the tags are only set once all the headers were read, malformed headers store nothing
+        log.debug('Skipping headers tracing as headers are not a mapping nor a list of pairs', exc_info=True)
+        return
+
+    if tags is not None:
+        for tag_name, header_value in tags.items():
+            span.set_tag(tag_name, header_value)
 
 
 def _normalize_tag_name(request_or_response, header_name):
@@ -0,0 +1,127 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Generators of trace and span ids.
+
+The generator used by a tracer is selected with
+``tracer.configure(id_generator=...)``::
+
+    from oteltrace import tracer
+    from oteltrace.ids import RandomIdGenerator
+
+    # W3C traceparent compatible trace ids
+    tracer.configure(id_generator=RandomIdGenerator(trace_id_bits=128))
+"""
+import binascii
+import os
+import random
+import threading
+
+from .internal import forksafe
+
+
+class IdGenerator(object):
+    """Base class of the trace and span id generators."""
+
+    def trace_id(self):
+        """Return a new trace id."""
+        raise NotImplementedError
+
+    def span_id(self):
+        """Return a new 64 bits span id."""
+        raise NotImplementedError
+
+
+class SystemRandomIdGenerator(IdGenerator):
+    """
+    Generate ids with ``random.SystemRandom``, reading from ``os.urandom`` for
+    every id.
+    """
+
+    def __init__(self, trace_id_bits=64):
+        """
+        :param int trace_id_bits: size of the trace ids, 64 or 128 bits.
+        """
+        _check_trace_id_bits(trace_id_bits)
+        self.trace_id_bits = trace_id_bits
+        self._random = random.SystemRandom()
+
+    def trace_id(self):
+        return self._random.getrandbits(self.trace_id_bits)
+
+    def span_id(self):
+        return self._random.getrandbits(64)
+
+
+class RandomIdGenerator(IdGenerator):
+    """
+    Generate ids with a pseudo-random generator per thread, seeded from
+    ``os.urandom``.
+
+    This avoids a system call for every id. The generators are seeded again in
+    a forked process so that it never generates the same ids as its parent.
+    """
+
+    def __init__(self, trace_id_bits=64):
+        """
+        :param int trace_id_bits: size of the trace ids, 64 or 128 bits.
+        """
+        _check_trace_id_bits(trace_id_bits)
+        self.trace_id_bits = trace_id_bits
+        self._local = threading.local()
+        self._pid = os.getpid()
+        forksafe.register(self)
+
+    def _seed(self):
+        if _CHECK_PID and self._pid != os.getpid():
+            self._after_fork()
+        seed = int(binascii.hexlify(os.urandom(16)), 16)
+        getrandbits = self._local.getrandbits = random.Random(seed).getrandbits
+        return getrandbits
+
+    def _after_fork(self):
+        # DEV: the thread-local data of the thread that forked the process is copied in the child,
+        # drop it so that every thread seeds a new generator
+        self._pid = os.getpid()
+        self._local = threading.local()
+
+    def trace_id(self):
+        if _CHECK_PID and self._pid != os.getpid():
+            self._after_fork()
+        try:
+            return self._local.getrandbits(self.trace_id_bits)
+        except AttributeError:
+            return self._seed()(self.trace_id_bits)
+
+    def span_id(self):
+        if _CHECK_PID and self._pid != os.getpid():
+            self._after_fork()
+        try:
+            return self._local.getrandbits(64)
+        except AttributeError:
+            return self._seed()(64)
+
+
+def _check_trace_id_bits(trace_id_bits):
+    if trace_id_bits not in (64, 128):
+        raise ValueError('trace ids must be 64 or 128 bits, not {}'.format(trace_id_bits))
+
+
+# DEV: before Python 3.7 there is no fork hook, compare the pid on every call instead
+_CHECK_PID = not forksafe.AT_FORK_SUPPORTED
+
+
+# generator used by default by the tracers and by spans created without an id
+default_id_generator = RandomIdGenerator()
@@ -0,0 +1,258 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import threading
+
+from ..vendor import monotonic
+from ..vendor.six.moves.queue import Queue, Empty
+from . import forksafe
+from .logger import get_logger
+
+log = get_logger(__name__)
+
+# Results returned by the export function given to ``ExportPipeline``
+EXPORT_SUCCESS = 'success'
+EXPORT_RETRY = 'retry'
+EXPORT_DROP = 'drop'
+
+
+class _Batch(object):
+    __slots__ = ('items', 'done', 'attempts', 'retry_at')
+
+    def __init__(self, items, done=None):
+        self.items = items
+        self.done = done
+        self.attempts = 0
+        self.retry_at = None
+
+    def finish(self):
+        """Call the ``done`` callback, once the batch is exported or dropped."""
+        if self.done is not None:
+            try:
+                self.done()
+            except Exception:
+                log.debug('error in the callback of an exported batch', exc_info=True)
+
+
+class ExportPipeline(object):
+    """
+    Export batches on a small pool of worker threads so that the thread
+    submitting them never waits for a slow backend.
+
+    At most ``max_in_flight`` batches can be waiting for or running an export,
+    ``submit()`` blocks while this limit is reached, applying backpressure on
+    the caller. Batches failing with a retryable error (``EXPORT_RETRY`` or an
+    exception) are kept in a retry buffer of ``retry_buffer_size`` batches and
+    exported again after an exponential backoff, up to ``max_retries`` times.
+    On ``shutdown()`` the batches left in the retry buffer get one last attempt,
+    those that still fail or that cannot be attempted before the timeout are
+    counted as dropped.
+    """
+
+    def __init__(self, export, workers=2, max_in_flight=4, max_retries=3, retry_buffer_size=16,
+                 backoff_base=0.1, backoff_max=5.0, name='ExportPipeline'):
+        """
+        :param export: function called with a batch, returning ``EXPORT_SUCCESS``, ``EXPORT_RETRY`` or
+            ``EXPORT_DROP``.
+        :param int workers: number of threads exporting the batches.
+        :param int max_in_flight: maximum number of batches submitted and not exported yet.
+        :param int max_retries: maximum number of times a failed batch is exported again.
+        :param int retry_buffer_size: maximum number of failed batches waiting to be retried, the oldest
+            one is dropped when it is full.
+        :param float backoff_base: delay in seconds before the first retry, doubled at every attempt.
+        :param float backoff_max: maximum delay in seconds between two retries.
+        """
+        self._export = export
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_buffer_size = retry_buffer_size
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._name = name
+        self._reset()
+        forksafe.register(self)
+
+    def _reset(self):
+        self._queue = Queue()
+        self._retry_buffer = collections.deque()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        # protects the counters and the retry buffer, never taken by request threads
+        self._lock = threading.Condition()
+        self._threads = []
+        # set by `shutdown()`, failed batches are not retried anymore
+        self._stopping = False
+
+        self.in_flight = 0
+        self.exported = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def _after_fork(self):
+        # DEV: the worker threads don't exist in a forked process, the batches submitted by the
+        # parent are exported by the parent, the threads are started again by the next `submit()`
+        self._reset()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name='{}-{}'.format(self._name, i))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, items, timeout=None, done=None):
+        """Queue a batch for export, waiting for a free slot if ``max_in_flight`` batches are pending.
+
+        :param float timeout: maximum time in seconds to wait for a free slot, ``None`` waits forever.
+        :param done: function called without argument once the batch is exported or dropped, ``items``
+            are not used by the pipeline anymore when it is called.
+        :return: Whether the batch was queued, it is dropped otherwise.
+        """
+        if not self._threads:
+            self._start()
+
+        # DEV: Python 2 `acquire()` does not support a timeout
+        acquired = self._slots.acquire() if timeout is None else self._slots.acquire(True, timeout)
+        if not acquired:
+            with self._lock:
+                self.dropped += 1
+            log.warning('%s is full, dropping a batch of %d items', self._name, len(items))
+            _Batch(items, done).finish()
+            return False
+
+        with self._lock:
+            self.in_flight += 1
+        self._queue.put(_Batch(items, done))
+        return True
+
+    def _backoff(self, attempts):
+        return min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+
+    def _next_retry(self):
+        """Return the failed batch that is due for retry, or the delay before the next one is due."""
+        with self._lock:
+            if not self._retry_buffer or self._stopping:
+                return None, None
+            batch = self._retry_buffer[0]
+            delay = batch.retry_at - monotonic.monotonic()
+            if delay > 0:
+                return None, delay
+            self._retry_buffer.popleft()
+            self.retries += 1
+            return batch, None
+
+    def _run(self):
+        while True:
+            batch, delay = self._next_retry()
+            retried = batch is not None
+            if batch is None:
+                try:
+                    batch = self._queue.get(timeout=delay)
+                except Empty:
+                    continue
+                if batch is None:
+                    # shutdown sentinel
+                    return
+
+            self._process(batch)
+            if not retried:
+                self._slots.release()
+                with self._lock:
+                    self.in_flight -= 1
+                    self._lock.notify_all()
+
+    def _process(self, batch):
+        batch.attempts += 1
+        try:
+            result = self._export(batch.items)
+        except Exception:
+            log.debug('%s failed to export a batch', self._name, exc_info=True)
+            result = EXPORT_RETRY
+
+        finished = batch
+        with self._lock:
+            if result == EXPORT_SUCCESS:
+                self.exported += 1
+            elif result == EXPORT_RETRY and batch.attempts <= self.max_retries and not self._stopping:
+                finished = None
+                if len(self._retry_buffer) >= self.retry_buffer_size:
+                    finished = self._retry_buffer.popleft()
+                    self.dropped += 1
+                    log.warning('%s retry buffer is full, dropping the oldest failed batch', self._name)
+                batch.retry_at = monotonic.monotonic() + self._backoff(batch.attempts)
+                self._retry_buffer.append(batch)
+            else:
+                self.dropped += 1
+                log.warning('%s failed to export a batch of %d items', self._name, len(batch.items))
+
+        if finished is not None:
+            finished.finish()
+
+    @property
+    def pending_retries(self):
+        """Number of failed batches waiting to be retried."""
+        return len(self._retry_buffer)
+
+    def flush(self, timeout=None):
+        """Wait for every submitted batch to be exported or moved to the retry buffer.
+
+        :return: Whether all the batches were processed before the timeout.
+        """
+        deadline = None if timeout is None else monotonic.monotonic() + timeout
+        with self._lock:
+            while self.in_flight:
+                remaining = None if deadline is None else deadline - monotonic.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=None):
+        """Flush the pending batches, stop the worker threads and export the failed batches one last time.
+
+        :return: Whether all the batches were processed before the timeout.
+        """
+        deadline = None if timeout is None else monotonic.monotonic() + timeout
+        flushed = self.flush(timeout)
+        with self._lock:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            # DEV: a worker may be retrying a batch, wait for it so that it is not attempted twice
+            thread.join(None if deadline is None else max(0, deadline - monotonic.monotonic()))
+
+        while True:
+            with self._lock:
+                if not self._retry_buffer:
+                    return flushed
+                batch = self._retry_buffer.popleft()
+                if deadline is not None and monotonic.monotonic() >= deadline:
+                    leftover = [batch] + list(self._retry_buffer)
+                    self._retry_buffer.clear()
+                    self.dropped += len(leftover)
+                    break
+                self.retries += 1
+            self._process(batch)
+
+        log.warning('%s shut down before retrying %d failed batches, dropping them', self._name, len(leftover))
+        for batch in leftover:
+            batch.finish()
+        return False
@@ -0,0 +1,52 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reset of the state inherited by forked processes.
+
+Objects registered with :func:`register` have their ``_after_fork()`` method
+called in the child process right after a fork, from the thread which forked,
+the only one running in the child.
+
+Before Python 3.7 there is no fork hook: ``AT_FORK_SUPPORTED`` is ``False``
+and registered objects must compare ``os.getpid()`` with the pid they were
+created in, and call ``_after_fork()`` themselves when it changed.
+"""
+import os
+import weakref
+
+from .logger import get_logger
+
+log = get_logger(__name__)
+
+AT_FORK_SUPPORTED = hasattr(os, 'register_at_fork')
+
+_registry = weakref.WeakSet()
+
+
+def register(obj):
+    """Call ``obj._after_fork()`` in the processes forked from now on, as long as ``obj`` is alive."""
+    _registry.add(obj)
+
+
+def _after_fork_in_child():
+    for obj in list(_registry):
+        try:
+            obj._after_fork()
+        except Exception:
+            log.debug('error while resetting %r after fork', obj, exc_info=True)
+
+
+if AT_FORK_SUPPORTED:
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,93 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from ..vendor import six
+
+_STRING_TYPES = (six.binary_type, six.text_type)
+
+
+class InternTable(object):
+    """
+    Bounded table of shared string objects.
+
+    ``intern(s)`` returns the string equal to ``s`` that was interned first, so
+    that spans created with equal service names, operation names, resources or
+    tag keys all reference a single object instead of one copy each. Strings
+    longer than ``max_length`` are never interned.
+
+    The table keeps at most ``maxsize`` strings and approximates a least
+    recently used eviction with two generations: strings are added to the young
+    generation, when it is full it replaces the old generation, dropping the
+    strings that were not used since the previous rotation. A string found in
+    the old generation is moved back to the young one. A lookup of an interned
+    string is a single dictionary access, and the table can be used from
+    several threads without a lock: a lookup racing with a rotation can at
+    worst intern a string twice.
+    """
+    __slots__ = ('maxsize', 'max_length', '_young', '_old')
+
+    MAXSIZE = 4096
+    MAX_LENGTH = 512
+
+    def __init__(self, maxsize=MAXSIZE, max_length=MAX_LENGTH):
+        """
+        :param int maxsize: maximum number of strings kept in the table, ``0`` disables interning.
+        :param int max_length: strings longer than this are returned as is.
+        """
+        self.maxsize = maxsize
+        self.max_length = max_length
+        self._young = {}
+        self._old = {}
+
+    def __len__(self):
+        young = self._young
+        return len(young) + sum(1 for s in self._old if s not in young)
+
+    def __contains__(self, s):
+        return s in self._young or s in self._old
+
+    def intern(self, s):
+        """Return the shared string equal to ``s``, values that are not strings are returned as is."""
+        try:
+            shared = self._young.get(s)
+        except TypeError:
+            # not hashable
+            return s
+        if shared is not None:
+            return shared
+
+        if type(s) not in _STRING_TYPES or len(s) > self.max_length or self.maxsize < 2:
+            return s
+
+        shared = self._old.get(s, s)
+        young = self._young
+        young[shared] = shared
+        if len(young) >= self.maxsize // 2:
+            self._old = young
+            self._young = {}
+        return shared
+
+    def resize(self, maxsize):
+        """Change the maximum number of strings of the table."""
+        self.maxsize = maxsize
+        self.clear()
+
+    def clear(self):
+        self._young = {}
+        self._old = {}
+
+
+# process-wide table used by spans
+strings = InternTable()
+intern_string = strings.intern
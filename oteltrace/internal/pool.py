@@ -0,0 +1,116 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import sys
+import threading
+import weakref
+
+from ..span import Span
+
+# DEV: the pool relies on reference counts to know whether a span is still used, which only
+# exist on CPython
+POOLING_SUPPORTED = hasattr(sys, 'getrefcount')
+
+# references to a span taken out of the free list: the local variable and the argument of `getrefcount()`
+_FREE_REFCOUNT = 2
+
+
+class SpanPool(object):
+    """
+    Pool of exported spans reused for new spans.
+
+    Once the writer has exported a batch of traces, it hands their spans to
+    ``release()``. ``new_span()`` creates spans like the ``Span`` constructor,
+    but reuses a released span when one is available. The pool is only used
+    when enabled with ``Tracer.configure(span_pool_size=...)``.
+
+    A span is only reused when nothing else references it anymore: when it is
+    taken out of the pool, its reference count is checked and spans that are
+    still referenced (for instance by user code, a test or an exporter keeping
+    the spans it exported) or have live weak references are discarded and left
+    to the garbage collector. This relies on the reference counting of
+    CPython: code reading a span after it was exported must hold a reference
+    to the span itself, remembering only its id is not enough. The tags
+    dictionaries of a reused span are replaced, not cleared, so they can be
+    kept without the span.
+
+    Released traces are appended to a shared ``deque``, every thread then
+    moves whole traces to its own free list, so creating a span never takes a
+    lock. The pool holds approximately at most ``maxsize`` spans.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._released = collections.deque()
+        # DEV: approximate number of released spans, updated without lock
+        self._size = 0
+        self._local = threading.local()
+
+    def __len__(self):
+        return self._size
+
+    def release(self, traces):
+        """Give back the spans of traces which were exported."""
+        if not POOLING_SUPPORTED:
+            return
+
+        for trace in traces:
+            if self._size >= self.maxsize:
+                break
+            for span in trace:
+                # DEV: the parent is in the same trace, don't let the spans keep each other alive
+                span._parent = None
+            self._released.append(trace)
+            self._size += len(trace)
+
+    def _free_list(self):
+        try:
+            return self._local.free
+        except AttributeError:
+            free = self._local.free = []
+            return free
+
+    def new_span(self, tracer, name, service=None, resource=None, span_type=None, trace_id=None, span_id=None,
+                 parent_id=None, start=None, context=None):
+        """Return a new span, taken from the pool if possible, see ``Span.__init__`` for the arguments."""
+        free = self._free_list()
+        while True:
+            if not free:
+                try:
+                    trace = self._released.popleft()
+                except IndexError:
+                    break
+                self._size -= len(trace)
+                free.extend(trace)
+                # drop the reference of the trace list to its spans
+                del trace
+
+            span = free.pop()
+            if sys.getrefcount(span) == _FREE_REFCOUNT and not weakref.getweakrefcount(span):
+                span._reuse(tracer, name, service, resource, span_type, trace_id, span_id, parent_id, start, context)
+                return span
+
+        return Span(
+            tracer,
+            name,
+            service=service,
+            resource=resource,
+            span_type=span_type,
+            trace_id=trace_id,
+            span_id=span_id,
+            parent_id=parent_id,
+            start=start,
+            context=context,
+        )
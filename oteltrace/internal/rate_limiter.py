@@ -66,15 +66,14 @@ class RateLimiter(object):
         :returns: Whether the current request is allowed or not
         :rtype: :obj:`bool`
         """
+        now = monotonic.monotonic()
         # Determine if it is allowed
-        allowed = self._is_allowed()
+        allowed = self._is_allowed(now)
         # Update counts used to determine effective rate
-        self._update_rate_counts(allowed)
+        self._update_rate_counts(allowed, now)
         return allowed
 
-    def _update_rate_counts(self, allowed):
-        now = monotonic.monotonic()
-
+    def _update_rate_counts(self, allowed, now):
         # No tokens have been seen yet, start a new window
         if not self.current_window:
             self.current_window = now
@@ -92,7 +91,7 @@ class RateLimiter(object):
             self.tokens_allowed += 1
         self.tokens_total += 1
 
-    def _is_allowed(self):
+    def _is_allowed(self, now):
         # Rate limit of 0 blocks everything
         if self.rate_limit == 0:
             return False
@@ -103,7 +102,7 @@ class RateLimiter(object):
 
         # Lock, we need this to be thread safe, it should be shared by all threads
         with self._lock:
-            self._replenish()
+            self._replenish(now)
 
             if self.tokens >= 1:
                 self.tokens -= 1
@@ -111,14 +110,16 @@ class RateLimiter(object):
 
             return False
 
-    def _replenish(self):
+    def _replenish(self, now):
         # If we are at the max, we do not need to add any more
         if self.tokens == self.max_tokens:
             return
 
         # Add more available tokens based on how much time has passed
-        now = monotonic.monotonic()
+        # DEV: `now` was read before taking the lock, another thread may have seen a later time
         elapsed = now - self.last_update
+        if elapsed <= 0:
+            return
         self.last_update = now
 
         # Update the number of available tokens, but ensure we do not exceed the max
@@ -160,3 +161,66 @@ class RateLimiter(object):
         )
 
     __str__ = __repr__
+
+
+class ShardedRateLimiter(RateLimiter):
+    """
+    A token bucket rate limiter where every thread draws tokens from the shared
+    bucket by chunks.
+
+    A thread takes ``chunk_size`` tokens from the shared bucket at once and
+    allows the next requests from its own allotment, without taking the lock.
+    Once the shared bucket is empty, the time at which the next token will be
+    available is recorded and requests are rejected without the lock until then.
+
+    Tokens held by threads were already taken from the shared bucket, so over
+    any period of ``T`` seconds the number of allowed requests differs from
+    ``rate_limit * T`` by at most ``max_tokens + n_threads * chunk_size``: the
+    burst allowed by the bucket plus the tokens held, used or left unused, by
+    every thread.
+    """
+    __slots__ = ('chunk_size', '_local', '_next_token_at')
+
+    def __init__(self, rate_limit, chunk_size=None):
+        """
+        :param rate_limit: see :class:`RateLimiter`.
+        :param int chunk_size: number of tokens taken at once by a thread, defaults to 1% of the rate limit.
+        """
+        super(ShardedRateLimiter, self).__init__(rate_limit)
+        if chunk_size is None:
+            chunk_size = max(1, int(rate_limit // 100))
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+        self._next_token_at = 0
+
+    def _is_allowed(self, now):
+        # Rate limit of 0 blocks everything
+        if self.rate_limit == 0:
+            return False
+
+        # Negative rate limit disables rate limiting
+        elif self.rate_limit < 0:
+            return True
+
+        local = self._local
+        tokens = getattr(local, 'tokens', 0)
+        if tokens:
+            local.tokens = tokens - 1
+            return True
+
+        # DEV: the shared bucket was empty, don't take the lock before a new token is available
+        if now < self._next_token_at:
+            return False
+
+        with self._lock:
+            self._replenish(now)
+
+            if self.tokens < 1:
+                self._next_token_at = self.last_update + (1 - self.tokens) / self.rate_limit
+                return False
+
+            chunk = min(int(self.tokens), self.chunk_size)
+            self.tokens -= chunk
+
+        local.tokens = chunk - 1
+        return True
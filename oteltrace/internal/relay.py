@@ -0,0 +1,389 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Relay of the traces of several processes of a host to a single exporter.
+
+In pre-fork servers every worker process exports its own traces, with its
+own export threads and connections. With a :class:`Relay`, the first process
+binding the relay Unix socket exports the traces of all the processes: the
+other processes, and the processes forked from it, send the batches flushed
+by their writer to this socket, encoded with :mod:`oteltrace.encoding`.
+"""
+import contextlib
+import errno
+import os
+import select
+import socket
+import struct
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ..encoding import SpanBatch, encode_traces
+from . import forksafe
+from .logger import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'oteltrace-relay.sock')
+
+# every batch is sent as its length followed by the encoded batch
+_FRAME_LENGTH = struct.Struct('<I')
+_RECV_SIZE = 64 * 1024
+
+
+class RelayClient(object):
+    """API sending the traces flushed by the writer to the relay server, see :class:`Relay`."""
+
+    def __init__(self, path=DEFAULT_PATH, timeout=1.0, take_over=None):
+        """
+        :param str path: path of the Unix socket of the relay server.
+        :param float timeout: maximum time in seconds to connect or to send a batch.
+        :param take_over: function called without argument when the relay server is not running,
+            returning the API sending the traces in place of the server, or ``None``.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._take_over = take_over
+        self._sock = None
+        forksafe.register(self)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.path)
+
+    def _after_fork(self):
+        # DEV: the connection is shared with the parent, only close the copy of the child
+        self._close()
+
+    def _close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.close()
+            except socket.error:
+                pass
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except socket.error:
+            sock.close()
+            raise
+        self._sock = sock
+        return sock
+
+    def _connection(self):
+        sock = self._sock
+        if sock is not None:
+            # DEV: the server never sends data, the socket is readable once the server closed the connection
+            readable, _, _ = select.select([sock], [], [], 0)
+            if not readable:
+                return sock
+            self._close()
+        return self._connect()
+
+    def send_traces(self, traces, done=None):
+        """Send the traces to the relay server.
+
+        :param done: function called without argument once the traces are encoded.
+        :return: An empty list, or a list with the error which prevented from sending the traces.
+        """
+        if not traces:
+            if done is not None:
+                done()
+            return []
+
+        try:
+            sock = self._connection()
+        except (socket.error, OSError) as err:
+            api = self._take_over() if self._take_over is not None else None
+            if api is not None:
+                return api.send_traces(traces, done=done)
+            if done is not None:
+                done()
+            return [err]
+
+        try:
+            data = encode_traces(traces).to_bytes()
+        finally:
+            if done is not None:
+                done()
+
+        try:
+            sock.sendall(_FRAME_LENGTH.pack(len(data)) + data)
+        except (socket.error, OSError) as err:
+            # DEV: the server drops a partially sent batch, the traces are lost but never sent twice
+            self._close()
+            return [err]
+        return []
+
+
+class RelayServer(object):
+    """
+    Thread receiving the batches sent by the :class:`RelayClient` of other
+    processes, and calling ``write`` with every trace of these batches.
+    """
+
+    def __init__(self, listener, write):
+        """
+        :param listener: bound and listening Unix socket.
+        :param write: function called with the list of spans of every received trace.
+        """
+        self._listener = listener
+        self._write = write
+        self._pid = os.getpid()
+        # DEV: identifies the socket file, the path may be bound again by another server once it is removed
+        self._inode = _inode(listener.getsockname())
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__)
+        self._thread.daemon = True
+
+        self.received_batches = 0
+        self.received_spans = 0
+
+    @property
+    def path(self):
+        return self._listener.getsockname()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop receiving batches and remove the socket."""
+        self._stop.set()
+        self._thread.join(timeout)
+        path = self.path
+        self._listener.close()
+        if self._pid == os.getpid():
+            with _path_lock(path):
+                if _inode(path) == self._inode:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+
+    def close_after_fork(self):
+        """Close the copy of the socket of the server in a forked process, the parent keeps serving."""
+        self._listener.close()
+
+    def _run(self):
+        listener = self._listener
+        # connection -> bytes received and not processed yet
+        buffers = {}
+        try:
+            while not self._stop.is_set():
+                try:
+                    readable, _, _ = select.select([listener] + list(buffers), [], [], 0.1)
+                except (select.error, OSError) as err:
+                    if err.args[0] == errno.EINTR:
+                        continue
+                    raise
+
+                for sock in readable:
+                    if sock is listener:
+                        conn, _ = listener.accept()
+                        buffers[conn] = bytearray()
+                        continue
+
+                    try:
+                        data = sock.recv(_RECV_SIZE)
+                    except socket.error:
+                        data = None
+                    if not data:
+                        # the client closed the connection, drop any partially received batch
+                        del buffers[sock]
+                        sock.close()
+                        continue
+                    buf = buffers[sock]
+                    buf.extend(data)
+                    self._read_frames(buf)
+        except Exception:
+            log.error('relay server stopped unexpectedly', exc_info=True)
+        finally:
+            for sock in buffers:
+                sock.close()
+
+    def _read_frames(self, buf):
+        """Process the complete batches at the start of ``buf`` and remove them from it."""
+        offset = 0
+        while len(buf) - offset >= _FRAME_LENGTH.size:
+            length, = _FRAME_LENGTH.unpack_from(buf, offset)
+            end = offset + _FRAME_LENGTH.size + length
+            if len(buf) < end:
+                break
+            self._receive(bytes(buf[offset + _FRAME_LENGTH.size:end]))
+            offset = end
+        if offset:
+            del buf[:offset]
+
+    def _receive(self, data):
+        try:
+            traces = SpanBatch.from_bytes(data).traces()
+        except Exception:
+            log.debug('dropping an invalid batch of %d bytes', len(data), exc_info=True)
+            return
+
+        self.received_batches += 1
+        for trace in traces:
+            self.received_spans += len(trace)
+            self._write(trace)
+
+
+def _inode(path):
+    """Return the device and inode of the file at ``path``, ``None`` if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+@contextlib.contextmanager
+def _path_lock(path):
+    """Lock the socket ``path`` between the processes of the host.
+
+    The lock is held while binding and listening, or removing the socket, so
+    that a process finding a bound socket which refuses connections knows that
+    it was left by a process which did not stop its server. The lock file is
+    never removed, a process could otherwise lock a file which was replaced.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # DEV: closing the file releases the lock
+        os.close(fd)
+
+
+def _bind(path):
+    """Return a listening socket bound to ``path``, ``None`` if another process is serving on it."""
+    with _path_lock(path):
+        return _bind_locked(path)
+
+
+def _bind_locked(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.bind(path)
+        except socket.error as err:
+            if err.args[0] != errno.EADDRINUSE:
+                raise
+
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except socket.error:
+                # left by a process which did not stop its server
+                os.unlink(path)
+                sock.bind(path)
+            else:
+                sock.close()
+                return None
+            finally:
+                probe.close()
+
+        sock.listen(128)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+class Relay(object):
+    """
+    Export the traces of all the processes of a host using the same ``path``
+    from a single process.
+
+    The first process creating a relay binds the Unix socket ``path``: it
+    runs a :class:`RelayServer` writing the traces received from the other
+    processes to the writer of its tracer, which batches and exports them
+    with the spans of this process. In the other processes, and in the
+    processes forked from a process running the server, the API of the writer
+    of the tracer is replaced by a :class:`RelayClient`.
+
+    When the exporting process stops, the next process failing to send its
+    traces to the socket binds it and exports the traces of the others.
+    """
+
+    def __init__(self, tracer, path=DEFAULT_PATH):
+        self.tracer = tracer
+        self.path = path
+        self.server = None
+        # API exporting the traces when the server runs in this process
+        self._api = tracer.writer.api
+        self._lock = threading.Lock()
+
+        if not self._start_server():
+            self._use_client()
+        forksafe.register(self)
+
+    @property
+    def is_server(self):
+        """Whether this process exports the traces of the other processes."""
+        return self.server is not None
+
+    def _write(self, spans):
+        self.tracer.writer.write(spans=spans)
+
+    def _start_server(self):
+        listener = _bind(self.path)
+        if listener is None:
+            return False
+        log.debug('exporting the traces of the processes relayed to %s', self.path)
+        self.server = RelayServer(listener, self._write)
+        self.server.start()
+        return True
+
+    def _use_client(self):
+        self.tracer.writer.api = RelayClient(self.path, take_over=self._take_over)
+
+    def _take_over(self):
+        """Start the server when the exporting process stopped, return the API exporting the traces."""
+        with self._lock:
+            if self.server is None:
+                try:
+                    if not self._start_server():
+                        # another process took over first
+                        return None
+                except (socket.error, OSError):
+                    log.debug('failed to take over the relay server on %s', self.path, exc_info=True)
+                    return None
+                self.tracer.writer.api = self._api
+            return self._api
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        if self.server is not None:
+            self.server.close_after_fork()
+            self.server = None
+            self._use_client()
+
+    def stop(self, timeout=None):
+        """Stop the relay server if it runs in this process."""
+        if self.server is not None:
+            self.server.stop(timeout)
+            self.server = None
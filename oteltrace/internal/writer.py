@@ -13,41 +13,85 @@
 # limitations under the License.
 
 # stdlib
+import collections
+import functools
 import itertools
-import random
 import os
+import threading
 import time
 
 from .. import _worker
+from ..filters import batch_filter
 from ..utils import sizeof
+from ..internal import forksafe
 from ..internal.logger import get_logger
-from oteltrace.vendor.six.moves.queue import Queue, Full, Empty
 
 log = get_logger(__name__)
 
 
 MAX_TRACES = 1000
 
+# Policies applied by ``RingBuffer`` when a trace is added to a full buffer
+DROP_OLDEST = 'oldest'
+DROP_NEWEST = 'newest'
+
 DEFAULT_TIMEOUT = 5
 LOG_ERR_INTERVAL = 60
 
 
+def estimate_trace_size(trace):
+    """Return a cheap approximation of the memory footprint of a trace, in bytes."""
+    return sum(span._estimate_size() for span in trace)
+
+
 class AgentWriter(_worker.PeriodicWorkerThread):
+    """
+    Worker thread exporting the traces written by the tracer.
 
-    QUEUE_PROCESSING_INTERVAL = 1
+    Instead of polling the buffer, the thread sleeps until a flush is due: the
+    buffered traces contain more than ``flush_max_spans`` spans, are estimated
+    to use more than ``flush_max_bytes`` bytes, or the oldest of them was
+    buffered more than ``flush_max_age`` seconds ago. When nothing is
+    buffered, the thread sleeps until the next trace is written.
+
+    At most ``MAX_TRACES`` traces are buffered, ``queue_drop_policy`` decides
+    whether the oldest trace (``DROP_OLDEST``, default) or the new one
+    (``DROP_NEWEST``) is dropped when a trace is written to a full buffer.
+    """
+
+    FLUSH_MAX_SPANS = 1000
+    FLUSH_MAX_BYTES = 4 * 1024 * 1024
+    FLUSH_MAX_AGE = 1.0
 
     _ENABLE_STATS = False
     _STATS_EVERY_INTERVAL = 10
 
+    # ``SpanPool`` the exported spans are released to, set by the tracer
+    span_pool = None
+    # ``TailSampler`` deciding which of the flushed traces are exported, set by the tracer
+    tail_sampler = None
+
     def __init__(self, shutdown_timeout=DEFAULT_TIMEOUT, filters=None,
-                 priority_sampler=None, metrics_client=None, api=None):
-        super(AgentWriter, self).__init__(interval=self.QUEUE_PROCESSING_INTERVAL,
+                 priority_sampler=None, metrics_client=None, api=None,
+                 flush_max_spans=None, flush_max_bytes=None, flush_max_age=None,
+                 queue_drop_policy=DROP_OLDEST):
+        super(AgentWriter, self).__init__(interval=None,
                                           exit_timeout=shutdown_timeout,
                                           name=self.__class__.__name__)
+        self._wakeup = threading.Event()
+        self.flush_max_spans = self.FLUSH_MAX_SPANS
+        self.flush_max_bytes = self.FLUSH_MAX_BYTES
+        self.flush_max_age = self.FLUSH_MAX_AGE
+        self.set_flush_thresholds(flush_max_spans, flush_max_bytes, flush_max_age)
+        self._queue_drop_policy = queue_drop_policy
         self._reset_queue()
         self._filters = filters
+        self._batch_filters = None if filters is None else [batch_filter(filtr) for filtr in filters]
         self._priority_sampler = priority_sampler
         self._last_error_ts = 0
+        self._last_dropped_ts = 0
+        # traces dropped by the full buffer not logged yet
+        self._dropped_traces = 0
         self.metrics_client = metrics_client
         self.api = api
         self._stats_rate_counter = 0
@@ -72,25 +116,127 @@ class AgentWriter(_worker.PeriodicWorkerThread):
 
         return False
 
+    def set_flush_thresholds(self, max_spans=None, max_bytes=None, max_age=None):
+        """Update the thresholds triggering a flush, ``None`` keeps the current value.
+
+        :param int max_spans: flush when more than this number of spans are buffered.
+        :param int max_bytes: flush when the buffered traces are estimated to use more than this many bytes.
+        :param float max_age: flush when the oldest buffered trace is older than this number of seconds.
+        """
+        if max_spans is not None:
+            self.flush_max_spans = max_spans
+        if max_bytes is not None:
+            self.flush_max_bytes = max_bytes
+        if max_age is not None:
+            self.flush_max_age = max_age
+        # let the worker re-evaluate when the next flush is due
+        self._wakeup.set()
+
+    def set_queue_drop_policy(self, drop_policy):
+        """Set the policy applied when a trace is written to a full buffer, ``DROP_OLDEST`` or ``DROP_NEWEST``."""
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError('invalid drop policy {!r}'.format(drop_policy))
+        self._queue_drop_policy = self._trace_queue.drop_policy = drop_policy
+
     def _reset_queue(self):
         self._pid = os.getpid()
-        self._trace_queue = Q(maxsize=MAX_TRACES)
+        self._trace_queue = RingBuffer(maxsize=MAX_TRACES, drop_policy=self._queue_drop_policy)
+        self._reset_buffered()
+
+    def _reset_buffered(self):
+        # DEV: these counters are updated without lock by the writing threads, they are
+        # approximations only used to decide when to flush
+        self._buffered_spans = 0
+        self._buffered_bytes = 0
+        self._oldest_ts = None
+
+    def _after_fork(self):
+        """Drop the traces buffered by the parent process and restart the worker thread."""
+        log.debug('resetting queues. pids(old:%s new:%s)', self._pid, os.getpid())
+        self._reset_queue()
+        if self.tail_sampler is not None:
+            self.tail_sampler.reset()
+        self._wakeup = threading.Event()
+        super(AgentWriter, self)._after_fork()
 
     def write(self, spans=None, services=None):
-        # if this queue was created in a different process (i.e. this was
-        # forked) reset everything so that we can safely work from it.
-        pid = os.getpid()
-        if self._pid != pid:
-            log.debug('resetting queues. pids(old:%s new:%s)', self._pid, pid)
-            self._reset_queue()
+        # if this queue was created in a different process (i.e. this was forked) reset
+        # everything so that we can safely work from it. This is done by a fork hook when
+        # the interpreter supports them.
+        if not forksafe.AT_FORK_SUPPORTED and self._pid != os.getpid():
+            self._after_fork()
 
         if spans:
-            self._trace_queue.put(spans)
+            if not self._trace_queue.put(spans):
+                return
+
+            self._buffered_spans += len(spans)
+            self._buffered_bytes += estimate_trace_size(spans)
+            if self._oldest_ts is None:
+                # first trace since the last flush, start the age timer
+                self._oldest_ts = time.time()
+                self._wakeup.set()
+            elif self._buffered_spans >= self.flush_max_spans or self._buffered_bytes >= self.flush_max_bytes:
+                self._wakeup.set()
+
+    def _flush_timeout(self):
+        """Return the number of seconds before the next flush is due, ``None`` if nothing is buffered."""
+        timeout = self._queue_flush_timeout()
+        tail_sampler = self.tail_sampler
+        if tail_sampler is not None:
+            # traces waiting for a tail sampling decision are exported by a later flush
+            tail_timeout = tail_sampler.next_decision_in()
+            if timeout is None or (tail_timeout is not None and tail_timeout < timeout):
+                return tail_timeout
+        return timeout
+
+    def _queue_flush_timeout(self):
+        if not len(self._trace_queue):
+            # DEV: reset the age timer before checking again so a concurrent `write()` restarts it
+            self._oldest_ts = None
+            if not len(self._trace_queue):
+                return None
+
+        if self._buffered_spans >= self.flush_max_spans or self._buffered_bytes >= self.flush_max_bytes:
+            return 0
 
-    def flush_queue(self):
-        try:
-            traces = self._trace_queue.get(block=False)
-        except Empty:
+        now = time.time()
+        oldest_ts = self._oldest_ts
+        if oldest_ts is None:
+            oldest_ts = self._oldest_ts = now
+        return max(0, oldest_ts + self.flush_max_age - now)
+
+    def _target(self):
+        while not self._stop.is_set():
+            timeout = self._flush_timeout()
+            if timeout != 0:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                if self._stop.is_set():
+                    break
+                if self._flush_timeout() != 0:
+                    continue
+            self.flush_queue()
+        self._on_shutdown()
+
+    def stop(self):
+        super(AgentWriter, self).stop()
+        self._wakeup.set()
+
+    def flush_queue(self, final=False):
+        """Export the buffered traces.
+
+        :param bool final: decide all the traces waiting for a tail sampling decision.
+        """
+        # DEV: reset the counters before draining, traces written in between are
+        # counted towards the next flush rather than lost
+        self._reset_buffered()
+        traces = self._trace_queue.get()
+        dropped = self._trace_queue.pop_dropped()
+        if dropped:
+            self._log_dropped_traces(dropped)
+        tail_sampler = self.tail_sampler
+        if not traces and (tail_sampler is None or not tail_sampler.pending):
             return
 
         send_stats = self._send_stats()
@@ -111,8 +257,21 @@ class AgentWriter(_worker.PeriodicWorkerThread):
         if send_stats:
             traces_filtered = len(traces) - traces_queue_length
 
+        if tail_sampler is not None:
+            try:
+                traces = tail_sampler.process_traces(traces, flush=final)
+            except Exception:
+                log.error('error while tail sampling traces', exc_info=True)
+                return
+            if not traces:
+                return
+
         # If we have data, let's try to send it.
-        traces_responses = self.api.send_traces(traces)
+        if self.span_pool is None:
+            traces_responses = self.api.send_traces(traces)
+        else:
+            # give the spans back to the pool once the API is done with them
+            traces_responses = self.api.send_traces(traces, done=functools.partial(self.span_pool.release, traces))
         for response in traces_responses:
             if isinstance(response, Exception) or response.status >= 400:
                 self._log_error_status(response)
@@ -132,11 +291,12 @@ class AgentWriter(_worker.PeriodicWorkerThread):
             self.metrics_client.gauge('opentelemetry.tracer.queue.spans', traces_queue_spans)
 
             # Statistics about the rate at which spans are inserted in the queue
-            dropped, enqueued, enqueued_lengths, enqueued_size = self._trace_queue.reset_stats()
+            # DEV: the size is measured here, on the writer thread, instead of on every `put()`
+            dropped, enqueued, enqueued_lengths = self._trace_queue.reset_stats()
             self.metrics_client.increment('opentelemetry.tracer.queue.dropped', dropped)
             self.metrics_client.increment('opentelemetry.tracer.queue.accepted', enqueued)
             self.metrics_client.increment('opentelemetry.tracer.queue.accepted_lengths', enqueued_lengths)
-            self.metrics_client.increment('opentelemetry.tracer.queue.accepted_size', enqueued_size)
+            self.metrics_client.increment('opentelemetry.tracer.queue.accepted_size', traces_queue_size)
 
             # Statistics about the filtering
             self.metrics_client.increment('opentelemetry.tracer.traces.filtered', traces_filtered)
@@ -158,8 +318,25 @@ class AgentWriter(_worker.PeriodicWorkerThread):
             if hasattr(time, 'thread_time_ns'):
                 self.metrics_client.increment('opentelemetry.tracer.writer.cpu_time', time.thread_time_ns())
 
-    run_periodic = flush_queue
-    on_shutdown = flush_queue
+    def on_shutdown(self):
+        self.flush_queue(final=True)
+        # wait for the traces to be exported when the API exports them asynchronously
+        flush = getattr(self.api, 'flush', None)
+        if flush is not None:
+            flush(self.exit_timeout)
+
+    def _log_dropped_traces(self, dropped):
+        # DEV: logged from the writer thread and at most every `LOG_ERR_INTERVAL` seconds, the request
+        # threads only count the dropped traces
+        self._dropped_traces += dropped
+        now = time.time()
+        if now > self._last_dropped_ts + LOG_ERR_INTERVAL:
+            log.warning(
+                'Writer queue is full has more than %d traces, %d traces were lost',
+                self._trace_queue.maxsize, self._dropped_traces,
+            )
+            self._last_dropped_ts = now
+            self._dropped_traces = 0
 
     def _log_error_status(self, response):
         log_level = log.debug
@@ -176,89 +353,116 @@ class AgentWriter(_worker.PeriodicWorkerThread):
 
     def _apply_filters(self, traces):
         """
-        Here we make each trace go through the filters configured in the
-        tracer. There is no need for a lock since the traces are owned by the
-        AgentWriter at that point.
+        Here we make the traces go through the filters configured in the
+        tracer, each filter processes the whole batch at once. There is no
+        need for a lock since the traces are owned by the AgentWriter at that
+        point.
         """
-        if self._filters is not None:
-            filtered_traces = []
-            for trace in traces:
-                for filtr in self._filters:
-                    trace = filtr.process_trace(trace)
-                    if trace is None:
-                        break
-                if trace is not None:
-                    filtered_traces.append(trace)
-            return filtered_traces
+        if self._batch_filters is not None:
+            for filtr in self._batch_filters:
+                if not traces:
+                    break
+                traces = filtr.process_traces(traces)
         return traces
 
 
-class Q(Queue):
+class RingBuffer(object):
     """
-    Q is a threadsafe queue that let's you pop everything at once and
-    will randomly overwrite elements when it's over the max size.
-
-    This queue also exposes some statistics about its length, the number of items dropped, etc.
+    RingBuffer is a bounded buffer of traces that request threads can append
+    to without contending on a lock with the thread flushing it.
+
+    It relies on ``collections.deque`` whose ``append()`` and ``popleft()``
+    operations are atomic, so producers never wait for the consumer. When the
+    buffer is full the oldest trace is discarded (``DROP_OLDEST``, default) or
+    the incoming one is rejected (``DROP_NEWEST``).
+
+    With ``DROP_OLDEST`` the deque evicts the oldest trace itself, producers
+    never take a lock. With ``DROP_NEWEST`` producers check that the buffer is
+    not full and append under a lock, so that concurrent producers can't
+    overflow it.
+
+    Statistics are counted with atomic counters on ``put()``; the number of
+    spans is only computed by the consumer when the buffer is drained. Nothing
+    is logged when traces are dropped, see ``pop_dropped()``.
     """
 
-    def __init__(self, maxsize=0):
-        # Cannot use super() here because Queue in Python2 is old style class
-        Queue.__init__(self, maxsize)
-        # Number of item dropped (queue full)
-        self.dropped = 0
-        # Number of items accepted
-        self.accepted = 0
-        # Cumulative length of accepted items
-        self.accepted_lengths = 0
-        # Cumulative size of accepted items
-        self.accepted_size = 0
+    def __init__(self, maxsize=MAX_TRACES, drop_policy=DROP_OLDEST):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError('invalid drop policy {!r}'.format(drop_policy))
+
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self._buffer = collections.deque(maxlen=maxsize or None)
+        # DEV: `next()` on an `itertools.count` is atomic, unlike `+= 1`
+        self._accepted = itertools.count()
+        self._dropped = itertools.count()
+        # traces dropped since the last call to `pop_dropped()`
+        self._dropped_unreported = itertools.count()
+        self._put_lock = threading.Lock()
+        # Cumulative length of the items drained from the buffer, only updated by the consumer
+        self._accepted_lengths = 0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def qsize(self):
+        return len(self._buffer)
 
     def put(self, item):
-        try:
-            # Cannot use super() here because Queue in Python2 is old style class
-            Queue.put(self, item, block=False)
-        except Full:
-            # If the queue is full, replace a random item. We need to make sure
-            # the queue is not emptied was emptied in the meantime, so we lock
-            # check qsize value.
-            with self.mutex:
-                qsize = self._qsize()
-                if qsize != 0:
-                    idx = random.randrange(0, qsize)
-                    self.queue[idx] = item
-                    log.warning('Writer queue is full has more than %d traces, some traces will be lost', self.maxsize)
-                    self.dropped += 1
-                    self._update_stats(item)
-                    return
-            # The queue has been emptied, simply retry putting item
-            return self.put(item)
-        else:
-            with self.mutex:
-                self._update_stats(item)
-
-    def _update_stats(self, item):
-        # self.mutex needs to be locked to make sure we don't lose data when resetting
-        self.accepted += 1
-        if hasattr(item, '__len__'):
-            item_length = len(item)
+        """Add an item to the buffer, applying the drop policy if the buffer is full.
+
+        :return: Whether the item was added to the buffer.
+        """
+        buf = self._buffer
+        if not self.maxsize:
+            buf.append(item)
+        elif self.drop_policy == DROP_NEWEST:
+            with self._put_lock:
+                if len(buf) >= self.maxsize:
+                    next(self._dropped)
+                    next(self._dropped_unreported)
+                    return False
+                buf.append(item)
         else:
-            item_length = 1
-        self.accepted_lengths += item_length
-        self.accepted_size += sizeof.sizeof(item)
+            # DEV: the deque drops the oldest item itself, the check only counts the drops and
+            # may miss some when producers race to fill the last slots
+            if len(buf) >= self.maxsize:
+                next(self._dropped)
+                next(self._dropped_unreported)
+            buf.append(item)
+
+        next(self._accepted)
+        return True
+
+    def get(self):
+        """Remove and return all the items currently in the buffer, oldest first.
+
+        This must only be called from a single consumer thread.
+        """
+        items = []
+        popleft = self._buffer.popleft
+        try:
+            for _ in range(len(self._buffer)):
+                items.append(popleft())
+        except IndexError:
+            pass
+
+        for item in items:
+            self._accepted_lengths += len(item) if hasattr(item, '__len__') else 1
+        return items
+
+    def pop_dropped(self):
+        """Return the number of items dropped since the last call, independently of ``reset_stats()``."""
+        dropped, self._dropped_unreported = self._dropped_unreported, itertools.count()
+        return next(dropped)
 
     def reset_stats(self):
         """Reset the stats to 0.
 
         :return: The current value of dropped, accepted and accepted_lengths.
         """
-        with self.mutex:
-            dropped, accepted, accepted_lengths, accepted_size = (
-                self.dropped, self.accepted, self.accepted_lengths, self.accepted_size
-            )
-            self.dropped, self.accepted, self.accepted_lengths, self.accepted_size = 0, 0, 0, 0
-        return dropped, accepted, accepted_lengths, accepted_size
-
-    def _get(self):
-        things = self.queue
-        self._init(self.maxsize)
-        return things
+        # Swap the counters so producers keep counting on the new ones
+        dropped, self._dropped = self._dropped, itertools.count()
+        accepted, self._accepted = self._accepted, itertools.count()
+        accepted_lengths, self._accepted_lengths = self._accepted_lengths, 0
+        return next(dropped), next(accepted), accepted_lengths
@@ -14,6 +14,10 @@
 
 from ..context import Context
 from ..ext import priority
+from .utils import extract_headers
+
+_TRACE_ID_FORMAT = '%032x'
+_SPAN_ID_FORMAT = '%016x'
 
 
 class B3HTTPPropagator:
@@ -26,6 +30,9 @@ class B3HTTPPropagator:
     FLAGS_KEY = 'x-b3-flags'
     _SAMPLE_PROPAGATE_VALUES = set(['1', 'True', 'true', 'd'])
 
+    # headers read by `extract()`
+    HEADERS = frozenset([SINGLE_HEADER_KEY, TRACE_ID_KEY, SPAN_ID_KEY, SAMPLED_KEY, FLAGS_KEY])
+
     _SAMPLING_PRIORITY_MAP = {
         priority.USER_REJECT: '0',
         priority.AUTO_REJECT: '0',
@@ -39,17 +46,21 @@ class B3HTTPPropagator:
         if span_context.sampling_priority is not None:
             sampled = self._SAMPLING_PRIORITY_MAP[span_context.sampling_priority]
 
-        headers[self.TRACE_ID_KEY] = format_trace_id(span_context.trace_id)
-        headers[self.SPAN_ID_KEY] = format_span_id(span_context.span_id)
+        headers[self.TRACE_ID_KEY] = _TRACE_ID_FORMAT % span_context.trace_id
+        headers[self.SPAN_ID_KEY] = _SPAN_ID_FORMAT % span_context.span_id
         headers[self.SAMPLED_KEY] = sampled
 
     def extract(self, headers):
+        return self._extract(extract_headers(headers, self.HEADERS))
+
+    def _extract(self, fields):
+        """Return a new `Context` from the headers returned by `extract_headers()` for `HEADERS`."""
         trace_id = '0'
         span_id = '0'
         sampled = '0'
         flags = None
 
-        single_header = headers.get(self.SINGLE_HEADER_KEY)
+        single_header = fields.get(self.SINGLE_HEADER_KEY)
 
         if single_header:
             # The b3 spec calls for the sampling state to be
@@ -69,10 +80,10 @@ class B3HTTPPropagator:
             else:
                 return Context()
         else:
-            trace_id = headers.get(self.TRACE_ID_KEY) or trace_id
-            span_id = headers.get(self.SPAN_ID_KEY) or span_id
-            sampled = headers.get(self.SAMPLED_KEY) or sampled
-            flags = headers.get(self.FLAGS_KEY) or flags
+            trace_id = fields.get(self.TRACE_ID_KEY) or trace_id
+            span_id = fields.get(self.SPAN_ID_KEY) or span_id
+            sampled = fields.get(self.SAMPLED_KEY) or sampled
+            flags = fields.get(self.FLAGS_KEY) or flags
 
         if sampled in self._SAMPLE_PROPAGATE_VALUES or flags == '1':
             sampling_priority = priority.AUTO_KEEP
@@ -88,9 +99,9 @@ class B3HTTPPropagator:
 
 def format_trace_id(trace_id: int) -> str:
     """Format the trace id according to b3 specification."""
-    return format(trace_id, '032x')
+    return _TRACE_ID_FORMAT % trace_id
 
 
 def format_span_id(span_id: int) -> str:
     """Format the span id according to b3 specification."""
-    return format(span_id, '016x')
+    return _SPAN_ID_FORMAT % span_id
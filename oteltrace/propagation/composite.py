@@ -0,0 +1,79 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from ..context import Context
+from ..internal.logger import get_logger
+
+from .utils import extract_headers
+
+log = get_logger(__name__)
+
+
+class CompositeHTTPPropagator(object):
+    """
+    Propagator supporting several formats: the context is extracted with
+    the first propagator, in the given order, finding a trace in the headers,
+    and injected with all of them.
+
+    Here is an example accepting w3c, b3 and Datadog headers, w3c first::
+
+        from oteltrace.propagation.b3 import B3HTTPPropagator
+        from oteltrace.propagation.composite import CompositeHTTPPropagator
+        from oteltrace.propagation.datadog import DatadogHTTPPropagator
+        from oteltrace.propagation.w3c import W3CHTTPPropagator
+
+        propagator = CompositeHTTPPropagator([W3CHTTPPropagator(), B3HTTPPropagator(), DatadogHTTPPropagator()])
+        context = propagator.extract(headers)
+    """
+
+    def __init__(self, propagators):
+        """
+        :param list propagators: propagators by decreasing priority, their ``HEADERS`` are extracted from
+            the carrier in a single pass.
+        """
+        self.propagators = tuple(propagators)
+        self.HEADERS = frozenset().union(*(propagator.HEADERS for propagator in self.propagators))
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, list(self.propagators))
+
+    def inject(self, span_context, headers):
+        """Inject the context in the headers in the format of every propagator."""
+        for propagator in self.propagators:
+            propagator.inject(span_context, headers)
+
+    def extract(self, headers):
+        """Return a new `Context` extracted by the first propagator finding a trace in the headers."""
+        if not headers:
+            return Context()
+
+        return self._extract(extract_headers(headers, self.HEADERS))
+
+    def _extract(self, fields):
+        if not fields:
+            return Context()
+
+        for propagator in self.propagators:
+            # DEV: skip the propagators without any of their headers instead of building an empty context
+            if propagator.HEADERS.isdisjoint(fields):
+                continue
+            try:
+                context = propagator._extract(fields)
+            except Exception:
+                # DEV: malformed headers of a format should not prevent from reading the other formats
+                log.debug('invalid headers for %r', propagator, exc_info=True)
+                continue
+            if context.trace_id:
+                return context
+        return Context()
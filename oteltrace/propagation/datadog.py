@@ -15,7 +15,7 @@
 from ..context import Context
 from ..internal.logger import get_logger
 
-from .utils import get_wsgi_header
+from .utils import extract_headers, get_wsgi_header
 
 log = get_logger(__name__)
 
@@ -42,10 +42,17 @@ POSSIBLE_HTTP_HEADER_ORIGIN = frozenset(
     [HTTP_HEADER_ORIGIN, get_wsgi_header(HTTP_HEADER_ORIGIN)]
 )
 
+_TRACE_ID_MASK = (1 << 64) - 1
+
 
 class DatadogHTTPPropagator(object):
     """A HTTP Propagator using HTTP headers as carrier."""
 
+    # headers read by `extract()`
+    HEADERS = frozenset([
+        HTTP_HEADER_TRACE_ID, HTTP_HEADER_PARENT_ID, HTTP_HEADER_SAMPLING_PRIORITY, HTTP_HEADER_ORIGIN,
+    ])
+
     def inject(self, span_context, headers):
         """Inject Context attributes that have to be propagated as HTTP headers.
 
@@ -65,7 +72,8 @@ class DatadogHTTPPropagator(object):
         :param Context span_context: Span context to propagate.
         :param dict headers: HTTP headers to extend with tracing attributes.
         """
-        headers[HTTP_HEADER_TRACE_ID] = str(span_context.trace_id)
+        # DEV: the header holds 64 bits trace ids, only send the lower bits of 128 bits ids
+        headers[HTTP_HEADER_TRACE_ID] = str(span_context.trace_id & _TRACE_ID_MASK)
         headers[HTTP_HEADER_PARENT_ID] = str(span_context.span_id)
         sampling_priority = span_context.sampling_priority
         # Propagate priority only if defined
@@ -77,10 +85,10 @@ class DatadogHTTPPropagator(object):
 
     @staticmethod
     def extract_header_value(possible_header_names, headers, default=None):
+        possible_header_names = {header_name.lower() for header_name in possible_header_names}
         for header, value in headers.items():
-            for header_name in possible_header_names:
-                if header.lower() == header_name.lower():
-                    return value
+            if header.lower() in possible_header_names:
+                return value
 
         return default
 
@@ -133,11 +141,15 @@ class DatadogHTTPPropagator(object):
         if not headers:
             return Context()
 
+        return self._extract(extract_headers(headers, self.HEADERS))
+
+    def _extract(self, fields):
+        """Return a new `Context` from the headers returned by `extract_headers()` for `HEADERS`."""
         try:
-            trace_id = DatadogHTTPPropagator.extract_trace_id(headers)
-            parent_span_id = DatadogHTTPPropagator.extract_parent_span_id(headers)
-            sampling_priority = DatadogHTTPPropagator.extract_sampling_priority(headers)
-            origin = DatadogHTTPPropagator.extract_origin(headers)
+            trace_id = int(fields.get(HTTP_HEADER_TRACE_ID, 0))
+            parent_span_id = int(fields.get(HTTP_HEADER_PARENT_ID, 0))
+            sampling_priority = fields.get(HTTP_HEADER_SAMPLING_PRIORITY)
+            origin = fields.get(HTTP_HEADER_ORIGIN)
 
             if sampling_priority is not None:
                 sampling_priority = int(sampling_priority)
@@ -153,10 +165,10 @@ class DatadogHTTPPropagator(object):
             try:
                 log.debug(
                     'invalid x-datadog-* headers, trace-id: %s, parent-id: %s, priority: %s, origin: %s, error: %s',
-                    headers.get(HTTP_HEADER_TRACE_ID, 0),
-                    headers.get(HTTP_HEADER_PARENT_ID, 0),
-                    headers.get(HTTP_HEADER_SAMPLING_PRIORITY),
-                    headers.get(HTTP_HEADER_ORIGIN, ''),
+                    fields.get(HTTP_HEADER_TRACE_ID, 0),
+                    fields.get(HTTP_HEADER_PARENT_ID, 0),
+                    fields.get(HTTP_HEADER_SAMPLING_PRIORITY),
+                    fields.get(HTTP_HEADER_ORIGIN, ''),
                     error,
                 )
             # We might fail on string formatting errors ; in that case only format the first error
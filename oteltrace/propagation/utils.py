@@ -19,3 +19,55 @@ def get_wsgi_header(header):
     information from the spec.
     """
     return 'HTTP_{}'.format(header.upper().replace('-', '_'))
+
+
+_WSGI_PREFIX = 'http_'
+
+# name of a header as found in carriers -> lowercase name without the WSGI prefix
+_normalized_names = {}
+# DEV: header names are controlled by the clients, don't let them grow the cache forever
+_NORMALIZED_NAMES_SIZE = 4096
+
+
+def _normalize_header_name(key):
+    if isinstance(key, str):
+        name = key.lower()
+        if name.startswith(_WSGI_PREFIX):
+            name = name[len(_WSGI_PREFIX):].replace('_', '-')
+    else:
+        name = ''
+    if len(_normalized_names) >= _NORMALIZED_NAMES_SIZE:
+        _normalized_names.clear()
+    _normalized_names[key] = name
+    return name
+
+
+def extract_headers(headers, names):
+    """Return the values of the headers with the given names, in a single pass over the carrier.
+
+    Header names are compared ignoring case, and the WSGI form of the names
+    (e.g. ``HTTP_X_B3_TRACEID`` for ``x-b3-traceid``) is accepted too. When a
+    header is repeated, its first value is returned.
+
+    :param headers: carrier of the headers: ``dict``, WSGI ``environ``, object with an ``items()``
+        method like aiohttp's ``CIMultiDict``, or list of ``(name, value)`` tuples.
+    :param frozenset names: lowercase names of the headers to extract.
+    :return: Dictionary of the values of the headers found, by lowercase name.
+    """
+    fields = {}
+    if not headers:
+        return fields
+
+    items = headers.items() if hasattr(headers, 'items') else headers
+    normalized_names = _normalized_names
+    for key, value in items:
+        try:
+            name = normalized_names[key]
+        except KeyError:
+            name = _normalize_header_name(key)
+        except TypeError:
+            # unhashable name
+            continue
+        if name in names and name not in fields:
+            fields[name] = value
+    return fields
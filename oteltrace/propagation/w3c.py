@@ -12,10 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import re
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 from ..context import Context
 from ..ext import priority
+from .utils import extract_headers
 
 
 _KEY_WITHOUT_VENDOR_FORMAT = r'[a-z][_0-9a-z\-\*\/]{0,255}'
@@ -28,73 +35,116 @@ _VALUE_FORMAT = (
     r'[\x20-\x2b\x2d-\x3c\x3e-\x7e]{0,255}[\x21-\x2b\x2d-\x3c\x3e-\x7e]'
 )
 
-_DELIMITER_FORMAT = '[ \t]*,[ \t]*'
 _MEMBER_FORMAT = '({})(=)({})[ \t]*'.format(_KEY_FORMAT, _VALUE_FORMAT)
 
-_DELIMITER_FORMAT_RE = re.compile(_DELIMITER_FORMAT)
 _MEMBER_FORMAT_RE = re.compile(_MEMBER_FORMAT)
 
 _TRACECONTEXT_MAXIMUM_TRACESTATE_KEYS = 32
 
+# number of distinct tracestate headers whose `TraceState` is reused, see `TraceState.from_header()`
+TRACESTATE_CACHE_SIZE = 1024
+
+_HEX_DIGITS = b'0123456789abcdef'
+# length of a `version-trace_id-parent_id-trace_flags` traceparent header
+_TRACEPARENT_LENGTH = 55
+_TRACE_ID_MASK = (1 << 128) - 1
+_SPAN_ID_MASK = (1 << 64) - 1
+
+
+def _parse_traceparent(header):
+    """Parse a traceparent header without a regular expression, its fields are at fixed offsets.
+
+    Accepts the same headers as ``W3CHTTPPropagator._TRACEPARENT_HEADER_FORMAT``.
+
+    :return: A ``(version, trace_id, span_id, trace_options, has_extra_fields)`` tuple, or ``None`` if the
+        header is malformed.
+    """
+    header = header.strip(' \t')
+    length = len(header)
+    if length < _TRACEPARENT_LENGTH or header[2] != '-' or header[35] != '-' or header[52] != '-':
+        return None
+    if length > _TRACEPARENT_LENGTH and header[_TRACEPARENT_LENGTH] != '-':
+        return None
+
+    # DEV: `int(..., 16)` accepts uppercase and non-ASCII digits, signs, underscores and spaces,
+    # check that only lowercase hex digits are left once the 3 dashes are removed
+    digits = header[:_TRACEPARENT_LENGTH].replace('-', '')
+    if len(digits) != 52 or digits.encode('ascii', 'replace').translate(None, _HEX_DIGITS):
+        return None
+
+    # a single conversion of the 4 fields is faster than one by field
+    value = int(digits, 16)
+    return (
+        header[:2],
+        value >> 72 & _TRACE_ID_MASK,
+        value >> 8 & _SPAN_ID_MASK,
+        value & 0xff,
+        length > _TRACEPARENT_LENGTH,
+    )
+
 
 class W3CHTTPPropagator:
     """w3c compatible propagator"""
     _TRACEPARENT_HEADER_NAME = 'traceparent'
     _TRACESTATE_HEADER_NAME = 'tracestate'
+    # format of the traceparent header, parsed by `_parse_traceparent()`
     _TRACEPARENT_HEADER_FORMAT = (
         '^[ \t]*([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?[ \t]*$'
     )
-    _TRACEPARENT_HEADER_FORMAT_RE = re.compile(_TRACEPARENT_HEADER_FORMAT)
+    _TRACEPARENT_FORMAT = '00-%032x-%016x-%s'
+    # trace flags of the traceparent header by sampling priority
     _SAMPLING_PRIORITY_MAP = {
-        priority.USER_REJECT: 0,
-        priority.AUTO_REJECT: 0,
-        priority.AUTO_KEEP: 1,
-        priority.USER_KEEP: 1,
+        priority.USER_REJECT: '00',
+        priority.AUTO_REJECT: '00',
+        priority.AUTO_KEEP: '01',
+        priority.USER_KEEP: '01',
     }
 
+    # headers read by `extract()`
+    HEADERS = frozenset([_TRACEPARENT_HEADER_NAME, _TRACESTATE_HEADER_NAME])
+
     def inject(self, span_context, headers):
         # TODO: what should be a default value?
-        sampled = 0
+        sampled = '00'
         if span_context.sampling_priority is not None:
             sampled = self._SAMPLING_PRIORITY_MAP[span_context.sampling_priority]
 
-        traceparent_string = '00-{:032x}-{:016x}-{:02x}'.format(
+        headers[self._TRACEPARENT_HEADER_NAME] = self._TRACEPARENT_FORMAT % (
             span_context.trace_id, span_context.span_id, sampled
         )
-
-        headers[self._TRACEPARENT_HEADER_NAME] = traceparent_string
         # is there is state in the context propagate it
-        if hasattr(span_context, 'tracestate'):
-            tracestate_string = _format_tracestate(span_context.tracestate)
+        tracestate = getattr(span_context, 'tracestate', None)
+        if tracestate is not None:
+            # DEV: an empty or invalid tracestate is injected as an empty header, like before it was lazily parsed
+            if isinstance(tracestate, TraceState):
+                tracestate_string = tracestate.to_header()
+            else:
+                tracestate_string = _format_tracestate(tracestate)
             headers[self._TRACESTATE_HEADER_NAME] = tracestate_string
 
     def extract(self, headers):
         if not headers:
             return Context()
 
-        # TODO: lookup ignoring case
-        header = headers.get(self._TRACEPARENT_HEADER_NAME)
+        return self._extract(extract_headers(headers, self.HEADERS))
+
+    def _extract(self, fields):
+        """Return a new `Context` from the headers returned by `extract_headers()` for `HEADERS`."""
+        header = fields.get(self._TRACEPARENT_HEADER_NAME)
         if not header:
             return Context()
 
-        match = re.search(self._TRACEPARENT_HEADER_FORMAT_RE, header)
-        if not match:
+        traceparent = _parse_traceparent(header)
+        if traceparent is None:
             return Context()
 
-        version = match.group(1)
-        trace_id_str = match.group(2)
-        span_id_str = match.group(3)
-        trace_options_str = match.group(4)
-
+        version, trace_id, span_id, trace_options, has_extra_fields = traceparent
         if version == '00':
-            if match.group(5):
+            if has_extra_fields:
                 return Context()
         if version == 'ff':
             return Context()
 
-        trace_id = int(trace_id_str, 16)
-        span_id = int(span_id_str, 16)
-        trace_options = int(trace_options_str, 16)
         if trace_id == 0 or span_id == 0:
             return Context()
 
@@ -105,20 +155,111 @@ class W3CHTTPPropagator:
         else:
             sampling_priority = priority.AUTO_REJECT
 
-        tracestate_header = headers.get(self._TRACESTATE_HEADER_NAME)
-        tracestate = _parse_tracestate(tracestate_header)
-
         ctx = Context(
             trace_id=trace_id,
             span_id=span_id,
             sampling_priority=sampling_priority,
         )
 
-        ctx.tracestate = tracestate
+        ctx.tracestate = TraceState.from_header(fields.get(self._TRACESTATE_HEADER_NAME))
 
         return ctx
 
 
+class TraceState(Mapping):
+    """
+    Immutable w3c tracestate: read-only mapping of the vendor keys to their
+    values, in the order of the header.
+
+    A tracestate extracted from a header keeps this header: it is only parsed
+    when one of its keys is read, or when it is injected to check that it is
+    valid, and it is then injected untouched. Use :meth:`set` and
+    :meth:`delete` to get a modified tracestate.
+    """
+    __slots__ = ('_header', '_members')
+
+    def __init__(self, members=None, header=None):
+        """
+        :param members: dict or list of ``(key, value)`` tuples of the members, in order.
+        :param str header: tracestate header, parsed when needed, used instead of ``members``.
+        """
+        self._header = header
+        # DEV: None until the header is parsed
+        self._members = None if header is not None else dict(members or ())
+
+    @classmethod
+    def from_header(cls, header):
+        """Return the tracestate of a header.
+
+        The tracestates of the last ``TRACESTATE_CACHE_SIZE`` distinct headers
+        are reused, so a header seen again is neither parsed again nor copied.
+        """
+        if not header:
+            return _EMPTY_TRACESTATE
+        return _tracestate_from_header(header)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, list(self.items()))
+
+    def _parsed(self):
+        members = self._members
+        if members is None:
+            members = _parse_tracestate(self._header)
+            if not members:
+                # invalid headers are not propagated
+                self._header = ''
+            self._members = members
+        return members
+
+    def __getitem__(self, key):
+        return self._parsed()[key]
+
+    def __iter__(self):
+        return iter(self._parsed())
+
+    def __len__(self):
+        return len(self._parsed())
+
+    def to_header(self):
+        """Return the tracestate header, the extracted header itself if the tracestate was not modified."""
+        self._parsed()
+        header = self._header
+        if header is None:
+            header = self._header = _format_tracestate(self._members)
+        return header
+
+    def set(self, key, value):
+        """Return a new tracestate with ``key`` set to ``value``.
+
+        As required by the w3c specification, the updated member is moved
+        first and the last members are dropped beyond the maximum number of
+        members.
+
+        :raises ValueError: if the key or the value are invalid.
+        """
+        if not _MEMBER_FORMAT_RE.fullmatch('{}={}'.format(key, value)):
+            raise ValueError('invalid tracestate member {!r}={!r}'.format(key, value))
+        members = [(key, value)]
+        members.extend(item for item in self._parsed().items() if item[0] != key)
+        return TraceState(members[:_TRACECONTEXT_MAXIMUM_TRACESTATE_KEYS])
+
+    def delete(self, key):
+        """Return a new tracestate without ``key``."""
+        members = self._parsed()
+        if key not in members:
+            return self
+        return TraceState(item for item in members.items() if item[0] != key)
+
+
+_EMPTY_TRACESTATE = TraceState()
+
+
+@functools.lru_cache(maxsize=TRACESTATE_CACHE_SIZE)
+def _tracestate_from_header(header):
+    # DEV: sharing instances between contexts is safe as they are immutable
+    return TraceState(header=header)
+
+
 def _parse_tracestate(header):
     """Parse one or more w3c tracestate header into a TraceState.
 
@@ -140,15 +281,18 @@ def _parse_tracestate(header):
 
     if header is None:
         return {}
-    for member in re.split(_DELIMITER_FORMAT_RE, header):
+    # DEV: splitting on the delimiter regular expression tries it at every character, splitting on commas
+    # and stripping the optional whitespaces around them is several times faster
+    for member in header.split(','):
+        member = member.strip(' \t')
         # empty members are valid, but no need to process further.
         if not member:
             continue
-        match = _MEMBER_FORMAT_RE.fullmatch(member)
-        if not match:
+        if not _MEMBER_FORMAT_RE.fullmatch(member):
             # TODO: log this?
             return {}
-        key, _eq, value = match.groups()
+        # DEV: neither keys nor values contain `=`
+        key, _eq, value = member.partition('=')
         if key in tracestate:  # pylint:disable=E1135
             # duplicate keys are not legal in
             # the header, so we will remove
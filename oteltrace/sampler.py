@@ -17,14 +17,16 @@
 Any `sampled = False` trace won't be written, and can be ignored by the instrumentation.
 """
 import abc
+import collections
+import threading
 
 from .compat import iteritems, pattern_type
-from .constants import ENV_KEY
+from .constants import ENV_KEY, SAMPLE_RATE_METRIC_KEY
 from .constants import SAMPLING_AGENT_DECISION, SAMPLING_RULE_DECISION, SAMPLING_LIMIT_DECISION
 from .ext.priority import AUTO_KEEP, AUTO_REJECT
 from .internal.logger import get_logger
-from .internal.rate_limiter import RateLimiter
-from .vendor import six
+from .internal.rate_limiter import ShardedRateLimiter
+from .vendor import monotonic, six
 
 log = get_logger(__name__)
 
@@ -122,12 +124,133 @@ class RateByServiceSampler(BaseSampler):
 RateByServiceSampler._default_key = RateByServiceSampler._key()
 
 
+class AdaptiveSampler(BaseSampler):
+    """Sampler adjusting its rate by service and operation name to keep a number of traces per second
+
+    The sampler counts the root spans of every ``(service, name)`` pair over a
+    sliding window of ``window`` seconds, and updates the sample rate of every
+    pair every ``interval`` seconds so that about ``target_rate`` traces per
+    second are kept in total.
+
+    The budget is shared fairly between the pairs: a pair seen less often than
+    its share of the budget keeps all its traces, and the rest of the budget is
+    split between the busier pairs. Rare endpoints are therefore always
+    sampled. Pairs seen for the first time keep all their traces until the next
+    update.
+    """
+
+    # key shared by the pairs seen once ``max_keys`` pairs are tracked
+    OTHER_KEY = ('', '')
+
+    def __init__(self, target_rate, window=10.0, interval=1.0, max_keys=1000):
+        """
+        :param float target_rate: number of traces per second to keep.
+        :param float window: duration in seconds of the sliding window over which traffic is measured.
+        :param float interval: number of seconds between two updates of the sample rates.
+        :param int max_keys: maximum number of ``(service, name)`` pairs with their own sample rate.
+        """
+        self.target_rate = target_rate
+        self.window = window
+        self.interval = interval
+        self.max_keys = max_keys
+
+        # DEV: counts are updated without lock, losing a few increments doesn't matter
+        self._counts = {}
+        # (counts, duration) of the previous intervals in the window
+        self._history = collections.deque()
+        # key -> (sample rate, sampling id threshold), keys not in it keep all their traces
+        self._rates = {}
+        self._lock = threading.Lock()
+        self._last_update = monotonic.monotonic()
+        self._next_update = self._last_update + interval
+
+    def sample(self, span):
+        now = monotonic.monotonic()
+        if now >= self._next_update:
+            self._update(now)
+
+        key = (span.service, span.name)
+        counts = self._counts
+        try:
+            counts[key] += 1
+        except KeyError:
+            if len(counts) >= self.max_keys:
+                key = self.OTHER_KEY
+            counts[key] = counts.get(key, 0) + 1
+
+        sample_rate, threshold = self._rates.get(key, _KEEP_ALL)
+        span.set_metric(SAMPLE_RATE_METRIC_KEY, sample_rate)
+        return ((span.trace_id * KNUTH_FACTOR) % MAX_TRACE_ID) <= threshold
+
+    def sample_rate(self, service, name):
+        """Return the current sample rate of the given service and operation name."""
+        return self._rates.get((service, name), _KEEP_ALL)[0]
+
+    def _update(self, now):
+        # DEV: a single thread updates the rates, the others keep sampling with the previous ones
+        if not self._lock.acquire(False):
+            return
+        try:
+            if now < self._next_update:
+                return
+
+            counts, self._counts = self._counts, {}
+            history = self._history
+            history.append((counts, now - self._last_update))
+            self._last_update = now
+            self._next_update = now + self.interval
+
+            duration = sum(d for _, d in history)
+            while len(history) > 1 and duration - history[0][1] >= self.window:
+                duration -= history.popleft()[1]
+
+            totals = collections.Counter()
+            for c, _ in history:
+                totals.update(c)
+            self._rates = {
+                key: (rate, rate * MAX_TRACE_ID)
+                for key, rate in iteritems(_fair_sample_rates(totals, duration, self.target_rate))
+            }
+        finally:
+            self._lock.release()
+
+    def __repr__(self):
+        return '{}(target_rate={!r}, window={!r}, interval={!r})'.format(
+            self.__class__.__name__, self.target_rate, self.window, self.interval,
+        )
+
+
+_KEEP_ALL = (1.0, MAX_TRACE_ID)
+
+
+def _fair_sample_rates(counts, duration, target_rate):
+    """
+    Return the sample rate of every key so that ``target_rate`` items per second are kept in total.
+
+    The budget is split with a max-min fair share: keys are served from the least to the most
+    frequent, each one gets at most an equal share of what is left of the budget.
+    """
+    rates = {}
+    if duration <= 0:
+        return rates
+
+    budget = float(target_rate)
+    keys = sorted(counts, key=counts.get)
+    for i, key in enumerate(keys):
+        key_rate = counts[key] / duration
+        share = budget / (len(keys) - i)
+        kept = min(key_rate, share)
+        rates[key] = kept / key_rate if key_rate else 1.0
+        budget -= kept
+    return rates
+
+
 class OpenTelemetrySampler(BaseSampler):
     """
     This sampler is currently in ALPHA and it's API may change at any time, use at your own risk.
     """
     # TODO: Remove '_priority_sampler' when we no longer use the fallback
-    __slots__ = ('default_sampler', 'rules', '_priority_sampler')
+    __slots__ = ('default_sampler', '_rules', '_matcher', '_priority_sampler')
 
     DEFAULT_RATE_LIMIT = 100
     NO_RATE_LIMIT = -1
@@ -149,19 +272,33 @@ class OpenTelemetrySampler(BaseSampler):
         if not rules:
             rules = []
 
-        # Validate that the rules is a list of SampleRules
-        for rule in rules:
-            if not isinstance(rule, SamplingRule):
-                raise TypeError('Rule {!r} must be a sub-class of type oteltrace.sampler.SamplingRules'.format(rule))
         self.rules = rules
 
         # Configure rate limiter
-        self.limiter = RateLimiter(rate_limit)
+        self.limiter = ShardedRateLimiter(rate_limit)
         self.default_sampler = SamplingRule(sample_rate=default_sample_rate)
 
         # TODO: Remove when we no longer use the fallback
         self._priority_sampler = _priority_sampler
 
+    @property
+    def rules(self):
+        """
+        List of :class:`SamplingRule` rules applied to the root span of every trace.
+
+        The rules are compiled when they are set: a rule modified afterwards must be set again.
+        """
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules):
+        # Validate that the rules is a list of SampleRules
+        for rule in rules:
+            if not isinstance(rule, SamplingRule):
+                raise TypeError('Rule {!r} must be a sub-class of type oteltrace.sampler.SamplingRules'.format(rule))
+        self._rules = rules
+        self._matcher = _RuleMatcher(rules)
+
     def _set_priority(self, span, priority):
         if span._context:
             span._context.sampling_priority = priority
@@ -179,14 +316,10 @@ class OpenTelemetrySampler(BaseSampler):
         :rtype: :obj:`bool`
         """
         # If there are rules defined, then iterate through them and find one that wants to sample
-        matching_rule = None
-        # Go through all rules and grab the first one that matched
+        # Grab the first rule that matched
         # DEV: This means rules should be ordered by the user from most specific to least specific
-        for rule in self.rules:
-            if rule.matches(span):
-                matching_rule = rule
-                break
-        else:
+        matching_rule = self._matcher.match(span)
+        if matching_rule is None:
             # No rule matches, fallback to priority sampling if set
             if self._priority_sampler:
                 if self._priority_sampler.sample(span):
@@ -311,13 +444,7 @@ class SamplingRule(object):
         :returns: Whether this span matches or not
         :rtype: :obj:`bool`
         """
-        return all(
-            self._pattern_matches(prop, pattern)
-            for prop, pattern in [
-                    (span.service, self.service),
-                    (span.name, self.name),
-            ]
-        )
+        return self._pattern_matches(span.service, self.service) and self._pattern_matches(span.name, self.name)
 
     def sample(self, span):
         """
@@ -347,3 +474,114 @@ class SamplingRule(object):
         )
 
     __str__ = __repr__
+
+
+class _RuleMatcher(object):
+    """
+    Rules of an :class:`OpenTelemetrySampler` compiled to find the first rule matching a span.
+
+    Rules matching the service and the name of the span with exact values or no
+    rule at all are indexed in dictionaries, so that they are found with a few
+    lookups whatever the number of rules. The other rules, using regular
+    expressions, are then checked in order until the first exact match.
+
+    The result is cached for every ``(service, name)`` pair, as long as it only
+    depends on them: when a rule uses a function to match a value, or is an
+    instance of a subclass of :class:`SamplingRule` which could match spans on
+    anything else, the rules are checked in order for every span.
+    """
+    __slots__ = ('_rules', '_exact', '_by_service', '_by_name', '_any', '_patterns', '_cache', '_compiled')
+
+    CACHE_SIZE = 1024
+
+    def __init__(self, rules):
+        self._rules = rules
+        # DEV: regular expressions are matched with their own pattern objects, merging them into a single
+        # alternation would change the meaning of patterns using flags, groups or back-references
+        self._compiled = all(type(rule) is SamplingRule and _compilable(rule) for rule in rules)
+        self._cache = {}
+        # index of the first rule matching exactly the service and the name, the service, the name, or anything
+        self._exact = {}
+        self._by_service = {}
+        self._by_name = {}
+        self._any = None
+        # rules with a regular expression, with their index
+        self._patterns = []
+        if not self._compiled:
+            return
+
+        for index, rule in enumerate(rules):
+            service_exact = _is_exact(rule.service)
+            name_exact = _is_exact(rule.name)
+            if service_exact and name_exact:
+                if rule.service is SamplingRule.NO_RULE and rule.name is SamplingRule.NO_RULE:
+                    if self._any is None:
+                        self._any = index
+                elif rule.name is SamplingRule.NO_RULE:
+                    self._by_service.setdefault(rule.service, index)
+                elif rule.service is SamplingRule.NO_RULE:
+                    self._by_name.setdefault(rule.name, index)
+                else:
+                    self._exact.setdefault((rule.service, rule.name), index)
+            else:
+                self._patterns.append((index, rule))
+
+    def match(self, span):
+        """Return the first rule matching the span, ``None`` if no rule matches."""
+        if not self._compiled:
+            for rule in self._rules:
+                if rule.matches(span):
+                    return rule
+            return None
+
+        key = (span.service, span.name)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # not hashable
+            return self._match(span)
+
+        rule = self._match(span)
+        cache = self._cache
+        if len(cache) >= self.CACHE_SIZE:
+            cache.clear()
+        cache[key] = rule
+        return rule
+
+    def _match(self, span):
+        service = span.service
+        name = span.name
+        first = len(self._rules) if self._any is None else self._any
+        for indexes, key in ((self._exact, (service, name)), (self._by_service, service), (self._by_name, name)):
+            try:
+                index = indexes.get(key)
+            except TypeError:
+                # not hashable, cannot be equal to the hashable values of the indexed rules
+                continue
+            if index is not None and index < first:
+                first = index
+
+        for index, rule in self._patterns:
+            if index > first:
+                break
+            if rule.matches(span):
+                return rule
+        return self._rules[first] if first < len(self._rules) else None
+
+
+def _is_exact(pattern):
+    """Return whether the pattern of a rule is matched by equality with a hashable value."""
+    if isinstance(pattern, pattern_type):
+        return False
+    try:
+        hash(pattern)
+    except TypeError:
+        return False
+    return True
+
+
+def _compilable(rule):
+    # results of functions can't be cached, they may depend on anything
+    return not callable(rule.service) and not callable(rule.name)
@@ -17,6 +17,7 @@ from .exceptions import ConfigException
 from .http import HttpConfig
 from .hooks import Hooks
 from .integration import IntegrationConfig
+from .snapshot import IntegrationConfigSnapshot
 
 # Default global config
 config = Config()
@@ -28,4 +29,5 @@ __all__ = [
     'HttpConfig',
     'Hooks',
     'IntegrationConfig',
+    'IntegrationConfigSnapshot',
 ]
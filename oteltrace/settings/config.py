@@ -18,6 +18,7 @@ from ..internal.logger import get_logger
 from ..pin import Pin
 from ..utils.formats import asbool
 from ..utils.merge import deepmerge
+from . import snapshot
 from .http import HttpConfig
 from .integration import IntegrationConfig
 from ..utils.formats import get_env
@@ -48,11 +49,17 @@ class Config(object):
             get_env('trace', 'report_hostname', default=False)
         )
 
-    def __getattr__(self, name):
-        if name not in self._config:
-            self._config[name] = IntegrationConfig(self, name)
+    def __setattr__(self, key, value):
+        object.__setattr__(self, key, value)
+        # e.g. `analytics_enabled` changes the resolved settings of the integrations
+        snapshot.changed()
 
-        return self._config[name]
+    def __getattr__(self, name):
+        try:
+            return self._config[name]
+        except KeyError:
+            config = self._config[name] = IntegrationConfig(self, name)
+            return config
 
     def get_from(self, obj):
         """Retrieves the configuration for the given object.
@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from ..http.headers import HeaderCapturePlan
 from ..internal.logger import get_logger
 from ..utils.http import normalize_header_name
+from . import snapshot
 
 log = get_logger(__name__)
 
@@ -27,6 +29,13 @@ class HttpConfig(object):
     def __init__(self):
         self._whitelist_headers = set()
         self.trace_query_string = None
+        # request|response -> HeaderCapturePlan of the whitelist, built when headers are first stored
+        self._capture_plans = {}
+
+    # DEV: every change of the settings invalidates the snapshots of the integrations
+    def __setattr__(self, key, value):
+        object.__setattr__(self, key, value)
+        snapshot.changed()
 
     @property
     def is_header_tracing_configured(self):
@@ -49,6 +58,8 @@ class HttpConfig(object):
             if not normalized_header_name:
                 continue
             self._whitelist_headers.add(normalized_header_name)
+        # DEV: also invalidates the snapshots of the integrations, see `__setattr__`
+        self._capture_plans = {}
 
         return self
 
@@ -63,6 +74,14 @@ class HttpConfig(object):
         log.debug('Checking header \'%s\' tracing in whitelist %s', normalized_header_name, self._whitelist_headers)
         return normalized_header_name in self._whitelist_headers
 
+    def _header_capture_plan(self, request_or_response):
+        """Return the `HeaderCapturePlan` of the whitelist for request or response headers."""
+        plan = self._capture_plans.get(request_or_response)
+        if plan is None:
+            plan = HeaderCapturePlan(self._whitelist_headers, request_or_response)
+            self._capture_plans[request_or_response] = plan
+        return plan
+
     def __repr__(self):
         return '<{} traced_headers={} trace_query_string={}>'.format(
             self.__class__.__name__, self._whitelist_headers, self.trace_query_string)
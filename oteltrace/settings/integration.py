@@ -16,6 +16,7 @@ from copy import deepcopy
 
 from ..utils.attrdict import AttrDict
 from ..utils.formats import asbool, get_env
+from . import snapshot
 from .http import HttpConfig
 from .hooks import Hooks
 
@@ -50,6 +51,7 @@ class IntegrationConfig(AttrDict):
         object.__setattr__(self, 'integration_name', name)
         object.__setattr__(self, 'hooks', Hooks())
         object.__setattr__(self, 'http', HttpConfig())
+        object.__setattr__(self, '_snapshot', None)
 
         # Set default analytics configuration, default is disabled
         # DEV: Default to `None` which means do not set this key
@@ -60,6 +62,56 @@ class IntegrationConfig(AttrDict):
         self.setdefault('analytics_enabled', analytics_enabled_env)
         self.setdefault('analytics_sample_rate', float(get_env(name, 'analytics_sample_rate', 1.0)))
 
+    # DEV: every change of the settings invalidates the snapshots, see `snapshot()`
+    def __setattr__(self, key, value):
+        super(IntegrationConfig, self).__setattr__(key, value)
+        snapshot.changed()
+
+    def __setitem__(self, key, value):
+        super(IntegrationConfig, self).__setitem__(key, value)
+        snapshot.changed()
+
+    def __delitem__(self, key):
+        super(IntegrationConfig, self).__delitem__(key)
+        snapshot.changed()
+
+    def update(self, *args, **kwargs):
+        super(IntegrationConfig, self).update(*args, **kwargs)
+        snapshot.changed()
+
+    def setdefault(self, key, default=None):
+        value = super(IntegrationConfig, self).setdefault(key, default)
+        snapshot.changed()
+        return value
+
+    def pop(self, *args):
+        value = super(IntegrationConfig, self).pop(*args)
+        snapshot.changed()
+        return value
+
+    def popitem(self):
+        item = super(IntegrationConfig, self).popitem()
+        snapshot.changed()
+        return item
+
+    def clear(self):
+        super(IntegrationConfig, self).clear()
+        snapshot.changed()
+
+    def snapshot(self):
+        """
+        Return an immutable snapshot of the settings of the integration, with
+        the global settings they fall back to already resolved.
+
+        The same snapshot is returned as long as no setting changed, see
+        :class:`oteltrace.settings.IntegrationConfigSnapshot`.
+        """
+        current = self._snapshot
+        if current is None or current.version != snapshot.version:
+            current = snapshot.IntegrationConfigSnapshot(self)
+            object.__setattr__(self, '_snapshot', current)
+        return current
+
     def __deepcopy__(self, memodict=None):
         new = IntegrationConfig(self.global_config, deepcopy(dict(self)))
         new.hooks = deepcopy(self.hooks)
@@ -85,6 +137,14 @@ class IntegrationConfig(AttrDict):
             else self.global_config.header_is_traced(header_name)
         )
 
+    def _http_config(self):
+        """Return the `HttpConfig` whose whitelist is used, the global one if the integration has none."""
+        return self.http if self.http.is_header_tracing_configured else self.global_config._http
+
+    def _header_capture_plan(self, request_or_response):
+        """Return the `HeaderCapturePlan` of the headers traced by this integration, see `header_is_traced()`."""
+        return self._http_config()._header_capture_plan(request_or_response)
+
     def _is_analytics_enabled(self, use_global_config):
         # DEV: analytics flag can be None which should not be taken as
         # enabled when global flag is disabled
@@ -0,0 +1,116 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+
+from ..utils.http import normalize_header_name
+
+# DEV: `next()` on a counter is atomic, a version is never returned twice
+_versions = itertools.count(1)
+# incremented every time a setting of `Config`, `IntegrationConfig` or `HttpConfig` changes
+version = next(_versions)
+
+
+def changed():
+    """Invalidate the snapshots taken before the settings changed."""
+    global version
+    version = next(_versions)
+
+
+class IntegrationConfigSnapshot(object):
+    """
+    Immutable copy of the settings of an integration, with the values
+    depending on the global configuration already resolved.
+
+    Reading the settings of an integration from ``config.<integration>`` looks
+    up the integration and every key through the ``__getattr__`` of
+    ``Config`` and ``IntegrationConfig``. Integrations take a snapshot with
+    ``config.<integration>.snapshot()`` once per request instead, it is only
+    rebuilt when a setting changed since it was taken.
+
+    Settings are read with ``get()``, ``[]`` or as attributes, like with
+    ``IntegrationConfig``. Mutable values, e.g. a set of error codes, are not
+    copied.
+    """
+    __slots__ = (
+        'version', 'integration_name', 'global_config', 'hooks', 'trace_query_string', '_settings',
+        '_analytics_sample_rate', '_global_analytics_sample_rate', '_header_capture_plans', '_whitelist_headers',
+    )
+
+    def __init__(self, integration_config):
+        """
+        :param integration_config: the settings of the integration.
+        :type integration_config: oteltrace.settings.IntegrationConfig
+        """
+        # DEV: read the version first, a change made while the snapshot is built invalidates it
+        set_ = object.__setattr__
+        set_(self, 'version', version)
+        set_(self, 'integration_name', integration_config.integration_name)
+        set_(self, 'global_config', integration_config.global_config)
+        set_(self, 'hooks', integration_config.hooks)
+        set_(self, 'trace_query_string', integration_config.trace_query_string)
+        set_(self, '_settings', dict(integration_config))
+        set_(self, '_analytics_sample_rate', integration_config.get_analytics_sample_rate())
+        set_(self, '_global_analytics_sample_rate', integration_config.get_analytics_sample_rate(True))
+
+        http = integration_config._http_config()
+        set_(self, '_whitelist_headers', frozenset(http._whitelist_headers))
+        set_(self, '_header_capture_plans', {
+            request_or_response: http._header_capture_plan(request_or_response)
+            for request_or_response in ('request', 'response')
+        })
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is immutable, change the settings of config.{} instead'.format(
+            self.__class__.__name__, self.integration_name,
+        ))
+
+    def __delattr__(self, key):
+        self.__setattr__(key, None)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memodict=None):
+        return self
+
+    def __getattr__(self, key):
+        # DEV: only called for the keys which are not slots
+        try:
+            return self._settings[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __getitem__(self, key):
+        return self._settings[key]
+
+    def __contains__(self, key):
+        return key in self._settings
+
+    def __repr__(self):
+        return '{}.{}({})'.format(self.__class__.__module__, self.__class__.__name__, ', '.join(self._settings))
+
+    def get(self, key, default=None):
+        return self._settings.get(key, default)
+
+    def get_analytics_sample_rate(self, use_global_config=False):
+        """See ``IntegrationConfig.get_analytics_sample_rate()``."""
+        return self._global_analytics_sample_rate if use_global_config else self._analytics_sample_rate
+
+    def header_is_traced(self, header_name):
+        """See ``IntegrationConfig.header_is_traced()``."""
+        return normalize_header_name(header_name) in self._whitelist_headers
+
+    def _header_capture_plan(self, request_or_response):
+        return self._header_capture_plans[request_or_response]
@@ -13,19 +13,34 @@
 # limitations under the License.
 
 import math
-import random
 import sys
+import threading
 import time
 import traceback
 
 from .compat import StringIO, stringify, iteritems, numeric_types
 from .constants import NUMERIC_TAGS, MANUAL_DROP_KEY, MANUAL_KEEP_KEY
 from .ext import errors, priority
+from .ids import default_id_generator
+from .internal.intern import intern_string
 from .internal.logger import get_logger
+from .vendor import six
 
 
 log = get_logger(__name__)
 
+# Rough cost in bytes of a span and of each of its metrics, used to estimate
+# the size of spans without walking the objects with `sizeof`
+SPAN_SIZE_ESTIMATE = 512
+METRIC_SIZE_ESTIMATE = 64
+
+_STRING_TYPES = (six.binary_type, six.text_type)
+
+# DEV: tags stored in a tuple are replaced by a new tuple on every write. These writes, and the conversion
+# of the tuple to a dictionary, are done under this lock so that concurrent writes to the same span are not
+# lost. A dictionary is never replaced once it stores the tags, it is updated without taking the lock.
+_TUPLE_TAGS_LOCK = threading.Lock()
+
 
 class Span(object):
 
@@ -37,9 +52,9 @@ class Span(object):
         'span_id',
         'trace_id',
         'parent_id',
-        'meta',
+        '_meta',
         'error',
-        'metrics',
+        '_metrics',
         'span_type',
         'start',
         'duration',
@@ -50,6 +65,7 @@ class Span(object):
         '_context',
         'finished',
         '_parent',
+        '_size',
         '__weakref__',
     ]
 
@@ -59,6 +75,9 @@ class Span(object):
         'tracer',
     )
 
+    # whether the tags of the span are recorded, see ``NonRecordingSpan``
+    is_recording = True
+
     def __init__(
         self,
         tracer,
@@ -92,23 +111,29 @@ class Span(object):
         :param object context: the Context of the span.
         """
         # required span info
-        self.name = name
-        self.service = service
-        self.resource = resource or name
-        self.span_type = span_type
+        # DEV: integrations create spans with the same few names, services and resources over and over,
+        # interning them makes all the buffered spans share a single copy of each string
+        self.name = intern_string(name)
+        self.service = intern_string(service)
+        self.resource = intern_string(resource) if resource else self.name
+        self.span_type = span_type and intern_string(span_type)
 
         # tags / metatdata
-        self.meta = {}
+        # DEV: tags are stored in a flat ``(key, value, key, value, ...)`` tuple until there are more
+        # than ``_MAX_TUPLE_TAGS`` of them or the ``meta``/``metrics`` dictionary is requested
+        self._meta = ()
         self.error = 0
-        self.metrics = {}
+        self._metrics = ()
+        # estimated size of the span and its tags, updated as tags are set
+        self._size = SPAN_SIZE_ESTIMATE
 
         # timing
         self.start = start or time.time()
         self.duration = None
 
         # tracing
-        self.trace_id = trace_id or _new_id()
-        self.span_id = span_id or _new_id()
+        self.trace_id = trace_id or default_id_generator.trace_id()
+        self.span_id = span_id or default_id_generator.span_id()
         self.parent_id = parent_id
         self.tracer = tracer
 
@@ -121,6 +146,28 @@ class Span(object):
         # state
         self.finished = False
 
+    def _reuse(self, tracer, name, service, resource, span_type, trace_id, span_id, parent_id, start, context):
+        """Reset a finished span to a new one. Used by ``SpanPool``."""
+        self.name = intern_string(name)
+        self.service = intern_string(service)
+        self.resource = intern_string(resource) if resource else self.name
+        self.span_type = span_type and intern_string(span_type)
+        # DEV: the tags dictionaries are replaced rather than cleared, they may still be used without the span
+        self._meta = ()
+        self.error = 0
+        self._metrics = ()
+        self._size = SPAN_SIZE_ESTIMATE
+        self.start = start or time.time()
+        self.duration = None
+        self.trace_id = trace_id or default_id_generator.trace_id()
+        self.span_id = span_id or default_id_generator.span_id()
+        self.parent_id = parent_id
+        self.tracer = tracer
+        self.sampled = True
+        self._context = context
+        self._parent = None
+        self.finished = False
+
     def finish(self, finish_time=None):
         """ Mark the end time of the span and submit it to the tracer.
             If the span has already been finished don't do anything
@@ -171,18 +218,67 @@ class Span(object):
             return
 
         try:
-            self.meta[key] = stringify(value)
+            value = stringify(value)
         except Exception:
             log.debug('error setting tag %s, ignoring it', key, exc_info=True)
+            return
+
+        meta = self._meta
+        if type(meta) is dict:
+            meta[intern_string(key)] = value
+        else:
+            with _TUPLE_TAGS_LOCK:
+                meta = self._meta
+                if type(meta) is dict:
+                    meta[intern_string(key)] = value
+                else:
+                    self._meta = _tuple_set(meta, intern_string(key), value)
+        # DEV: replaced tags are counted twice, the estimate only needs to be approximate,
+        #      keys that are not strings are stored as is and not counted
+        self._size += (len(key) if type(key) in _STRING_TYPES else 0) + len(value)
 
     def _remove_tag(self, key):
-        if key in self.meta:
-            del self.meta[key]
+        meta = self._meta
+        if type(meta) is dict:
+            meta.pop(key, None)
+        else:
+            with _TUPLE_TAGS_LOCK:
+                meta = self._meta
+                if type(meta) is dict:
+                    meta.pop(key, None)
+                else:
+                    self._meta = _tuple_remove(meta, key)
 
     def get_tag(self, key):
         """ Return the given tag or None if it doesn't exist.
         """
-        return self.meta.get(key, None)
+        meta = self._meta
+        if type(meta) is dict:
+            return meta.get(key)
+        return _tuple_get(meta, key)
+
+    @property
+    def meta(self):
+        """Dictionary of the tags of the span."""
+        meta = self._meta
+        if type(meta) is not dict:
+            # DEV: the caller may modify the dictionary, store tags in it from now on
+            with _TUPLE_TAGS_LOCK:
+                meta = self._meta
+                if type(meta) is not dict:
+                    meta = self._meta = dict(zip(meta[::2], meta[1::2]))
+        return meta
+
+    @meta.setter
+    def meta(self, meta):
+        self._meta = meta
+
+    def _meta_items(self):
+        """Return the ``(key, value)`` pairs of the tags, without converting them to a dictionary."""
+        meta = self._meta
+        if type(meta) is dict:
+            return meta.items()
+        return zip(meta[::2], meta[1::2])
 
     def set_tags(self, tags):
         """ Set a dictionary of tags on the given span. Keys and values
@@ -218,7 +314,17 @@ class Span(object):
             log.debug('ignoring not real metric %s:%s', key, value)
             return
 
-        self.metrics[key] = value
+        metrics = self._metrics
+        if type(metrics) is dict:
+            metrics[intern_string(key)] = value
+        else:
+            with _TUPLE_TAGS_LOCK:
+                metrics = self._metrics
+                if type(metrics) is dict:
+                    metrics[intern_string(key)] = value
+                else:
+                    self._metrics = _tuple_set(metrics, intern_string(key), value)
+        self._size += METRIC_SIZE_ESTIMATE
 
     def set_metrics(self, metrics):
         if metrics:
@@ -226,7 +332,45 @@ class Span(object):
                 self.set_metric(k, v)
 
     def get_metric(self, key):
-        return self.metrics.get(key)
+        metrics = self._metrics
+        if type(metrics) is dict:
+            return metrics.get(key)
+        return _tuple_get(metrics, key)
+
+    @property
+    def metrics(self):
+        """Dictionary of the metrics of the span."""
+        metrics = self._metrics
+        if type(metrics) is not dict:
+            # DEV: the caller may modify the dictionary, store metrics in it from now on
+            with _TUPLE_TAGS_LOCK:
+                metrics = self._metrics
+                if type(metrics) is not dict:
+                    metrics = self._metrics = dict(zip(metrics[::2], metrics[1::2]))
+        return metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self._metrics = metrics
+
+    def _metrics_items(self):
+        """Return the ``(key, value)`` pairs of the metrics, without converting them to a dictionary."""
+        metrics = self._metrics
+        if type(metrics) is dict:
+            return metrics.items()
+        return zip(metrics[::2], metrics[1::2])
+
+    def _estimate_size(self):
+        """
+        Return a cheap approximation of the memory footprint of the span, in bytes.
+
+        Tags set with ``set_tag()`` and ``set_metric()`` are accounted for when they are set,
+        tags added directly to the ``meta`` and ``metrics`` dictionaries are ignored.
+        """
+        resource = self.resource
+        if resource is self.name or type(resource) not in _STRING_TYPES:
+            return self._size
+        return self._size + len(resource)
 
     def to_dict(self):
         d = {
@@ -252,10 +396,10 @@ class Span(object):
         if self.duration:
             d['duration'] = int(self.duration * 1e9)  # ns
 
-        if self.meta:
+        if self._meta:
             d['meta'] = self.meta
 
-        if self.metrics:
+        if self._metrics:
             d['metrics'] = self.metrics
 
         if self.span_type:
@@ -318,7 +462,7 @@ class Span(object):
             ('tags', '')
         ]
 
-        lines.extend((' ', '%s:%s' % kv) for kv in sorted(self.meta.items()))
+        lines.extend((' ', '%s:%s' % kv) for kv in sorted(self._meta_items()))
         return '\n'.join('%10s %s' % l for l in lines)
 
     @property
@@ -350,9 +494,85 @@ class Span(object):
         )
 
 
-_SystemRandom = random.SystemRandom()
+class NonRecordingSpan(Span):
+    """
+    Span of a trace dropped by the sampler.
+
+    The tracer turns the spans of traces which are not sampled into
+    ``NonRecordingSpan``: they keep their ids and context, so that the trace can
+    still be propagated, but setting tags, metrics or exception information does
+    nothing since the trace will not be exported. Integrations can check
+    ``span.is_recording`` to skip computing expensive tag values.
+
+    The manual keep and drop tags still update the sampling priority of the
+    context, which is propagated to the downstream services.
+    """
+    __slots__ = ()
+
+    is_recording = False
+
+    def set_tag(self, key, value=None):
+        if key == MANUAL_KEEP_KEY:
+            self.context.sampling_priority = priority.USER_KEEP
+        elif key == MANUAL_DROP_KEY:
+            self.context.sampling_priority = priority.USER_REJECT
+
+    def set_metric(self, key, value):
+        pass
+
+    def set_metrics(self, metrics):
+        pass
+
+    def set_traceback(self, limit=20):
+        pass
+
+    def set_exc_info(self, exc_type, exc_val, exc_tb):
+        # DEV: the error flag is cheap to keep, only the formatting of the traceback is skipped
+        if exc_type and exc_val and exc_tb:
+            self.error = 1
 
 
 def _new_id():
     """Generate a random trace_id or span_id"""
-    return _SystemRandom.getrandbits(64)
+    return default_id_generator.span_id()
+
+
+# maximum number of tags or metrics of a span stored in a tuple rather than a dictionary
+_MAX_TUPLE_TAGS = 8
+
+
+def _tuple_index(items, key):
+    """Return the index of ``key`` in the flat ``(key, value, ...)`` tuple ``items``, ``-1`` if it is missing."""
+    if key not in items:
+        return -1
+    i = items.index(key)
+    # DEV: skip the values equal to the key
+    while i % 2:
+        if key not in items[i + 1:]:
+            return -1
+        i = items.index(key, i + 1)
+    return i
+
+
+def _tuple_get(items, key):
+    i = _tuple_index(items, key)
+    return items[i + 1] if i >= 0 else None
+
+
+def _tuple_set(items, key, value):
+    """Return ``items`` with ``key`` set to ``value``, as a dictionary once it holds too many items."""
+    i = _tuple_index(items, key)
+    if i >= 0:
+        return items[:i + 1] + (value, ) + items[i + 2:]
+    if len(items) < 2 * _MAX_TUPLE_TAGS:
+        return items + (key, value)
+    tags = dict(zip(items[::2], items[1::2]))
+    tags[key] = value
+    return tags
+
+
+def _tuple_remove(items, key):
+    i = _tuple_index(items, key)
+    if i < 0:
+        return items
+    return items[:i] + items[i + 2:]
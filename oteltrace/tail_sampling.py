@@ -0,0 +1,266 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tail-based sampling of the finished traces.
+
+Samplers decide whether a trace is kept when its root span starts, before it
+is known whether the request fails or is slow. A :class:`TailSampler` makes
+this decision once the trace is finished: it is given to the writer with
+``tracer.configure(tail_sampler=TailSampler(...))`` and processes the traces
+flushed by the writer, on the writer thread, so request threads never wait
+for it.
+"""
+from collections import OrderedDict
+from itertools import chain
+
+from .constants import TAIL_SAMPLE_RATE_METRIC_KEY
+from .internal.logger import get_logger
+from .internal.writer import estimate_trace_size
+from .sampler import KNUTH_FACTOR, MAX_TRACE_ID
+from .vendor import monotonic
+
+log = get_logger(__name__)
+
+# reasons for keeping a trace, counted in ``TailSampler.counts``
+KEEP_ERROR = 'error'
+KEEP_LATENCY = 'latency'
+KEEP_PREDICATE = 'predicate'
+KEEP_SAMPLED = 'sampled'
+DROP = 'dropped'
+
+
+class _PendingTrace(object):
+    __slots__ = ('deadline', 'chunks', 'size')
+
+    def __init__(self, deadline, chunk, size):
+        self.deadline = deadline
+        self.chunks = [chunk]
+        self.size = size
+
+
+class _LatencyHistory(object):
+    """Durations of the last root spans of a resource, and the percentile of these durations."""
+    __slots__ = ('durations', 'index', 'threshold', 'updates')
+
+    def __init__(self):
+        self.durations = []
+        self.index = 0
+        self.threshold = None
+        self.updates = 0
+
+    def add(self, duration, size, percentile, min_samples):
+        durations = self.durations
+        if len(durations) < size:
+            durations.append(duration)
+        else:
+            durations[self.index] = duration
+            self.index = (self.index + 1) % size
+
+        # DEV: sorting the history for every trace would be the most expensive part of the
+        # decision, the percentile is only computed again after a tenth of the history changed
+        self.updates += 1
+        n = len(durations)
+        if n >= min_samples and (self.threshold is None or self.updates * 10 >= size):
+            self.updates = 0
+            # nearest-rank percentile
+            rank = max(1, -(-n * percentile // 100))
+            self.threshold = sorted(durations)[int(rank) - 1]
+
+
+class TailSampler(object):
+    """
+    Sampler deciding which traces are kept once they are finished.
+
+    Finished traces are buffered for ``decision_wait`` seconds, so that the
+    spans of a trace flushed in several chunks (see partial flush) are decided
+    together. A trace is then kept if:
+
+    * one of its spans has an error,
+    * its root span lasted longer than the ``latency_percentile`` percentile of
+      the last ``history_size`` root spans with the same resource,
+    * one of the ``predicates`` returns ``True`` for its list of spans,
+    * or it is part of the ``sample_rate`` share of the remaining traces.
+
+    The buffered traces are estimated to use at most ``max_bytes`` bytes: when
+    this budget is exceeded, the oldest traces are decided early. Chunks of a
+    trace flushed after it was decided follow the same decision, for the last
+    ``max_decisions`` decided traces.
+
+    The sampler is only used by the writer thread, it is not thread-safe. It
+    only sees the traces kept by the sampler of the tracer, which should keep
+    all of them for the tail sampler to see all the traces.
+    """
+
+    # key shared by the resources seen once ``max_resources`` resources are tracked
+    OTHER_RESOURCE = None
+
+    def __init__(self, sample_rate=0.1, latency_percentile=99, predicates=None, decision_wait=1.0,
+                 max_bytes=16 * 1024 * 1024, history_size=100, min_history=20, max_resources=1000,
+                 max_decisions=10000):
+        """
+        :param float sample_rate: share of the traces kept when no other rule keeps them.
+        :param float latency_percentile: percentile of the durations of the root spans of a resource over
+            which traces are kept, ``None`` disables the latency rule.
+        :param list predicates: functions called with the list of spans of a trace, the trace is kept when
+            one of them returns ``True``.
+        :param float decision_wait: number of seconds a trace is buffered before it is decided.
+        :param int max_bytes: estimated size in bytes of the buffered traces over which the oldest traces are
+            decided early.
+        :param int history_size: number of root span durations kept by resource to compute the percentile.
+        :param int min_history: number of root spans of a resource needed before the latency rule applies.
+        :param int max_resources: maximum number of resources with their own durations history.
+        :param int max_decisions: number of decided traces remembered for their late chunks.
+        """
+        self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        self._sampling_id_threshold = self.sample_rate * MAX_TRACE_ID
+        self.latency_percentile = latency_percentile
+        self.predicates = list(predicates or ())
+        self.decision_wait = decision_wait
+        self.max_bytes = max_bytes
+        self.history_size = history_size
+        self.min_history = min_history
+        self.max_resources = max_resources
+        self.max_decisions = max_decisions
+
+        # trace id -> _PendingTrace, oldest first
+        self._pending = OrderedDict()
+        self._pending_bytes = 0
+        # trace id -> whether the trace was kept, oldest first
+        self._decisions = OrderedDict()
+        self._latencies = {}
+        self.counts = {KEEP_ERROR: 0, KEEP_LATENCY: 0, KEEP_PREDICATE: 0, KEEP_SAMPLED: 0, DROP: 0}
+
+    @property
+    def pending(self):
+        """Number of traces waiting for a decision."""
+        return len(self._pending)
+
+    @property
+    def pending_bytes(self):
+        """Estimated size in bytes of the traces waiting for a decision."""
+        return self._pending_bytes
+
+    def reset(self):
+        """Drop the traces waiting for a decision, e.g. the traces of the parent of a forked process."""
+        self._pending = OrderedDict()
+        self._pending_bytes = 0
+
+    def next_decision_in(self):
+        """Return the number of seconds before the next trace is decided, ``None`` if none is waiting."""
+        if not self._pending:
+            return None
+        deadline = self._pending[next(iter(self._pending))].deadline
+        return max(0, deadline - monotonic.monotonic())
+
+    def process_traces(self, traces, flush=False):
+        """
+        Buffer the given traces and return the buffered traces which are
+        decided and kept.
+
+        :param list traces: finished traces, or chunks of traces.
+        :param bool flush: decide all the buffered traces.
+        """
+        now = monotonic.monotonic()
+        kept = []
+        pending = self._pending
+        decisions = self._decisions
+
+        for trace in traces:
+            if not trace:
+                continue
+            trace_id = trace[0].trace_id
+            decision = decisions.get(trace_id)
+            if decision is not None:
+                # late chunk of a decided trace
+                if decision:
+                    kept.append(trace)
+                continue
+
+            size = estimate_trace_size(trace)
+            entry = pending.get(trace_id)
+            if entry is None:
+                pending[trace_id] = _PendingTrace(now + self.decision_wait, trace, size)
+            else:
+                entry.chunks.append(trace)
+                entry.size += size
+            self._pending_bytes += size
+
+        while pending:
+            trace_id = next(iter(pending))
+            entry = pending[trace_id]
+            if not flush and entry.deadline > now and self._pending_bytes <= self.max_bytes:
+                break
+            del pending[trace_id]
+            self._pending_bytes -= entry.size
+
+            keep = self._decide(entry.chunks)
+            decisions[trace_id] = keep
+            if len(decisions) > self.max_decisions:
+                decisions.popitem(last=False)
+            if keep:
+                kept.extend(entry.chunks)
+
+        return kept
+
+    def _decide(self, chunks):
+        """Return whether the trace made of the given chunks is kept."""
+        spans = chunks[0] if len(chunks) == 1 else list(chain.from_iterable(chunks))
+        counts = self.counts
+
+        root = None
+        for span in spans:
+            if span.error:
+                counts[KEEP_ERROR] += 1
+                return True
+            if span.parent_id is None:
+                root = span
+
+        if root is not None and self.latency_percentile is not None and root.duration is not None:
+            if self._is_slow(root.resource, root.duration):
+                counts[KEEP_LATENCY] += 1
+                return True
+
+        for predicate in self.predicates:
+            try:
+                if predicate(spans):
+                    counts[KEEP_PREDICATE] += 1
+                    return True
+            except Exception:
+                log.debug('error in tail sampling predicate %r', predicate, exc_info=True)
+
+        # DEV: the decision only depends on the trace id, so that it is the same for every chunk of a trace
+        if ((spans[0].trace_id * KNUTH_FACTOR) % MAX_TRACE_ID) <= self._sampling_id_threshold:
+            counts[KEEP_SAMPLED] += 1
+            if root is not None:
+                root.set_metric(TAIL_SAMPLE_RATE_METRIC_KEY, self.sample_rate)
+            return True
+
+        counts[DROP] += 1
+        return False
+
+    def _is_slow(self, resource, duration):
+        """Return whether the duration exceeds the percentile of the resource, and add it to its history."""
+        latencies = self._latencies
+        history = latencies.get(resource)
+        if history is None:
+            if len(latencies) >= self.max_resources:
+                resource = self.OTHER_RESOURCE
+                history = latencies.get(resource)
+            if history is None:
+                history = latencies[resource] = _LatencyHistory()
+
+        threshold = history.threshold
+        history.add(duration, self.history_size, self.latency_percentile, self.min_history)
+        return threshold is not None and duration > threshold
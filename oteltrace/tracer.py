@@ -19,12 +19,15 @@ from os import getpid
 from .constants import FILTERS_KEY, SAMPLE_RATE_METRIC_KEY
 from .ext import system
 from .ext.priority import AUTO_REJECT, AUTO_KEEP
+from .internal import forksafe
 from .internal.logger import get_logger
-from .internal.writer import AgentWriter
+from .internal.pool import POOLING_SUPPORTED, SpanPool
+from .internal.writer import AgentWriter, DROP_NEWEST, DROP_OLDEST
 from .provider import DefaultContextProvider
-from .context import Context
+from .context import Context, PartialFlushPolicy
 from .sampler import AllSampler, OpenTelemetrySampler, RateSampler, RateByServiceSampler
-from .span import Span
+from .ids import default_id_generator
+from .span import NonRecordingSpan, Span
 from .utils.deprecation import deprecated
 from .propagation import http as http_propagator_module
 from . import compat
@@ -54,9 +57,19 @@ class Tracer(object):
         self.log = log
         self.sampler = None
         self.priority_sampler = None
+        self._id_generator = default_id_generator
+        self._span_pool = None
+        self._tail_sampler = None
 
         self._runtime_worker = None
 
+        # thresholds triggering the flush of the writer, kept when the writer is recreated
+        self._flush_thresholds = {}
+        # policy applied when a trace is written to the full buffer of the writer, kept when it is recreated
+        self._queue_drop_policy = DROP_OLDEST
+        # partial flush of the traces, ``None`` uses the settings from the environment
+        self._partial_flush = None
+
         # Apply the default configuration
         self.configure(
             enabled=True,
@@ -73,6 +86,7 @@ class Tracer(object):
         # Runtime id used for associating data collected during runtime to
         # traces
         self._pid = getpid()
+        forksafe.register(self)
 
     @property
     def debug_logging(self):
@@ -116,7 +130,10 @@ class Tracer(object):
 
     def configure(self, enabled=None, sampler=None, context_provider=None,
                   wrap_executor=None, priority_sampling=None, settings=None, collect_metrics=None,
-                  api=None, http_propagator=None):
+                  api=None, http_propagator=None, flush_max_spans=None, flush_max_bytes=None,
+                  flush_max_age=None, id_generator=None, span_pool_size=None, partial_flush_enabled=None,
+                  partial_flush_min_spans=None, partial_flush_max_bytes=None, partial_flush_max_age=None,
+                  tail_sampler=None, queue_drop_policy=None):
         """
         Configure an existing Tracer the easy way.
         Allow to configure or reconfigure a Tracer instance.
@@ -135,10 +152,54 @@ class Tracer(object):
         :param collect_metrics: Whether to enable runtime metrics collection.
         :param object api: object to export the traces to a backend.
         :param class http_propagator: type of propagator to be used to distribute the tracing context.
+        :param int flush_max_spans: number of buffered spans triggering a flush of the writer.
+        :param int flush_max_bytes: estimated size in bytes of the buffered traces triggering a flush of the writer.
+        :param float flush_max_age: maximum time in seconds a finished trace is buffered before being flushed.
+        :param object id_generator: ``IdGenerator`` instance generating the trace and span ids,
+            see :mod:`oteltrace.ids`.
+        :param int span_pool_size: maximum number of exported spans kept to be reused by new spans, ``0``
+            disables the reuse of spans (default). Spans still referenced after they are exported are not
+            reused. The API must accept a ``done`` callback in ``send_traces()``, like ``APIOtel``.
+        :param bool partial_flush_enabled: Whether the finished spans of traces which are not finished yet
+            are flushed when one of the partial flush thresholds is reached.
+        :param int partial_flush_min_spans: number of finished spans of a trace triggering a partial flush.
+        :param int partial_flush_max_bytes: estimated size in bytes of the finished spans of a trace
+            triggering a partial flush.
+        :param float partial_flush_max_age: time in seconds since the oldest finished span of a trace
+            finished triggering a partial flush.
+        :param object tail_sampler: ``TailSampler`` instance deciding which finished traces are exported, see
+            :mod:`oteltrace.tail_sampling`. ``False`` disables the tail sampling.
+        :param str queue_drop_policy: trace dropped when a trace is written to the full buffer of the writer,
+            ``'oldest'`` (default) or ``'newest'``, see ``DROP_OLDEST`` and ``DROP_NEWEST`` in
+            :mod:`oteltrace.internal.writer`.
         """
         if enabled is not None:
             self.enabled = enabled
 
+        if id_generator is not None:
+            self._id_generator = id_generator
+
+        if queue_drop_policy is not None:
+            if queue_drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+                raise ValueError('invalid drop policy {!r}'.format(queue_drop_policy))
+            self._queue_drop_policy = queue_drop_policy
+
+        partial_flush = dict(
+            enabled=partial_flush_enabled,
+            min_spans=partial_flush_min_spans,
+            max_bytes=partial_flush_max_bytes,
+            max_age=partial_flush_max_age,
+        )
+        partial_flush = {k: v for k, v in partial_flush.items() if v is not None}
+        if partial_flush:
+            if self._partial_flush is None:
+                self._partial_flush = PartialFlushPolicy.from_env()
+            for k, v in partial_flush.items():
+                setattr(self._partial_flush, k, v)
+
+        if span_pool_size is not None:
+            self._span_pool = SpanPool(span_pool_size) if span_pool_size and POOLING_SUPPORTED else None
+
         filters = None
         if settings is not None:
             filters = settings.get(FILTERS_KEY)
@@ -157,12 +218,31 @@ class Tracer(object):
         if isinstance(self.sampler, OpenTelemetrySampler):
             self.sampler._priority_sampler = self.priority_sampler
 
+        flush_thresholds = dict(max_spans=flush_max_spans, max_bytes=flush_max_bytes, max_age=flush_max_age)
+        flush_thresholds = {k: v for k, v in flush_thresholds.items() if v is not None}
+        self._flush_thresholds.update(flush_thresholds)
+
         if filters is not None or priority_sampling is not None or api is not None:
             self.writer = AgentWriter(
                 filters=filters,
                 priority_sampler=self.priority_sampler,
                 api=api,
+                queue_drop_policy=self._queue_drop_policy,
             )
+            flush_thresholds = self._flush_thresholds
+
+        if flush_thresholds and getattr(self, 'writer', None):
+            self.writer.set_flush_thresholds(**flush_thresholds)
+
+        if queue_drop_policy is not None and getattr(self, 'writer', None):
+            self.writer.set_queue_drop_policy(queue_drop_policy)
+
+        if tail_sampler is not None:
+            self._tail_sampler = tail_sampler or None
+
+        if getattr(self, 'writer', None):
+            self.writer.span_pool = self._span_pool
+            self.writer.tail_sampler = self._tail_sampler
 
         if context_provider is not None:
             self._context_provider = context_provider
@@ -220,6 +300,8 @@ class Tracer(object):
             context = Context()
             parent = None
 
+        new_span = Span if self._span_pool is None else self._span_pool.new_span
+
         if parent:
             trace_id = parent.trace_id
             parent_span_id = parent.span_id
@@ -234,10 +316,11 @@ class Tracer(object):
             if parent:
                 service = service or parent.service
 
-            span = Span(
+            span = new_span(
                 self,
                 name,
                 trace_id=trace_id,
+                span_id=self._id_generator.span_id(),
                 parent_id=parent_span_id,
                 service=service,
                 resource=resource,
@@ -248,18 +331,26 @@ class Tracer(object):
             if parent:
                 span.sampled = parent.sampled
                 span._parent = parent
+                if not span.sampled:
+                    # DEV: `Span` and `NonRecordingSpan` have the same layout, switching the class
+                    # of the span avoids creating another object
+                    span.__class__ = NonRecordingSpan
 
         else:
             # this is the root span of a new trace
-            span = Span(
+            span = new_span(
                 self,
                 name,
+                trace_id=self._id_generator.trace_id(),
+                span_id=self._id_generator.span_id(),
                 service=service,
                 resource=resource,
                 span_type=span_type,
             )
 
             span.sampled = self.sampler.sample(span)
+            if not span.sampled:
+                span.__class__ = NonRecordingSpan
             # Old behavior
             # DEV: The new sampler sets metrics and priority sampling on the span for us
             if not isinstance(self.sampler, OpenTelemetrySampler):
@@ -292,13 +383,13 @@ class Tracer(object):
         if self.tags:
             span.set_tags(self.tags)
         if not span._parent:
-            span.set_tag(system.PID, getpid())
+            span.set_tag(system.PID, self._pid if forksafe.AT_FORK_SUPPORTED else getpid())
 
         # add it to the current context
         context.add_span(span)
 
         # check for new process if runtime metrics worker has already been started
-        if self._runtime_worker:
+        if self._runtime_worker and not forksafe.AT_FORK_SUPPORTED:
             self._check_new_process()
 
         # update set of services handled by tracer
@@ -320,6 +411,17 @@ class Tracer(object):
     def _start_runtime_worker(self):
         log.warning('RuntimeWorker() not implemented.')
 
+    def _after_fork(self):
+        """Update the tracer in a forked process, its writer and runtime worker restart by themselves."""
+        self._pid = getpid()
+
+        # Assume that the services of the child are not necessarily a subset of those
+        # of the parent.
+        self._services = set()
+
+        if self._runtime_worker is not None:
+            self._update_metrics_client_constant_tags()
+
     def _check_new_process(self):
         """ Checks if the tracer is in a new process (was forked) and performs
             the necessary updates if it is a new process
@@ -421,7 +523,7 @@ class Tracer(object):
         Record the given ``Context`` if it's finished.
         """
         # extract and enqueue the trace if it's sampled
-        trace, sampled = context.get()
+        trace, sampled = context.get(self._partial_flush)
         if trace and sampled:
             self.write(trace)
 
@@ -12,7 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
+import re
+import threading
+
 from oteltrace import Tracer
+from oteltrace.context import Context
+from oteltrace.span import Span
+from oteltrace.ids import RandomIdGenerator, SystemRandomIdGenerator
+from oteltrace.internal.rate_limiter import RateLimiter, ShardedRateLimiter
+from oteltrace.filters import FilterRequestsOnUrl
+from oteltrace.http import store_request_headers
+from oteltrace.internal.writer import AgentWriter, RingBuffer, DROP_NEWEST, DROP_OLDEST
+from oteltrace.propagation.b3 import B3HTTPPropagator
+from oteltrace.propagation.composite import CompositeHTTPPropagator
+from oteltrace.propagation.datadog import DatadogHTTPPropagator
+from oteltrace.propagation.w3c import W3CHTTPPropagator
+from oteltrace.sampler import OpenTelemetrySampler, RateSampler, SamplingRule
+from oteltrace.settings import Config, IntegrationConfig
+from oteltrace.tail_sampling import TailSampler
 import pytest
 
 from .test_tracer import DummyWriter
@@ -77,6 +95,292 @@ def test_tracer_start_finish_span(benchmark, tracer):
     benchmark(func, tracer)
 
 
+@pytest.mark.parametrize('id_generator', [SystemRandomIdGenerator, RandomIdGenerator])
+def test_tracer_start_finish_span_id_generator(benchmark, tracer, id_generator):
+    tracer.configure(id_generator=id_generator())
+
+    def func(tracer):
+        s = tracer.start_span('benchmark')
+        s.finish()
+
+    benchmark(func, tracer)
+
+
+class _ReleasingWriter(object):
+    """Writer exporting the traces by batches of ``flush_max_spans`` spans, releasing them to the span pool"""
+
+    def __init__(self, tracer, flush_max_spans=1000):
+        self._tracer = tracer
+        self._flush_max_spans = flush_max_spans
+        self._traces = []
+        self._spans = 0
+
+    def write(self, spans=None, services=None):
+        self._traces.append(spans)
+        self._spans += len(spans)
+        if self._spans >= self._flush_max_spans:
+            traces, self._traces, self._spans = self._traces, [], 0
+            span_pool = self._tracer._span_pool
+            if span_pool is not None:
+                span_pool.release(traces)
+
+
+@pytest.mark.parametrize('span_pool_size', [0, 1024])
+def test_tracer_trace_span_pool(benchmark, span_pool_size):
+    tracer = Tracer()
+    tracer.configure(span_pool_size=span_pool_size)
+    tracer.writer = _ReleasingWriter(tracer)
+
+    def func(tracer):
+        with tracer.trace('web.request', service='web') as root:
+            root.set_tag('http.method', 'GET')
+            with tracer.trace('db.query') as span:
+                span.set_tag('sql.query', 'SELECT 1')
+
+    benchmark(func, tracer)
+
+
+def test_tracer_nested_spans(benchmark, tracer):
+    def func(tracer, depth=10):
+        with tracer.trace('nested'):
+            if depth > 1:
+                func(tracer, depth - 1)
+
+    benchmark(func, tracer)
+
+
+def test_context_nested_spans(benchmark):
+    spans = [Span(None, 'nested') for _ in range(10)]
+    for parent, child in zip(spans, spans[1:]):
+        child._parent = parent
+
+    def func():
+        context = Context()
+        for span in spans:
+            context.add_span(span)
+        for span in reversed(spans):
+            context.close_span(span)
+        context.get()
+
+    benchmark(func)
+
+
+@pytest.mark.parametrize('partial_flush', [False, True])
+def test_context_finish_10k_spans(benchmark, partial_flush):
+    def setup():
+        context = Context()
+        context._partial_flush_enabled = partial_flush
+        context._partial_flush_min_spans = 500
+        root = Span(None, 'root')
+        context.add_span(root)
+        spans = []
+        for _ in range(10000):
+            span = Span(None, 'child')
+            span._parent = root
+            context.add_span(span)
+            spans.append(span)
+        return (context, spans), {}
+
+    def func(context, spans):
+        # what `Span.finish()` does for every span of a long running trace
+        for span in spans:
+            span.finished = True
+            context.close_span(span)
+            context.get()
+
+    benchmark.pedantic(func, setup=setup, rounds=20)
+
+
+@pytest.mark.parametrize('sample_rate', [1.0, 0.01])
+def test_tracer_tagged_trace_sampling(benchmark, tracer, sample_rate):
+    tracer.configure(sampler=RateSampler(sample_rate))
+
+    def func(tracer):
+        with tracer.trace('web.request', service='web', resource='GET /users') as root:
+            root.set_tag('http.method', 'GET')
+            root.set_tag('http.url', 'http://localhost/users')
+            for i in range(5):
+                with tracer.trace('postgres.query', service='db') as span:
+                    span.set_tag('sql.query', 'SELECT * FROM users WHERE id = %s')
+                    span.set_tag('db.user', 'app')
+                    span.set_metric('db.rowcount', i)
+            root.set_tag('http.status_code', 200)
+
+    benchmark(func, tracer)
+
+
+def test_sampler_50_rules(benchmark):
+    rules = []
+    for i in range(25):
+        rules.append(SamplingRule(sample_rate=0.5, service='service-{}'.format(i), name='web.request'))
+        rules.append(SamplingRule(sample_rate=0.5, service=re.compile('^worker-{}-'.format(i))))
+    sampler = OpenTelemetrySampler(rules=rules, rate_limit=OpenTelemetrySampler.NO_RATE_LIMIT)
+    # matched by the last rule
+    span = Span(None, 'worker.job', service='worker-24-east')
+
+    benchmark(sampler.sample, span)
+
+
+@pytest.mark.parametrize('predicates', [0, 5])
+def test_tail_sampler_1k_traces(benchmark, predicates):
+    # 1000 finished traces of 5 spans on 20 resources, 1% of them with an error
+    traces = []
+    for i in range(1000):
+        root = Span(None, 'web.request', resource='GET /{}'.format(i % 20), trace_id=i + 1, span_id=1)
+        root.duration = 0.01 * (i % 97)
+        trace = []
+        for j in range(4):
+            span = Span(None, 'db.query', trace_id=i + 1, span_id=j + 2, parent_id=1)
+            span._parent = root
+            span.duration = 0.001
+            trace.append(span)
+        trace.append(root)
+        trace[0].error = int(i % 100 == 0)
+        traces.append(trace)
+
+    def setup():
+        sampler = TailSampler(sample_rate=0.1, predicates=[lambda spans: spans[-1].get_tag('vip')] * predicates)
+        # fill the latency histories like in a long running process
+        sampler.process_traces(traces, flush=True)
+        sampler._decisions.clear()
+        return (sampler, traces), {}
+
+    def func(sampler, traces):
+        # what the writer thread does on flush, divided by 1000 it is the cost of one decision
+        sampler.process_traces(traces, flush=True)
+
+    benchmark.pedantic(func, setup=setup, rounds=100)
+
+
+# headers of the 40 headers request of `test_propagator_extract`, besides the ones of the propagator
+_REQUEST_HEADERS = [('Host', 'example.com'), ('User-Agent', 'Mozilla/5.0'), ('Accept', '*/*')] + [
+    ('X-Custom-Header-{}'.format(i), 'value-{}'.format(i)) for i in range(33)
+]
+_PROPAGATION_HEADERS = {
+    'datadog': [
+        ('X-Datadog-Trace-Id', '1234'), ('X-Datadog-Parent-Id', '5678'),
+        ('X-Datadog-Sampling-Priority', '1'), ('X-Datadog-Origin', 'synthetics'),
+    ],
+    'b3': [
+        ('X-B3-TraceId', '0af7651916cd43dd8448eb211c80319c'), ('X-B3-SpanId', 'b7ad6b7169203331'),
+        ('X-B3-Sampled', '1'), ('X-B3-Flags', '0'),
+    ],
+    'w3c': [
+        ('traceparent', '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'),
+        ('tracestate', 'rojo=00f067aa0ba902b7,congo=t61rcWkgMzE'),
+        ('Cache-Control', 'no-cache'), ('Pragma', 'no-cache'),
+    ],
+}
+_PROPAGATORS = {'datadog': DatadogHTTPPropagator, 'b3': B3HTTPPropagator, 'w3c': W3CHTTPPropagator}
+
+
+@pytest.mark.parametrize('carrier', ['dict', 'wsgi'])
+@pytest.mark.parametrize('propagation', ['datadog', 'b3', 'w3c'])
+def test_propagator_extract(benchmark, propagation, carrier):
+    headers = _REQUEST_HEADERS + _PROPAGATION_HEADERS[propagation]
+    if carrier == 'wsgi':
+        headers = {'HTTP_{}'.format(name.upper().replace('-', '_')): value for name, value in headers}
+    else:
+        headers = dict(headers)
+    assert len(headers) == 40
+    propagator = _PROPAGATORS[propagation]()
+    assert propagator.extract(headers).trace_id
+
+    benchmark(propagator.extract, headers)
+
+
+@pytest.mark.parametrize('propagation', ['datadog', 'b3', 'w3c'])
+def test_composite_propagator_extract(benchmark, propagation):
+    headers = dict(_REQUEST_HEADERS + _PROPAGATION_HEADERS[propagation])
+    propagator = CompositeHTTPPropagator([W3CHTTPPropagator(), B3HTTPPropagator(), DatadogHTTPPropagator()])
+    assert propagator.extract(headers).trace_id
+
+    benchmark(propagator.extract, headers)
+
+
+@pytest.mark.parametrize('propagation', ['datadog', 'b3', 'w3c', 'composite'])
+def test_propagator_inject(benchmark, propagation):
+    if propagation == 'composite':
+        propagator = CompositeHTTPPropagator([W3CHTTPPropagator(), B3HTTPPropagator(), DatadogHTTPPropagator()])
+    else:
+        propagator = _PROPAGATORS[propagation]()
+    context = Context(trace_id=0x0af7651916cd43dd8448eb211c80319c, span_id=0xb7ad6b7169203331, sampling_priority=1)
+
+    benchmark(propagator.inject, context, {})
+
+
+def _w3c_carriers(n_distinct):
+    """Return ``n_distinct`` carriers with a 32 members tracestate differing by the value of the first member."""
+    members = ','.join('vendor{}=00f067aa0ba902b7'.format(i) for i in range(1, 32))
+    traceparent = _PROPAGATION_HEADERS['w3c'][0][1]
+    return [
+        dict(_REQUEST_HEADERS, traceparent=traceparent, tracestate='rojo={:016x},{}'.format(i, members))
+        for i in range(n_distinct)
+    ]
+
+
+@pytest.mark.parametrize('n_distinct', [1, 4096])
+def test_w3c_tracestate_extract(benchmark, n_distinct):
+    propagator = W3CHTTPPropagator()
+    carriers = itertools.cycle(_w3c_carriers(n_distinct))
+    assert len(propagator.extract(next(carriers)).tracestate) == 32
+
+    benchmark(lambda: propagator.extract(next(carriers)))
+
+
+@pytest.mark.parametrize('n_distinct', [1, 4096])
+def test_w3c_tracestate_extract_inject(benchmark, n_distinct):
+    propagator = W3CHTTPPropagator()
+    carriers = itertools.cycle(_w3c_carriers(n_distinct))
+
+    def propagate():
+        propagator.inject(propagator.extract(next(carriers)), {})
+    benchmark(propagate)
+
+
+def _framework_headers(framework, headers):
+    """Return the headers of a request as the headers object of a web framework."""
+    environ = {'HTTP_{}'.format(name.upper().replace('-', '_')): value for name, value in headers}
+    if framework == 'flask':
+        return pytest.importorskip('werkzeug.datastructures').EnvironHeaders(environ)
+    if framework == 'django':
+        return pytest.importorskip('django.http.request').HttpHeaders(environ)
+    if framework == 'aiohttp':
+        return pytest.importorskip('multidict').CIMultiDictProxy(pytest.importorskip('multidict').CIMultiDict(headers))
+    if framework == 'list':
+        return list(headers)
+    return dict(headers)
+
+
+@pytest.mark.parametrize('framework', ['dict', 'list', 'flask', 'django', 'aiohttp'])
+def test_store_request_headers(benchmark, framework):
+    headers = _framework_headers(framework, _REQUEST_HEADERS + [('X-Request-Id', '1234'), ('Referer', '/')] * 2)
+    integration_config = IntegrationConfig(Config(), 'benchmark')
+    integration_config.http.trace_headers(['user-agent', 'x-request-id', 'referer'])
+    span = Span(None, 'web.request')
+    store_request_headers(headers, span, integration_config)
+    assert span.get_tag('http.request.headers.x-request-id') == '1234'
+
+    benchmark(store_request_headers, headers, span, integration_config)
+
+
+@pytest.mark.parametrize('snapshot', [False, True])
+def test_integration_config_reads(benchmark, snapshot):
+    config = Config()
+    config._add('web', dict(service_name='web', distributed_tracing=True))
+
+    def request():
+        # the settings read by a web framework integration for every request
+        integration_config = config.web.snapshot() if snapshot else config.web
+        integration_config.get('distributed_tracing', True)
+        integration_config.get_analytics_sample_rate(use_global_config=True)
+        integration_config.trace_query_string
+        integration_config.service_name
+        integration_config._header_capture_plan('request')
+        integration_config._header_capture_plan('response')
+    benchmark(request)
+
+
 def test_trace_simple_trace(benchmark, tracer):
     def func(tracer):
         with tracer.trace('parent'):
@@ -104,3 +408,174 @@ def test_tracer_large_trace(benchmark, tracer):
             func(tracer, level+1)
 
     benchmark(func, tracer)
+
+
+@pytest.mark.parametrize('drop_policy', [DROP_OLDEST, DROP_NEWEST])
+@pytest.mark.parametrize('producers', [1, 8, 32])
+def test_writer_queue_put(benchmark, drop_policy, producers):
+    # every producer puts the same number of traces, a consumer drains concurrently
+    trace = [object()] * 5
+    puts = 32000 // producers
+
+    def produce(queue):
+        for _ in range(puts):
+            queue.put(trace)
+
+    def func():
+        queue = RingBuffer(maxsize=1000, drop_policy=drop_policy)
+        done = threading.Event()
+
+        def consume():
+            while not done.wait(0.001):
+                queue.get()
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        threads = [threading.Thread(target=produce, args=(queue, )) for _ in range(producers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        done.set()
+        consumer.join()
+
+    benchmark(func)
+
+
+def test_writer_apply_filters_10k_traces(benchmark):
+    filters = [
+        FilterRequestsOnUrl([r'http://example\.com/health', r'http://example\.com/ping']),
+        FilterRequestsOnUrl([r'http://example\.com/static/.*\.css', r'http://example\.com/static/.*\.js']),
+        FilterRequestsOnUrl(r'http://internal\..*'),
+        FilterRequestsOnUrl([r'http://example\.com/admin/{}'.format(i) for i in range(10)]),
+        FilterRequestsOnUrl(r'.*\?debug=1'),
+    ]
+    writer = AgentWriter(filters=filters)
+    writer.stop()
+    writer.join()
+
+    urls = ['http://example.com/users/{}'.format(i) for i in range(200)] + ['http://example.com/health']
+    traces = []
+    for i in range(10000):
+        root = Span(None, 'web.request', trace_id=i + 1, span_id=1)
+        root.set_tag('http.url', urls[i % len(urls)])
+        child = Span(None, 'db.query', trace_id=i + 1, span_id=2, parent_id=1)
+        traces.append([child, root])
+
+    benchmark(writer._apply_filters, traces)
+
+
+@pytest.mark.parametrize('limiter_class', [RateLimiter, ShardedRateLimiter])
+@pytest.mark.parametrize('rate_limit', [100, 100000])
+@pytest.mark.parametrize('threads', [1, 8, 32])
+def test_rate_limiter_is_allowed(benchmark, limiter_class, rate_limit, threads):
+    # every thread checks the same number of root spans against a shared limiter
+    calls = 32000 // threads
+
+    def check(limiter):
+        for _ in range(calls):
+            limiter.is_allowed()
+
+    def func():
+        limiter = limiter_class(rate_limit)
+        workers = [threading.Thread(target=check, args=(limiter, )) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+    benchmark(func)
+
+
+def _sdk_span(span):
+    # conversion to a full `opentelemetry.sdk.trace.Span` done before `SpanView`
+    from opentelemetry import trace as trace_api
+    from opentelemetry.sdk import trace as trace_sdk
+
+    context = trace_api.SpanContext(trace_id=span.trace_id, span_id=span.span_id)
+    parent = trace_api.SpanContext(trace_id=span.trace_id, span_id=span.parent_id) if span.parent_id else None
+    attributes = {}
+    if span.span_type is not None:
+        attributes['component'] = span.span_type
+    if span.service is not None:
+        attributes['service.name'] = span.service
+    if span.resource is not None:
+        attributes['resource.name'] = span.resource
+    for key, value in span.meta.items():
+        attributes[{'out.host': 'peer.hostname', 'out.port': 'peer.port'}.get(key, key)] = value
+    otel_span = trace_sdk.Span(name=span.name, context=context, parent=parent, attributes=attributes)
+    otel_span.start_time = int(span.start * 10**9)
+    otel_span.end_time = int((span.start + span.duration) * 10**9)
+    return otel_span
+
+
+def _export_10k_spans():
+    spans = []
+    for i in range(10000):
+        span = Span(None, 'postgres.query', service='db', resource='SELECT 1', span_type='sql', parent_id=i or None)
+        span.set_tag('out.host', 'localhost')
+        span.set_tag('out.port', 5432)
+        span.set_tag('sql.query', 'SELECT 1')
+        span.duration = 0.001
+        spans.append(span)
+
+    def export(otel_spans):
+        # read what a typical SDK exporter reads
+        for otel_span in otel_spans:
+            otel_span.name, otel_span.context.trace_id, otel_span.parent
+            otel_span.start_time, otel_span.end_time
+            dict(otel_span.attributes.items())
+
+    return spans, export
+
+
+@pytest.mark.parametrize('conversion', ['sdk_span', 'span_view'])
+def test_otel_export_10k_spans(benchmark, conversion):
+    from oteltrace.api_otel_exporter import SpanView
+
+    spans, export = _export_10k_spans()
+    convert = _sdk_span if conversion == 'sdk_span' else SpanView
+    benchmark(lambda: export([convert(span) for span in spans]))
+
+
+def _flush_batch(n_traces=1000):
+    traces = []
+    for _ in range(n_traces):
+        root = Span(None, 'flask.request', service='web', resource='GET /users', span_type='web')
+        root.set_tag('http.method', 'GET')
+        root.set_tag('http.status_code', 200)
+        root.duration = 0.01
+        trace = [root]
+        for _ in range(4):
+            span = Span(None, 'postgres.query', service='db', resource='SELECT * FROM users',
+                        trace_id=root.trace_id, parent_id=root.span_id)
+            span.set_tag('sql.query', 'SELECT * FROM users')
+            span.set_tag('out.host', 'localhost')
+            span.set_metric('db.rowcount', 10)
+            span.duration = 0.001
+            trace.append(span)
+        traces.append(trace)
+    return traces
+
+
+@pytest.mark.parametrize('encoding', ['to_dict', 'columnar'])
+def test_encode_flush_batch(benchmark, encoding):
+    import json
+    from oteltrace.encoding import encode_traces
+
+    traces = _flush_batch()
+    n_spans = sum(len(trace) for trace in traces)
+
+    if encoding == 'to_dict':
+        def encode():
+            return [span.to_dict() for trace in traces for span in trace]
+        size = len(json.dumps(encode()).encode('utf-8'))
+    else:
+        def encode():
+            return encode_traces(traces)
+        size = encode().nbytes
+
+    benchmark.extra_info['bytes_per_span'] = size / n_spans
+    result = benchmark(encode)
+    benchmark.extra_info['encode_ns_per_span'] = benchmark.stats.stats.mean * 1e9 / n_spans
+    assert result
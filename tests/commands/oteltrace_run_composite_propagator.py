@@ -0,0 +1,24 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from oteltrace.propagation.http import HTTPPropagator
+from oteltrace.propagation.b3 import B3HTTPPropagator
+from oteltrace.propagation.composite import CompositeHTTPPropagator
+from oteltrace.propagation.datadog import DatadogHTTPPropagator
+
+if __name__ == '__main__':
+    propagator = HTTPPropagator()
+    assert isinstance(propagator, CompositeHTTPPropagator)
+    assert [type(p) for p in propagator.propagators] == [B3HTTPPropagator, DatadogHTTPPropagator]
+    print('Test success')
@@ -0,0 +1,21 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from oteltrace import tracer
+
+if __name__ == '__main__':
+    assert tracer.writer.flush_max_spans == 200
+    assert tracer.writer.flush_max_bytes == 65536
+    assert tracer.writer.flush_max_age == 0.5
+    print('Test success')
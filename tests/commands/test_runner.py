@@ -248,3 +248,30 @@ class OteltraceRunTest(BaseTestCase):
                 ['oteltrace-run', 'python', 'tests/commands/oteltrace_run_propagator.py']
             )
             assert out.startswith(b'Test success')
+
+    def test_composite_propagator(self):
+        """ Ensure several comma-separated propagators are configured by priority
+        """
+        oteltrace_run_conf = {
+            'OTEL_TRACER_PROPAGATOR': 'b3, Datadog',
+        }
+        with self.override_env(oteltrace_run_conf):
+            out = subprocess.check_output(
+                ['oteltrace-run', 'python', 'tests/commands/oteltrace_run_composite_propagator.py']
+            )
+            assert out.startswith(b'Test success')
+
+    def test_flush_thresholds_from_env(self):
+        """
+        OPENTELEMETRY_FLUSH_* variables configure when the writer flushes
+        """
+        oteltrace_run_conf = {
+            'OPENTELEMETRY_FLUSH_MAX_SPANS': '200',
+            'OPENTELEMETRY_FLUSH_MAX_BYTES': '65536',
+            'OPENTELEMETRY_FLUSH_MAX_AGE': '0.5',
+        }
+        with self.override_env(oteltrace_run_conf):
+            out = subprocess.check_output(
+                ['oteltrace-run', 'python', 'tests/commands/oteltrace_run_flush_thresholds.py']
+            )
+            assert out.startswith(b'Test success')
@@ -0,0 +1,275 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+from oteltrace.internal.export import ExportPipeline, EXPORT_SUCCESS, EXPORT_RETRY, EXPORT_DROP
+
+
+class SlowExporter(object):
+    """Fake exporter taking ``delay`` seconds per batch and failing the first ``failures`` calls"""
+
+    def __init__(self, delay=0, failures=0, result=EXPORT_RETRY):
+        self.delay = delay
+        self.failures = failures
+        self.result = result
+        self.batches = []
+        self.calls = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            time.sleep(self.delay)
+            if call <= self.failures:
+                if self.result is None:
+                    raise Exception('export failed')
+                return self.result
+            with self._lock:
+                self.batches.append(batch)
+            return EXPORT_SUCCESS
+        finally:
+            with self._lock:
+                self.concurrent -= 1
+
+
+def test_export_pipeline_exports_in_background():
+    exporter = SlowExporter(delay=0.05)
+    pipeline = ExportPipeline(exporter, workers=2, max_in_flight=8)
+
+    start = time.time()
+    for i in range(4):
+        assert pipeline.submit([i])
+    # submitting does not wait for the exporter
+    assert time.time() - start < 0.05
+
+    assert pipeline.flush(timeout=5)
+    assert sorted(exporter.batches) == [[0], [1], [2], [3]]
+    assert exporter.max_concurrent == 2
+    assert pipeline.in_flight == 0
+    assert pipeline.exported == 4
+    assert pipeline.dropped == 0
+    pipeline.shutdown()
+
+
+def test_export_pipeline_backpressure():
+    exporter = SlowExporter(delay=0.1)
+    pipeline = ExportPipeline(exporter, workers=1, max_in_flight=2)
+
+    start = time.time()
+    for i in range(3):
+        assert pipeline.submit([i])
+    # the third batch had to wait for the first one to be exported
+    assert time.time() - start >= 0.09
+    assert pipeline.in_flight <= 2
+
+    # a full pipeline drops the batch after the timeout
+    assert pipeline.submit([3])
+    assert not pipeline.submit([4], timeout=0.01)
+    assert pipeline.dropped == 1
+
+    assert pipeline.flush(timeout=5)
+    assert exporter.batches == [[0], [1], [2], [3]]
+    pipeline.shutdown()
+
+
+def test_export_pipeline_retry():
+    exporter = SlowExporter(failures=2)
+    pipeline = ExportPipeline(exporter, workers=1, max_retries=3, backoff_base=0.01)
+
+    assert pipeline.submit(['a'])
+    deadline = time.time() + 5
+    while not exporter.batches and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert exporter.batches == [['a']]
+    assert exporter.calls == 3
+    assert pipeline.retries == 2
+    assert pipeline.exported == 1
+    assert pipeline.dropped == 0
+    assert pipeline.pending_retries == 0
+    pipeline.shutdown()
+
+
+def test_export_pipeline_retry_exception():
+    exporter = SlowExporter(failures=1, result=None)
+    pipeline = ExportPipeline(exporter, workers=1, backoff_base=0.01)
+
+    assert pipeline.submit(['a'])
+    deadline = time.time() + 5
+    while not exporter.batches and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert exporter.batches == [['a']]
+    assert pipeline.retries == 1
+    pipeline.shutdown()
+
+
+def test_export_pipeline_max_retries():
+    exporter = SlowExporter(failures=10)
+    pipeline = ExportPipeline(exporter, workers=1, max_retries=2, backoff_base=0.01)
+
+    assert pipeline.submit(['a'])
+    deadline = time.time() + 5
+    while not pipeline.dropped and time.time() < deadline:
+        time.sleep(0.01)
+
+    # first attempt and two retries
+    assert exporter.calls == 3
+    assert pipeline.retries == 2
+    assert pipeline.dropped == 1
+    assert exporter.batches == []
+    pipeline.shutdown()
+
+
+def test_export_pipeline_not_retryable():
+    exporter = SlowExporter(failures=1, result=EXPORT_DROP)
+    pipeline = ExportPipeline(exporter, workers=1, backoff_base=0.01)
+
+    assert pipeline.submit(['a'])
+    assert pipeline.flush(timeout=5)
+    assert exporter.calls == 1
+    assert pipeline.retries == 0
+    assert pipeline.dropped == 1
+    assert pipeline.pending_retries == 0
+    pipeline.shutdown()
+
+
+def test_export_pipeline_retry_buffer_capped():
+    exporter = SlowExporter(failures=10)
+    pipeline = ExportPipeline(exporter, workers=1, retry_buffer_size=2, backoff_base=60)
+
+    for i in range(4):
+        assert pipeline.submit([i])
+    assert pipeline.flush(timeout=5)
+
+    # the two oldest failed batches were dropped to make room
+    assert pipeline.pending_retries == 2
+    assert [b.items for b in pipeline._retry_buffer] == [[2], [3]]
+    assert pipeline.dropped == 2
+    pipeline.shutdown()
+
+
+def test_export_pipeline_shutdown_retries():
+    exporter = SlowExporter(failures=1)
+    pipeline = ExportPipeline(exporter, workers=1, backoff_base=60)
+    done = []
+
+    assert pipeline.submit(['a'], done=lambda: done.append('a'))
+    assert pipeline.flush(timeout=5)
+    assert pipeline.pending_retries == 1
+
+    # the failed batch is exported once more instead of waiting for its backoff
+    assert pipeline.shutdown(timeout=5)
+    assert exporter.batches == [['a']]
+    assert pipeline.retries == 1
+    assert pipeline.exported == 1
+    assert pipeline.dropped == 0
+    assert pipeline.pending_retries == 0
+    assert done == ['a']
+
+
+def test_export_pipeline_shutdown_retries_failing():
+    exporter = SlowExporter(failures=10)
+    pipeline = ExportPipeline(exporter, workers=1, max_retries=5, backoff_base=60)
+    done = []
+
+    assert pipeline.submit(['a'], done=lambda: done.append('a'))
+    assert pipeline.flush(timeout=5)
+
+    # the last attempt fails, the batch is dropped and not kept for a retry
+    assert pipeline.shutdown(timeout=5)
+    assert exporter.calls == 2
+    assert exporter.batches == []
+    assert pipeline.dropped == 1
+    assert pipeline.pending_retries == 0
+    assert done == ['a']
+
+
+def test_export_pipeline_shutdown_retries_timeout():
+    exporter = SlowExporter(delay=0.2, failures=2)
+    pipeline = ExportPipeline(exporter, workers=1, backoff_base=60)
+    done = []
+
+    for i in range(2):
+        assert pipeline.submit([i], done=lambda i=i: done.append(i))
+    assert pipeline.flush(timeout=5)
+    assert pipeline.pending_retries == 2
+
+    # the first batch is exported after the deadline, there is no time left for the second one
+    assert not pipeline.shutdown(timeout=0.1)
+    assert exporter.batches == [[0]]
+    assert pipeline.exported == 1
+    assert pipeline.dropped == 1
+    assert pipeline.pending_retries == 0
+    assert sorted(done) == [0, 1]
+
+
+def test_export_pipeline_flush_timeout():
+    exporter = SlowExporter(delay=0.2)
+    pipeline = ExportPipeline(exporter, workers=1)
+
+    assert pipeline.submit([1])
+    assert not pipeline.flush(timeout=0.01)
+    assert pipeline.in_flight == 1
+    assert pipeline.shutdown(timeout=5)
+    assert exporter.batches == [[1]]
+
+
+def test_export_pipeline_done_callback():
+    exporter = SlowExporter(failures=1, result=EXPORT_RETRY)
+    pipeline = ExportPipeline(exporter, workers=1, max_retries=1, backoff_base=0.01)
+    done = []
+
+    assert pipeline.submit(['a'], done=lambda: done.append('a'))
+    assert pipeline.flush(timeout=5)
+    # not done while waiting to be retried
+    assert done == []
+
+    deadline = time.time() + 5
+    while not done and time.time() < deadline:
+        time.sleep(0.01)
+    assert done == ['a']
+    assert exporter.batches == [['a']]
+
+    # dropped batches are done too
+    exporter.failures, exporter.result = exporter.calls + 1, EXPORT_DROP
+    assert pipeline.submit(['b'], done=lambda: done.append('b'))
+    assert pipeline.flush(timeout=5)
+    assert done == ['a', 'b']
+    assert pipeline.dropped == 1
+    pipeline.shutdown()
+
+
+def test_export_pipeline_after_fork():
+    exporter = SlowExporter(delay=0.5)
+    pipeline = ExportPipeline(exporter, workers=1, max_in_flight=1)
+    assert pipeline.submit([0])
+
+    # what the fork hook does in the child process, where the worker threads don't exist
+    pipeline._after_fork()
+    assert pipeline.in_flight == 0
+    assert pipeline._threads == []
+    # the slots taken by the parent are free
+    assert pipeline.submit([1], timeout=0.1)
+    assert pipeline.flush(timeout=5)
+    assert [1] in exporter.batches
+    pipeline.shutdown()
@@ -0,0 +1,97 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from oteltrace.internal.intern import InternTable
+from oteltrace.span import Span
+
+
+def _new(s):
+    # build an equal string that is a different object
+    return ''.join(list(s))
+
+
+def test_intern_shares_equal_strings():
+    table = InternTable()
+    first = _new('postgres.query')
+    second = _new('postgres.query')
+    assert first is not second
+
+    assert table.intern(first) is first
+    assert table.intern(second) is first
+    assert len(table) == 1
+    assert 'postgres.query' in table
+
+
+def test_intern_ignores_non_strings():
+    table = InternTable()
+    for value in (None, 42, 1.5, (1, 2), [1, 2]):
+        assert table.intern(value) is value
+    assert len(table) == 0
+
+
+def test_intern_ignores_long_strings():
+    table = InternTable(max_length=8)
+    long_string = _new('select * from users')
+    assert table.intern(long_string) is long_string
+    assert table.intern(_new('select * from users')) is not long_string
+    assert len(table) == 0
+
+
+def test_intern_disabled():
+    table = InternTable(maxsize=0)
+    first = _new('postgres.query')
+    assert table.intern(first) is first
+    assert table.intern(_new('postgres.query')) is not first
+    assert len(table) == 0
+
+
+def test_intern_bounded():
+    table = InternTable(maxsize=100)
+    for i in range(10000):
+        table.intern('resource-{}'.format(i))
+        assert len(table) <= 100
+
+
+def test_intern_keeps_recently_used():
+    table = InternTable(maxsize=10)
+    hot = _new('postgres.query')
+    table.intern(hot)
+    for i in range(1000):
+        table.intern('resource-{}'.format(i))
+        # a string used at least once per rotation is never evicted
+        assert table.intern(_new('postgres.query')) is hot
+
+
+def test_resize():
+    table = InternTable(maxsize=100)
+    for i in range(50):
+        table.intern('resource-{}'.format(i))
+    table.resize(10)
+    assert table.maxsize == 10
+    assert len(table) == 0
+
+
+def test_span_interns_strings():
+    first = Span(None, _new('postgres.query'), service=_new('postgres'), resource=_new('SELECT 1'))
+    first.set_tag(_new('sql.query'), 'SELECT 1')
+    first.set_metric(_new('db.rowcount'), 1)
+    second = Span(None, _new('postgres.query'), service=_new('postgres'), resource=_new('SELECT 1'))
+    second.set_tag(_new('sql.query'), 'SELECT 1')
+    second.set_metric(_new('db.rowcount'), 1)
+
+    assert second.name is first.name
+    assert second.service is first.service
+    assert second.resource is first.resource
+    assert list(second.meta)[0] is list(first.meta)[0]
+    assert list(second.metrics)[0] is list(first.metrics)[0]
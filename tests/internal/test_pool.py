@@ -0,0 +1,146 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import weakref
+
+import pytest
+
+from oteltrace.internal.pool import POOLING_SUPPORTED, SpanPool
+from oteltrace.internal.writer import AgentWriter
+from oteltrace.span import Span
+from oteltrace.tracer import Tracer
+
+pytestmark = pytest.mark.skipif(not POOLING_SUPPORTED, reason='span pooling requires reference counting')
+
+
+def _exported_trace(pool):
+    root = pool.new_span(None, 'web.request', service='web')
+    root.set_tag('http.method', 'GET')
+    root.set_metric('http.status_code', 200)
+    child = pool.new_span(None, 'db.query', trace_id=root.trace_id, parent_id=root.span_id)
+    child._parent = root
+    child.finish()
+    root.finish()
+    return [root, child]
+
+
+def test_new_span_without_released_spans():
+    pool = SpanPool()
+    span = pool.new_span(None, 'web.request', service='web', resource='GET /', span_type='web', span_id=42)
+    assert isinstance(span, Span)
+    assert (span.name, span.service, span.resource, span.span_type, span.span_id) == (
+        'web.request', 'web', 'GET /', 'web', 42,
+    )
+
+
+def test_released_spans_are_reused():
+    pool = SpanPool()
+    trace = _exported_trace(pool)
+    ids = set(map(id, trace))
+    metas = [span.meta for span in trace]
+    pool.release([trace])
+    assert len(pool) == 2
+    del trace
+
+    spans = [pool.new_span(None, 'other', service='svc', trace_id=1, parent_id=2) for _ in range(2)]
+    assert set(map(id, spans)) == ids
+    assert len(pool) == 0
+    # the tags dictionaries read before the spans were reused are left untouched
+    assert metas[0] == {'http.method': 'GET'}
+    for span in spans:
+        assert span.meta is not metas[0] and span.meta is not metas[1]
+        assert (span.name, span.service, span.resource, span.trace_id, span.parent_id) == (
+            'other', 'svc', 'other', 1, 2,
+        )
+        assert span.meta == {}
+        assert span.metrics == {}
+        assert not span.finished
+        assert span.duration is None
+        assert span._parent is None
+
+    # the pool is empty, new spans are created
+    assert id(pool.new_span(None, 'new')) not in ids
+
+
+def test_referenced_spans_are_not_reused():
+    pool = SpanPool()
+    trace = _exported_trace(pool)
+    root, child = trace
+    pool.release([trace])
+    del trace, child
+
+    span = pool.new_span(None, 'other')
+    second = pool.new_span(None, 'other')
+    # the child was reused but the root is still referenced here
+    assert span is not root and second is not root
+    assert root.name == 'web.request'
+    assert root.get_tag('http.method') == 'GET'
+
+
+def test_weakly_referenced_spans_are_not_reused():
+    pool = SpanPool()
+    trace = _exported_trace(pool)
+    ref = weakref.ref(trace[0])
+    pool.release([trace[:1]])
+    del trace
+
+    span = pool.new_span(None, 'other')
+    # the span was discarded rather than reused
+    assert span is not ref()
+    assert ref() is None
+
+
+def test_pool_size_bounded():
+    pool = SpanPool(maxsize=4)
+    pool.release([_exported_trace(pool) for _ in range(10)])
+    assert len(pool) == 4
+
+
+def test_tracer_reuses_exported_spans():
+    class API(object):
+        def __init__(self):
+            self.exported = []
+
+        def send_traces(self, traces, done=None):
+            self.exported.append(sum(map(len, traces)))
+            done()
+            return []
+
+    api = API()
+    tracer = Tracer()
+    tracer.configure(api=api, span_pool_size=100)
+    writer = tracer.writer
+    assert isinstance(writer, AgentWriter)
+    assert writer.span_pool is tracer._span_pool
+    writer.stop()
+
+    ids = set()
+    for _ in range(10):
+        with tracer.trace('web.request'):
+            with tracer.trace('db.query'):
+                pass
+        writer.flush_queue()
+
+    for _ in range(10):
+        with tracer.trace('web.request') as root:
+            ids.add(id(root))
+        writer.flush_queue()
+
+    assert api.exported == [2] * 10 + [1] * 10
+    # the same span objects are used over and over
+    assert len(ids) <= 2
+
+    tracer.configure(span_pool_size=0)
+    assert tracer._span_pool is None
+    assert writer.span_pool is None
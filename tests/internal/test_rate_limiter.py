@@ -14,10 +14,11 @@
 
 from __future__ import division
 import mock
+import threading
 
 import pytest
 
-from oteltrace.internal.rate_limiter import RateLimiter
+from oteltrace.internal.rate_limiter import RateLimiter, ShardedRateLimiter
 from oteltrace.vendor import monotonic
 
 
@@ -203,3 +204,81 @@ def test_rate_liimter_effective_rate_starting_rate():
         assert limiter.effective_rate == 0.75
         assert limiter.current_window == (now + 100.0)
         assert limiter.prev_window_rate == 0.5
+
+
+def test_sharded_rate_limiter_chunks():
+    # DEV: times exactly representable as floats, the refilled tokens don't depend on the current time
+    now = 1024.0
+    with mock.patch('oteltrace.vendor.monotonic.monotonic') as mock_time:
+        mock_time.return_value = now
+        limiter = ShardedRateLimiter(rate_limit=100, chunk_size=10)
+
+        # the first request takes a chunk from the shared bucket
+        assert limiter.is_allowed() is True
+        assert limiter.tokens == 90
+        for _ in range(9):
+            assert limiter.is_allowed() is True
+        assert limiter.tokens == 90
+
+        for _ in range(90):
+            assert limiter.is_allowed() is True
+        assert limiter.tokens == 0
+        assert limiter.is_allowed() is False
+
+        # rejected without the lock until a token is available
+        assert limiter._next_token_at == now + 0.01
+        with mock.patch.object(limiter, '_lock') as lock:
+            assert limiter.is_allowed() is False
+        lock.__enter__.assert_not_called()
+
+        # a smaller chunk is taken when the bucket holds less than a chunk
+        mock_time.return_value = now + 0.0625
+        for _ in range(6):
+            assert limiter.is_allowed() is True
+        assert limiter.is_allowed() is False
+
+
+@pytest.mark.parametrize('rate_limit,threads', [(100, 8), (1000, 16)])
+def test_sharded_rate_limiter_accuracy(rate_limit, threads):
+    # threads keep calling the limiter more often than allowed, against a simulated clock
+    limiter = ShardedRateLimiter(rate_limit=rate_limit)
+    duration = 5
+    steps_per_second = 10
+    calls_per_step = 2 * rate_limit // steps_per_second + 1
+
+    clock = [monotonic.monotonic()]
+    start = clock[0]
+    allowed = [0]
+    turns = [threading.Event() for _ in range(threads)]
+    done = threading.Event()
+    finished = threading.Semaphore(0)
+
+    def worker(turn):
+        while True:
+            turn.wait()
+            turn.clear()
+            if done.is_set():
+                return
+            allowed[0] += sum(limiter.is_allowed() for _ in range(calls_per_step))
+            finished.release()
+
+    workers = [threading.Thread(target=worker, args=(turn, )) for turn in turns]
+    for w in workers:
+        w.start()
+
+    with mock.patch('oteltrace.vendor.monotonic.monotonic', side_effect=lambda: clock[0]):
+        for step in range(duration * steps_per_second):
+            clock[0] = start + step / steps_per_second
+            # DEV: the threads run one after the other so that the test is deterministic
+            for turn in turns:
+                turn.set()
+                finished.acquire()
+
+    done.set()
+    for turn in turns:
+        turn.set()
+    for w in workers:
+        w.join()
+
+    error_bound = limiter.max_tokens + threads * limiter.chunk_size
+    assert abs(allowed[0] - rate_limit * duration) <= error_bound
@@ -0,0 +1,252 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+from oteltrace.encoding import encode_traces
+from oteltrace.internal.relay import Relay, RelayClient, _FRAME_LENGTH, _bind, _path_lock
+from oteltrace.span import Span
+from oteltrace.tracer import Tracer
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets are not available')
+
+
+class StubAPI(object):
+    """API of the exporting process, keeping the exported spans."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def send_traces(self, traces, done=None):
+        with self._lock:
+            for trace in traces:
+                self.spans.extend(trace)
+        if done is not None:
+            done()
+        return []
+
+
+def _wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('relay.sock'))
+
+
+@pytest.fixture
+def tracer():
+    tracer = Tracer()
+    tracer.configure(api=StubAPI(), flush_max_age=0.01)
+    yield tracer
+    tracer.writer.stop()
+    tracer.writer.join()
+
+
+def _trace(name, n_spans=3):
+    return [Span(None, name, trace_id=1, span_id=i + 1) for i in range(n_spans)]
+
+
+def test_client_and_server(tracer, path):
+    relay = Relay(tracer, path)
+    try:
+        assert relay.is_server
+        assert os.path.exists(path)
+
+        client = RelayClient(path)
+        assert client.send_traces([_trace('a'), _trace('b', 2)]) == []
+        assert client.send_traces([]) == []
+        assert client.send_traces([_trace('c', 1)]) == []
+        assert _wait_for(lambda: len(tracer.writer.api.spans) == 6)
+        assert sorted(span.name for span in tracer.writer.api.spans) == ['a'] * 3 + ['b'] * 2 + ['c']
+        assert relay.server.received_batches == 2
+        assert relay.server.received_spans == 6
+    finally:
+        relay.stop()
+    assert not os.path.exists(path)
+
+
+def test_second_relay_is_client(tracer, path):
+    relay = Relay(tracer, path)
+    other = Tracer()
+    other.configure(api=StubAPI(), flush_max_age=0.01)
+    try:
+        other_relay = Relay(other, path)
+        assert not other_relay.is_server
+        assert isinstance(other.writer.api, RelayClient)
+
+        with other.trace('relayed'):
+            pass
+        assert _wait_for(lambda: [span.name for span in tracer.writer.api.spans] == ['relayed'])
+    finally:
+        other.writer.stop()
+        other.writer.join()
+        relay.stop()
+
+
+def test_stale_socket(tracer, path):
+    # left by a process which was killed
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.close()
+
+    relay = Relay(tracer, path)
+    try:
+        assert relay.is_server
+    finally:
+        relay.stop()
+
+
+def test_bind_waits_for_listen(path):
+    # a server which bound the socket and does not listen yet
+    with _path_lock(path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        results = []
+        thread = threading.Thread(target=lambda: results.append(_bind(path)))
+        thread.start()
+        time.sleep(0.1)
+        # the socket is not taken for a stale one
+        assert results == []
+        sock.listen(1)
+    try:
+        thread.join(5)
+        assert results == [None]
+    finally:
+        sock.close()
+
+
+def test_stop_keeps_other_socket(tracer, path):
+    relay = Relay(tracer, path)
+    # the socket was replaced by another server
+    os.unlink(path)
+    listener = _bind(path)
+    try:
+        relay.stop()
+        assert os.path.exists(path)
+    finally:
+        listener.close()
+
+
+def test_client_takes_over(tracer, path):
+    relay = Relay(tracer, path)
+    other = Tracer()
+    api = StubAPI()
+    other.configure(api=api, flush_max_age=0.01)
+    try:
+        other_relay = Relay(other, path)
+        assert not other_relay.is_server
+
+        with other.trace('relayed'):
+            pass
+        assert _wait_for(lambda: [span.name for span in tracer.writer.api.spans] == ['relayed'])
+
+        # the exporting process stops, the next traces are exported by the other process
+        relay.stop()
+        with other.trace('taken.over'):
+            pass
+        assert _wait_for(lambda: [span.name for span in api.spans] == ['taken.over'])
+        assert other_relay.is_server
+        assert other.writer.api is api
+        assert os.path.exists(path)
+    finally:
+        other.writer.stop()
+        other.writer.join()
+        other_relay.stop()
+        relay.stop()
+
+
+def test_frames_split(tracer, path):
+    relay = Relay(tracer, path)
+    try:
+        data = encode_traces([_trace('split')]).to_bytes()
+        frames = (_FRAME_LENGTH.pack(len(data)) + data) * 2
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        for i in range(0, len(frames), 7):
+            sock.sendall(frames[i:i + 7])
+            time.sleep(0.001)
+        # a partial batch is dropped when the connection is closed
+        sock.sendall(frames[:len(frames) // 4])
+        sock.close()
+
+        assert _wait_for(lambda: len(tracer.writer.api.spans) == 6)
+        time.sleep(0.1)
+        assert len(tracer.writer.api.spans) == 6
+        assert relay.server.received_batches == 2
+    finally:
+        relay.stop()
+
+
+def test_client_server_not_running(path):
+    client = RelayClient(path)
+    responses = client.send_traces([_trace('lost')])
+    assert len(responses) == 1
+    assert isinstance(responses[0], socket.error)
+
+    # connects again once the server runs
+    listener = _bind(path)
+    try:
+        assert client.send_traces([_trace('sent')]) == []
+    finally:
+        listener.close()
+
+
+def _worker(tracer, i, n_traces):
+    # the writer of the worker sends its traces to the relay server of the parent process
+    if not isinstance(tracer.writer.api, RelayClient):
+        sys.exit(1)
+    for j in range(n_traces):
+        with tracer.trace('worker-{}-{}'.format(i, j)):
+            with tracer.trace('child-{}-{}'.format(i, j)):
+                pass
+    # DEV: processes started by `multiprocessing` exit without calling the `atexit` hooks
+    tracer.writer.stop()
+    tracer.writer.join()
+    sys.exit(0)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork is not available')
+def test_forked_workers(tracer, path):
+    relay = Relay(tracer, path)
+    try:
+        workers = [multiprocessing.Process(target=_worker, args=(tracer, i, 50)) for i in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+            assert worker.exitcode == 0
+
+        # every span of every worker is exported exactly once, by this process
+        expected = {
+            '{}-{}-{}'.format(kind, i, j): 1 for kind in ('worker', 'child') for i in range(8) for j in range(50)
+        }
+        assert _wait_for(lambda: len(tracer.writer.api.spans) >= len(expected))
+        time.sleep(0.1)
+        assert collections.Counter(span.name for span in tracer.writer.api.spans) == expected
+    finally:
+        relay.stop()
@@ -12,6 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import multiprocessing
+import os
+import sys
+import threading
 import time
 from unittest import TestCase
 
@@ -20,7 +24,9 @@ import pytest
 import mock
 
 from oteltrace.span import Span
-from oteltrace.internal.writer import AgentWriter, Q, Empty
+from oteltrace.internal.writer import AgentWriter, RingBuffer, DROP_NEWEST, DROP_OLDEST
+from oteltrace.tail_sampling import TailSampler, DROP
+from oteltrace.tracer import Tracer
 
 
 class RemoveAllFilter():
@@ -53,6 +59,16 @@ class AddTagFilter():
         return trace
 
 
+class RemoveTracesFilter():
+    def __init__(self, trace_ids):
+        self.trace_ids = trace_ids
+        self.batches = 0
+
+    def process_traces(self, traces):
+        self.batches += 1
+        return [trace for trace in traces if trace[0].trace_id not in self.trace_ids]
+
+
 class DummyAPI(object):
     def __init__(self):
         self.traces = []
@@ -122,6 +138,14 @@ class AgentWriterTests(TestCase):
         self.assertEqual(len(self.api.traces), 0)
         self.assertEqual(filtr.filtered_traces, 0)
 
+    def test_filters_batch(self):
+        filtr = RemoveTracesFilter({1, 3, 5})
+        keep_all = KeepAllFilter()
+        self.create_worker([filtr, keep_all])
+        self.assertEqual(len(self.api.traces), self.N_TRACES - 3)
+        self.assertEqual(keep_all.filtered_traces, self.N_TRACES - 3)
+        self.assertGreaterEqual(filtr.batches, 1)
+
     def test_no_dogstats(self):
         worker = self.create_worker()
         assert worker._ENABLE_STATS is False
@@ -172,30 +196,271 @@ class AgentWriterTests(TestCase):
         assert increment_calls == self.metrics_client.increment.mock_calls
 
 
-def test_queue_full():
-    q = Q(maxsize=3)
-    q.put([1])
-    q.put(2)
-    q.put([3])
-    q.put([4, 4])
-    assert (list(q.queue) == [[1], 2, [4, 4]] or
-            list(q.queue) == [[1], [4, 4], [3]] or
-            list(q.queue) == [[4, 4], 2, [3]])
-    assert q.dropped == 1
-    assert q.accepted == 4
-    assert q.accepted_lengths == 5
-    assert q.accepted_size >= 100
-    dropped, accepted, accepted_lengths, accepted_size = q.reset_stats()
+def test_ring_buffer_get():
+    buf = RingBuffer(maxsize=3)
+    buf.put(1)
+    buf.put(2)
+    assert buf.get() == [1, 2]
+    assert buf.get() == []
+    assert len(buf) == 0
+
+
+def test_ring_buffer_drop_oldest():
+    buf = RingBuffer(maxsize=3)
+    assert buf.put([1])
+    assert buf.put(2)
+    assert buf.put([3])
+    assert buf.put([4, 4])
+    assert buf.get() == [2, [3], [4, 4]]
+    dropped, accepted, accepted_lengths = buf.reset_stats()
     assert dropped == 1
     assert accepted == 4
-    assert accepted_lengths == 5
-    assert accepted_size >= 100
+    # only the drained items are measured
+    assert accepted_lengths == 4
+    assert buf.reset_stats() == (0, 0, 0)
+
+
+def test_ring_buffer_drop_newest():
+    buf = RingBuffer(maxsize=3, drop_policy=DROP_NEWEST)
+    assert buf.put([1])
+    assert buf.put(2)
+    assert buf.put([3])
+    assert not buf.put([4, 4])
+    assert buf.get() == [[1], 2, [3]]
+    dropped, accepted, accepted_lengths = buf.reset_stats()
+    assert dropped == 1
+    assert accepted == 3
+    assert accepted_lengths == 3
+
+
+def test_writer_queue_drop_policy():
+    writer = AgentWriter(queue_drop_policy=DROP_NEWEST)
+    try:
+        assert writer._trace_queue.drop_policy == DROP_NEWEST
+        writer.set_queue_drop_policy(DROP_OLDEST)
+        assert writer._trace_queue.drop_policy == DROP_OLDEST
+        # the policy is kept when the buffer is reset in a forked process
+        writer._reset_queue()
+        assert writer._trace_queue.drop_policy == DROP_OLDEST
+        with pytest.raises(ValueError):
+            writer.set_queue_drop_policy('random')
+    finally:
+        writer.stop()
+        writer.join()
+
+
+def test_ring_buffer_invalid_drop_policy():
+    with pytest.raises(ValueError):
+        RingBuffer(drop_policy='random')
+
+
+def test_ring_buffer_concurrent_put():
+    import threading
+
+    buf = RingBuffer(maxsize=0)
+    n_threads, n_items = 8, 1000
+
+    def produce(i):
+        for j in range(n_items):
+            buf.put((i, j))
+
+    threads = [threading.Thread(target=produce, args=(i, )) for i in range(n_threads)]
+    for t in threads:
+        t.start()
+    items = []
+    while any(t.is_alive() for t in threads):
+        items.extend(buf.get())
+    for t in threads:
+        t.join()
+    items.extend(buf.get())
+
+    assert len(items) == len(set(items)) == n_threads * n_items
+    dropped, accepted, _ = buf.reset_stats()
+    assert dropped == 0
+    assert accepted == n_threads * n_items
+
+
+def test_ring_buffer_concurrent_put_drop_newest():
+    buf = RingBuffer(maxsize=100, drop_policy=DROP_NEWEST)
+    n_threads, n_items = 8, 1000
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=lambda: [buf.put(j) for j in range(n_items)]) for _ in range(n_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    # the newest items were rejected, the buffer never grew past its size
+    assert len(buf.get()) == 100
+    dropped, accepted, _ = buf.reset_stats()
+    assert accepted == 100
+    assert dropped == n_threads * n_items - 100
+    assert buf.pop_dropped() == dropped
+    assert buf.pop_dropped() == 0
+
+
+def test_writer_logs_dropped_traces():
+    api = mock.Mock()
+    api.send_traces.return_value = []
+    writer = AgentWriter(api=api)
+    writer.stop()
+    writer.join()
+    writer._trace_queue = RingBuffer(maxsize=2)
+
+    with mock.patch('oteltrace.internal.writer.log') as log:
+        for i in range(5):
+            writer._trace_queue.put([i])
+        writer.flush_queue()
+        # logged once by the writer thread, with the number of traces dropped
+        assert log.warning.call_count == 1
+        assert log.warning.call_args[0][1:] == (2, 3)
+
+        for i in range(5):
+            writer._trace_queue.put([i])
+        writer.flush_queue()
+        # not logged again before `LOG_ERR_INTERVAL`, the count is kept for the next warning
+        assert log.warning.call_count == 1
+        assert writer._dropped_traces == 3
+
+
+def _wait_for(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def _trace(n_spans, trace_id=1):
+    return [Span(tracer=None, name='name', trace_id=trace_id, span_id=i) for i in range(n_spans)]
+
+
+class AgentWriterFlushTests(TestCase):
+    def create_worker(self, **kwargs):
+        worker = AgentWriter(api=DummyAPI(), **kwargs)
+        self.addCleanup(worker.join)
+        self.addCleanup(worker.stop)
+        return worker
 
+    def test_idle_writer_sleeps(self):
+        worker = self.create_worker()
+        assert worker._flush_timeout() is None
+
+    def test_flush_on_max_spans(self):
+        worker = self.create_worker(flush_max_spans=10, flush_max_age=60)
+        worker.write(_trace(7))
+        assert 0 < worker._flush_timeout() <= 60
+        worker.write(_trace(7))
+        assert _wait_for(lambda: len(worker.api.traces) == 2)
+
+    def test_flush_on_max_bytes(self):
+        worker = self.create_worker(flush_max_bytes=1024, flush_max_age=60)
+        trace = _trace(1)
+        trace[0].set_tag('sql.query', 'x' * 2048)
+        worker.write(trace)
+        assert _wait_for(lambda: len(worker.api.traces) == 1)
+
+    def test_flush_on_max_age(self):
+        worker = self.create_worker(flush_max_age=0.05)
+        worker.write(_trace(1))
+        assert _wait_for(lambda: len(worker.api.traces) == 1)
+        assert _wait_for(lambda: worker._flush_timeout() is None)
+
+    def test_set_flush_thresholds(self):
+        worker = self.create_worker(flush_max_age=60)
+        worker.write(_trace(3))
+        worker.set_flush_thresholds(max_spans=2)
+        assert worker.flush_max_spans == 2
+        assert worker.flush_max_age == 60
+        assert _wait_for(lambda: len(worker.api.traces) == 1)
+
+    def test_stop_flushes(self):
+        worker = self.create_worker(flush_max_age=60)
+        worker.write(_trace(3))
+        worker.stop()
+        worker.join()
+        assert len(worker.api.traces) == 1
+
+    def test_tail_sampler_waits_for_decision(self):
+        worker = self.create_worker(flush_max_age=0.01)
+        worker.tail_sampler = TailSampler(sample_rate=1, decision_wait=0.2)
+        worker.write(_trace(2))
+        assert _wait_for(lambda: worker.tail_sampler.pending == 1)
+        assert len(worker.api.traces) == 0
+        assert 0 < worker._flush_timeout() <= 0.2
+        # the trace is exported once decided, without any other write
+        assert _wait_for(lambda: len(worker.api.traces) == 1)
+        assert worker.tail_sampler.pending == 0
+        assert worker._flush_timeout() is None
+
+    def test_tail_sampler_drops(self):
+        worker = self.create_worker(flush_max_age=0.01)
+        worker.tail_sampler = TailSampler(sample_rate=0, decision_wait=0)
+        error = _trace(2, trace_id=2)
+        error[1].error = 1
+        worker.write(_trace(2))
+        worker.write(error)
+        assert _wait_for(lambda: len(worker.api.traces) == 1)
+        assert worker.api.traces[0] is error
+        assert worker.tail_sampler.counts[DROP] == 1
+
+    def test_stop_flushes_tail_sampler(self):
+        worker = self.create_worker(flush_max_age=60)
+        worker.tail_sampler = TailSampler(sample_rate=1, decision_wait=60)
+        worker.write(_trace(3))
+        worker.stop()
+        worker.join()
+        assert len(worker.api.traces) == 1
 
-def test_queue_get():
-    q = Q(maxsize=3)
-    q.put(1)
-    q.put(2)
-    assert list(q.get()) == [1, 2]
-    with pytest.raises(Empty):
-        q.get(block=False)
+
+class ForkAPI(object):
+    """API reporting the names of the exported spans, and the pid of the process exporting them, to a queue."""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.sent = threading.Event()
+
+    def send_traces(self, traces):
+        self.queue.put((os.getpid(), sorted(span.name for trace in traces for span in trace)))
+        self.sent.set()
+        return []
+
+
+def _traced_child(tracer, i):
+    tracer.writer.set_flush_thresholds(max_age=0.01)
+    with tracer.trace('child-{}'.format(i)):
+        pass
+    # exported by the writer thread of the child, without stopping it
+    sys.exit(0 if tracer.writer.api.sent.wait(10) else 1)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork is not available')
+def test_writer_restarted_in_forked_processes():
+    queue = multiprocessing.Queue()
+    tracer = Tracer()
+    tracer.configure(api=ForkAPI(queue), flush_max_age=60)
+    writer = tracer.writer
+    try:
+        # buffered when the process forks, exported by this process only
+        with tracer.trace('parent'):
+            pass
+
+        children = [multiprocessing.Process(target=_traced_child, args=(tracer, i)) for i in range(8)]
+        for child in children:
+            child.start()
+        exported = dict(queue.get(timeout=10) for _ in children)
+        for child in children:
+            child.join(10)
+            assert child.exitcode == 0
+
+        assert exported == {child.pid: ['child-{}'.format(i)] for i, child in enumerate(children)}
+        assert writer.is_alive()
+    finally:
+        writer.stop()
+        writer.join()
+
+    assert queue.get(timeout=10) == (os.getpid(), ['parent'])
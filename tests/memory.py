@@ -15,37 +15,49 @@
 """
 a script which uses our integratiosn and prints memory statistics.
 a very coarsely grained way of seeing how things are used.
+
+    python -m tests.memory [scenario]
+
+scenarios:
+    integrations     loop over the redis, postgres and memcached integrations (default)
+    buffered-spans   resident memory of 100k buffered spans, with and without string interning
+    span-pool        time and garbage collections of 200k traces, with and without span pooling
+    span-size        size of a span depending on its number of tags, measured with `oteltrace.utils.sizeof`
 """
 
 
 # stdlib
+import gc
 import itertools
 import logging
+import multiprocessing
+import resource
 import time
 import sys
 
 # 3p
-import pylibmc
-import pympler.tracker
-import psycopg2
-import redis
+import psutil
 
 
 # project
 import oteltrace
-from tests.contrib import config
+from oteltrace.internal import intern
+from oteltrace.span import Span
+from oteltrace.utils.sizeof import sizeof
 
 
 # verbosity
 logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 
-oteltrace.patch_all()
-oteltrace.tracer.writer = None
-
 
 class KitchenSink(object):
 
     def __init__(self):
+        import pylibmc
+        import psycopg2
+        import redis
+        from tests.contrib import config
+
         self._redis = redis.Redis(**config.REDIS_CONFIG)
         self._pg = psycopg2.connect(**config.POSTGRES_CONFIG)
 
@@ -79,7 +91,12 @@ class KitchenSink(object):
         self._pylibmc.decr('a', 1)
 
 
-if __name__ == '__main__':
+def integrations():
+    import pympler.tracker
+
+    oteltrace.patch_all()
+    oteltrace.tracer.writer = None
+
     k = KitchenSink()
     t = pympler.tracker.SummaryTracker()
     for i in itertools.count():
@@ -90,3 +107,111 @@ if __name__ == '__main__':
         if i % 500 == 0:
             t.print_diff()
         time.sleep(0.0001)
+
+
+def _buffer_spans(n):
+    """Create ``n`` finished spans like the postgres integration, the strings come from the wire every time."""
+    spans = []
+    for i in range(n):
+        # DEV: decoding creates a new string object each time, like the values read from a driver or a request
+        span = Span(
+            None,
+            b'postgres.query'.decode('utf-8'),
+            service=b'postgres'.decode('utf-8'),
+            resource=b'SELECT * FROM users WHERE id = %s'.decode('utf-8'),
+            span_type=b'sql'.decode('utf-8'),
+        )
+        span.set_tag(b'sql.query'.decode('utf-8'), span.resource)
+        span.set_tag(b'db.name'.decode('utf-8'), b'users'.decode('utf-8'))
+        span.set_tag(b'out.host'.decode('utf-8'), b'localhost'.decode('utf-8'))
+        span.set_metric(b'db.rowcount'.decode('utf-8'), i % 10)
+        span.finish()
+        spans.append(span)
+    return spans
+
+
+def _measure_buffered_spans(n, maxsize):
+    intern.strings.resize(maxsize)
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    spans = _buffer_spans(n)
+    used = process.memory_info().rss - rss
+    print('interning {:>3}: {:>6.1f} MiB for {} spans, {:>4} bytes per span'.format(
+        'on' if maxsize else 'off', used / 2.0 ** 20, len(spans), used // len(spans),
+    ))
+
+
+def buffered_spans(n=100000):
+    # DEV: measure in a new process each time so that memory freed by a run is not reused by the next one
+    for maxsize in (0, intern.InternTable.MAXSIZE):
+        process = multiprocessing.Process(target=_measure_buffered_spans, args=(n, maxsize))
+        process.start()
+        process.join()
+
+
+class _ReleasingWriter(object):
+    def __init__(self, tracer, flush_max_spans=1000):
+        self._tracer = tracer
+        self._flush_max_spans = flush_max_spans
+        self._traces = []
+        self._spans = 0
+
+    def write(self, spans=None, services=None):
+        self._traces.append(spans)
+        self._spans += len(spans)
+        if self._spans >= self._flush_max_spans:
+            traces, self._traces, self._spans = self._traces, [], 0
+            span_pool = self._tracer._span_pool
+            if span_pool is not None:
+                span_pool.release(traces)
+
+
+def _measure_span_pool(n, span_pool_size):
+    tracer = oteltrace.Tracer()
+    tracer.configure(span_pool_size=span_pool_size)
+    tracer.writer = _ReleasingWriter(tracer)
+
+    collections = [s['collections'] for s in gc.get_stats()]
+    start = time.time()
+    for i in range(n):
+        with tracer.trace('web.request', service='web') as root:
+            root.set_tag('http.method', 'GET')
+            with tracer.trace('db.query') as span:
+                span.set_tag('sql.query', 'SELECT 1')
+    elapsed = time.time() - start
+    collections = [s['collections'] - c for s, c in zip(gc.get_stats(), collections)]
+
+    print('span pool {:>3}: {:>5.2f} us per trace, gc collections (gen0, gen1, gen2): {}, max rss {} MiB'.format(
+        'on' if span_pool_size else 'off', elapsed * 1e6 / n, tuple(collections),
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+    ))
+
+
+def span_pool(n=200000):
+    # DEV: measure in a new process each time so that memory freed by a run is not reused by the next one
+    for span_pool_size in (0, 1024):
+        process = multiprocessing.Process(target=_measure_span_pool, args=(n, span_pool_size))
+        process.start()
+        process.join()
+
+
+def span_size():
+    for tags, metrics in ((0, 0), (1, 0), (3, 1), (5, 2), (8, 2), (12, 3)):
+        span = Span(None, 'postgres.query', service='postgres', resource='SELECT 1')
+        for i in range(tags):
+            span.set_tag('tag.{}'.format(i), 'value')
+        for i in range(metrics):
+            span.set_metric('metric.{}'.format(i), i)
+        print('{:>2} tags {} metrics: {:>4} bytes'.format(tags, metrics, sizeof(span)))
+
+
+SCENARIOS = {
+    'integrations': integrations,
+    'buffered-spans': buffered_spans,
+    'span-pool': span_pool,
+    'span-size': span_size,
+}
+
+
+if __name__ == '__main__':
+    SCENARIOS[sys.argv[1] if len(sys.argv) > 1 else 'integrations']()
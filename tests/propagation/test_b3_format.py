@@ -177,3 +177,18 @@ class TestB3Format(unittest.TestCase):
         }
         span_context = FORMAT.extract(carrier)
         self.assertEqual(span_context.span_id, 0)
+
+    def test_extract_ignoring_case(self):
+        """Header names are not case sensitive, and the WSGI form is supported."""
+        for carrier in (
+            {'X-B3-TraceId': self.serialized_trace_id, 'X-B3-SpanId': self.serialized_span_id, 'X-B3-Sampled': '1'},
+            {
+                'HTTP_X_B3_TRACEID': self.serialized_trace_id,
+                'HTTP_X_B3_SPANID': self.serialized_span_id,
+                'HTTP_X_B3_SAMPLED': '1',
+            },
+        ):
+            span_context = FORMAT.extract(carrier)
+            self.assertEqual(span_context.trace_id, int(self.serialized_trace_id, 16))
+            self.assertEqual(span_context.span_id, int(self.serialized_span_id, 16))
+            self.assertEqual(span_context.sampling_priority, 1)
@@ -0,0 +1,134 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+import pytest
+
+from oteltrace.context import Context
+from oteltrace.ext import priority
+from oteltrace.propagation.b3 import B3HTTPPropagator
+from oteltrace.propagation.composite import CompositeHTTPPropagator
+from oteltrace.propagation.datadog import DatadogHTTPPropagator
+from oteltrace.propagation.w3c import W3CHTTPPropagator
+
+W3C_HEADERS = {'traceparent': '00-0000000000000000000000000000000a-000000000000000b-01'}
+B3_HEADERS = {
+    'X-B3-TraceId': '000000000000000000000000000000c0', 'X-B3-SpanId': '00000000000000d0', 'X-B3-Sampled': '1',
+}
+DATADOG_HEADERS = {'x-datadog-trace-id': '1000', 'x-datadog-parent-id': '2000', 'x-datadog-sampling-priority': '2'}
+
+
+def _propagator(*propagators):
+    return CompositeHTTPPropagator(propagators or [W3CHTTPPropagator(), B3HTTPPropagator(), DatadogHTTPPropagator()])
+
+
+@pytest.mark.parametrize('headers,trace_id,span_id', [
+    (W3C_HEADERS, 0xa, 0xb),
+    (B3_HEADERS, 0xc0, 0xd0),
+    (DATADOG_HEADERS, 1000, 2000),
+])
+def test_extract_each_format(headers, trace_id, span_id):
+    carrier = dict(headers, Host='example.com')
+    context = _propagator().extract(carrier)
+    assert context.trace_id == trace_id
+    assert context.span_id == span_id
+
+
+def test_extract_priority():
+    headers = dict(DATADOG_HEADERS, **B3_HEADERS)
+    headers.update(W3C_HEADERS)
+    assert _propagator().extract(headers).trace_id == 0xa
+    assert _propagator(DatadogHTTPPropagator(), W3CHTTPPropagator()).extract(headers).trace_id == 1000
+    assert _propagator(B3HTTPPropagator(), DatadogHTTPPropagator()).extract(headers).trace_id == 0xc0
+
+
+def test_extract_wsgi():
+    environ = {'HTTP_X_DATADOG_TRACE_ID': '1000', 'HTTP_X_DATADOG_PARENT_ID': '2000', 'HTTP_HOST': 'example.com'}
+    context = _propagator().extract(environ)
+    assert context.trace_id == 1000
+    assert context.span_id == 2000
+
+
+class _CountingCarrier(dict):
+    items_calls = 0
+
+    def items(self):
+        self.items_calls += 1
+        return super(_CountingCarrier, self).items()
+
+
+def test_extract_single_pass():
+    headers = _CountingCarrier(B3_HEADERS)
+    assert _propagator().extract(headers).trace_id == 0xc0
+    assert headers.items_calls == 1
+
+
+def test_extract_fallback_on_invalid_format():
+    # the w3c header is invalid and the b3 one raises, the Datadog one is used
+    headers = dict(DATADOG_HEADERS, traceparent='00-zz', **{'x-b3-traceid': 'not hex'})
+    context = _propagator().extract(headers)
+    assert context.trace_id == 1000
+
+
+@pytest.mark.parametrize('headers', [None, {}, {'Host': 'example.com'}])
+def test_extract_no_trace(headers):
+    context = _propagator().extract(headers)
+    assert context.trace_id is None
+    assert context.span_id is None
+
+
+def test_inject_all_formats():
+    context = Context(trace_id=0xc0, span_id=0xd0, sampling_priority=priority.AUTO_KEEP)
+    headers = {}
+    _propagator().inject(context, headers)
+    assert headers == {
+        'traceparent': '00-000000000000000000000000000000c0-00000000000000d0-01',
+        'x-b3-traceid': '000000000000000000000000000000c0',
+        'x-b3-spanid': '00000000000000d0',
+        'x-b3-sampled': '1',
+        'x-datadog-trace-id': str(0xc0),
+        'x-datadog-parent-id': str(0xd0),
+        'x-datadog-sampling-priority': str(priority.AUTO_KEEP),
+    }
+
+    # each propagator extracts the same context from the injected headers
+    for propagator in _propagator().propagators:
+        extracted = propagator.extract(headers)
+        assert (extracted.trace_id, extracted.span_id) == (0xc0, 0xd0)
+
+
+_FUZZ_VALUES = ['', '-', '0', '1', 'zz', '-1', '1e3', ' ', '\t', '0x10', 'ff' * 40, '00-', 'a-b-c-d-e-f']
+
+
+def test_extract_malformed_fuzz():
+    rng = random.Random(0)
+    propagator = _propagator()
+    names = sorted(propagator.HEADERS) + ['HTTP_X_B3_TRACEID', 'B3', 'Traceparent']
+    valid = dict(W3C_HEADERS, b3='00000000000000c0-00000000000000d0-1', **DATADOG_HEADERS)
+    for _ in range(5000):
+        headers = {}
+        for name in rng.sample(names, rng.randint(1, len(names))):
+            value = valid.get(name.lower())
+            if value is None or rng.random() < 0.7:
+                value = rng.choice(_FUZZ_VALUES)
+                if rng.random() < 0.3 and name.lower() in valid:
+                    # truncated or extended valid value
+                    value = valid[name.lower()][:rng.randrange(60)] + value
+            headers[name] = value
+
+        context = propagator.extract(headers)
+        assert isinstance(context, Context)
+        if context.trace_id:
+            assert context.span_id is not None
@@ -15,6 +15,7 @@
 from unittest import TestCase
 from tests.test_tracer import get_dummy_tracer
 
+from oteltrace.ids import RandomIdGenerator
 from oteltrace.propagation.datadog import (
     DatadogHTTPPropagator,
     HTTP_HEADER_TRACE_ID,
@@ -51,6 +52,16 @@ class TestDatadogHttpPropagation(TestCase):
                 span.context._otel_origin
             )
 
+    def test_inject_128_bits_trace_id(self):
+        tracer = get_dummy_tracer()
+        tracer.configure(id_generator=RandomIdGenerator(trace_id_bits=128))
+
+        with tracer.trace('global_root_span') as span:
+            headers = {}
+            DatadogHTTPPropagator().inject(span.context, headers)
+            # the header only holds the lower 64 bits
+            assert int(headers[HTTP_HEADER_TRACE_ID]) == span.trace_id & (2 ** 64 - 1)
+
     def test_extract(self):
         tracer = get_dummy_tracer()
 
@@ -91,3 +102,27 @@ class TestDatadogHttpPropagation(TestCase):
             assert span.parent_id == 5678
             assert span.context.sampling_priority == 1
             assert span.context._otel_origin == 'synthetics'
+
+    def test_extract_ignoring_case(self):
+        headers = [
+            ('Host', 'example.com'),
+            ('X-Datadog-Trace-Id', '1234'),
+            ('X-DATADOG-PARENT-ID', '5678'),
+            ('x-datadog-Sampling-Priority', '1'),
+        ]
+
+        context = DatadogHTTPPropagator().extract(headers)
+        assert context.trace_id == 1234
+        assert context.span_id == 5678
+        assert context.sampling_priority == 1
+        assert context._otel_origin is None
+
+    def test_extract_invalid(self):
+        context = DatadogHTTPPropagator().extract({'x-datadog-trace-id': 'abc', 'x-datadog-parent-id': '5678'})
+        assert context.trace_id is None
+        assert context.span_id is None
+
+    def test_extract_header_value(self):
+        headers = {'Host': 'example.com', 'HTTP_X_DATADOG_TRACE_ID': '1234'}
+        assert DatadogHTTPPropagator.extract_trace_id(headers) == 1234
+        assert DatadogHTTPPropagator.extract_origin(headers) is None
@@ -12,9 +12,43 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from oteltrace.propagation.utils import get_wsgi_header
+from oteltrace.propagation import utils
+from oteltrace.propagation.utils import extract_headers, get_wsgi_header
+
+NAMES = frozenset(['x-b3-traceid', 'traceparent'])
 
 
 class TestPropagationUtils(object):
     def test_get_wsgi_header(self):
         assert get_wsgi_header('x-datadog-trace-id') == 'HTTP_X_DATADOG_TRACE_ID'
+
+    def test_extract_headers_dict(self):
+        headers = {'Host': 'example.com', 'X-B3-TraceId': 'abc', 'TraceParent': '00-1', 'traceparent': '00-2'}
+        assert extract_headers(headers, NAMES) == {'x-b3-traceid': 'abc', 'traceparent': '00-1'}
+
+    def test_extract_headers_wsgi(self):
+        environ = {'REQUEST_METHOD': 'GET', 'wsgi.input': object(), 'HTTP_X_B3_TRACEID': 'abc', 'HTTP_HOST': 'x'}
+        assert extract_headers(environ, NAMES) == {'x-b3-traceid': 'abc'}
+
+    def test_extract_headers_tuples(self):
+        headers = [('traceparent', '00-1'), ('Accept', '*/*'), ('traceparent', '00-2'), (None, 'x')]
+        assert extract_headers(headers, NAMES) == {'traceparent': '00-1'}
+
+    def test_extract_headers_multidict(self):
+        class MultiDict(object):
+            def items(self):
+                return [('TRACEPARENT', '00-1'), ('Traceparent', '00-2')]
+
+        assert extract_headers(MultiDict(), NAMES) == {'traceparent': '00-1'}
+
+    def test_extract_headers_empty(self):
+        assert extract_headers(None, NAMES) == {}
+        assert extract_headers({}, NAMES) == {}
+        assert extract_headers({'traceparent': '00-1'}, frozenset()) == {}
+
+    def test_extract_headers_cache_size(self, monkeypatch):
+        monkeypatch.setattr(utils, '_NORMALIZED_NAMES_SIZE', 10)
+        utils._normalized_names.clear()
+        for i in range(25):
+            assert extract_headers({'X-Header-{}'.format(i): 'value'}, NAMES) == {}
+        assert len(utils._normalized_names) == 5
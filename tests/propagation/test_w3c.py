@@ -0,0 +1,197 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import re
+
+import pytest
+
+from oteltrace.ext import priority
+from oteltrace.context import Context
+from oteltrace.propagation.w3c import TraceState, W3CHTTPPropagator, _parse_traceparent
+
+TRACEPARENT = '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+
+
+@pytest.mark.parametrize('headers', [
+    {'traceparent': TRACEPARENT, 'tracestate': 'foo=1,bar=2'},
+    {'Traceparent': TRACEPARENT, 'TraceState': 'foo=1,bar=2'},
+    {'HTTP_TRACEPARENT': TRACEPARENT, 'HTTP_TRACESTATE': 'foo=1,bar=2'},
+    [('Host', 'example.com'), ('traceparent', TRACEPARENT), ('tracestate', 'foo=1,bar=2')],
+])
+def test_extract(headers):
+    context = W3CHTTPPropagator().extract(headers)
+    assert context.trace_id == 0x0af7651916cd43dd8448eb211c80319c
+    assert context.span_id == 0xb7ad6b7169203331
+    assert context.sampling_priority == priority.AUTO_KEEP
+    assert context.tracestate == {'foo': '1', 'bar': '2'}
+
+
+@pytest.mark.parametrize('traceparent', [
+    None,
+    '',
+    '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331',
+    '00-00000000000000000000000000000000-b7ad6b7169203331-01',
+    '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01-extra',
+    'ff-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01',
+])
+def test_extract_invalid(traceparent):
+    headers = {'host': 'example.com'}
+    if traceparent is not None:
+        headers['traceparent'] = traceparent
+    context = W3CHTTPPropagator().extract(headers)
+    assert context.trace_id is None
+    assert context.span_id is None
+
+
+def test_inject_extract():
+    propagator = W3CHTTPPropagator()
+    context = propagator.extract({'traceparent': TRACEPARENT, 'tracestate': 'foo=1'})
+    headers = {}
+    propagator.inject(context, headers)
+    assert headers == {'traceparent': TRACEPARENT, 'tracestate': 'foo=1'}
+
+
+def test_inject_tracestate_untouched():
+    propagator = W3CHTTPPropagator()
+    tracestate = 'foo=1 ,bar=2,,baz=3'
+    context = propagator.extract({'traceparent': TRACEPARENT, 'tracestate': tracestate})
+    headers = {}
+    propagator.inject(context, headers)
+    # not formatted again
+    assert headers['tracestate'] is tracestate
+
+
+@pytest.mark.parametrize('tracestate', [None, '', 'foo', 'foo=1,foo=2', ','.join('k{}=v'.format(i) for i in range(33))])
+def test_inject_invalid_tracestate(tracestate):
+    propagator = W3CHTTPPropagator()
+    headers = {'traceparent': TRACEPARENT}
+    if tracestate is not None:
+        headers['tracestate'] = tracestate
+    context = propagator.extract(headers)
+    assert context.tracestate == {}
+    headers = {}
+    propagator.inject(context, headers)
+    # the tracestate is not forwarded, but the header is still sent empty
+    assert headers == {'traceparent': TRACEPARENT, 'tracestate': ''}
+
+
+def test_inject_without_tracestate():
+    # contexts which were not extracted from w3c headers have no tracestate
+    headers = {}
+    W3CHTTPPropagator().inject(Context(trace_id=1, span_id=2), headers)
+    assert 'tracestate' not in headers
+
+
+def test_inject_tracestate_dict():
+    context = Context(trace_id=1, span_id=2)
+    context.tracestate = {'foo': '1', 'bar': '2'}
+    headers = {}
+    W3CHTTPPropagator().inject(context, headers)
+    assert headers['tracestate'] == 'foo=1,bar=2'
+
+
+def test_tracestate_lazy():
+    tracestate = TraceState.from_header('lazy=1,bar=2')
+    assert tracestate._members is None
+    assert tracestate['bar'] == '2'
+    assert list(tracestate) == ['lazy', 'bar']
+    assert len(tracestate) == 2
+    assert tracestate.get('baz') is None
+
+
+def test_tracestate_cache():
+    header = 'cached=1,bar=2'
+    assert TraceState.from_header(header) is TraceState.from_header(''.join(['cached=1', ',bar=2']))
+    assert TraceState.from_header('') is TraceState.from_header(None)
+
+
+def test_tracestate_set_delete():
+    tracestate = TraceState.from_header('foo=1,bar=2')
+    updated = tracestate.set('bar', '3')
+    assert list(updated.items()) == [('bar', '3'), ('foo', '1')]
+    assert updated.to_header() == 'bar=3,foo=1'
+    # immutable
+    assert tracestate.to_header() == 'foo=1,bar=2'
+
+    assert tracestate.delete('foo').to_header() == 'bar=2'
+    assert tracestate.delete('baz') is tracestate
+    assert TraceState().set('foo', '1').to_header() == 'foo=1'
+
+    full = TraceState(('k{}'.format(i), 'v') for i in range(32))
+    assert list(full.set('new', 'v'))[0] == 'new'
+    assert len(full.set('new', 'v')) == 32
+    assert 'k31' not in full.set('new', 'v')
+
+    with pytest.raises(ValueError):
+        tracestate.set('Foo', '1')
+    with pytest.raises(ValueError):
+        tracestate.set('foo', 'a,b')
+
+
+@pytest.mark.parametrize('traceparent', [
+    ' \t' + TRACEPARENT + '\t ',
+    'cc-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01-future',
+    'cc-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01-',
+])
+def test_extract_valid_variants(traceparent):
+    context = W3CHTTPPropagator().extract({'traceparent': traceparent})
+    assert context.trace_id == 0x0af7651916cd43dd8448eb211c80319c
+    assert context.span_id == 0xb7ad6b7169203331
+
+
+def _reference_parse(header):
+    """Parse the traceparent header with the regular expression of the specification."""
+    match = re.search(W3CHTTPPropagator._TRACEPARENT_HEADER_FORMAT, header)
+    if not match:
+        return None
+    return (
+        match.group(1), int(match.group(2), 16), int(match.group(3), 16), int(match.group(4), 16),
+        bool(match.group(5)),
+    )
+
+
+# DEV: no newline, `$` of the regular expression matches before a trailing one, header values never contain one
+_FUZZ_ALPHABET = '0123456789abcdefABCDEF- \t+_xz.'
+
+
+def _mutations(rng, header):
+    chars = list(header)
+    operation = rng.randrange(4)
+    position = rng.randrange(len(chars) + 1)
+    if operation == 0 and chars:
+        del chars[min(position, len(chars) - 1)]
+    elif operation == 1:
+        chars.insert(position, rng.choice(_FUZZ_ALPHABET))
+    elif operation == 2 and chars:
+        chars[min(position, len(chars) - 1)] = rng.choice(_FUZZ_ALPHABET)
+    else:
+        chars[position:] = rng.choice(['', '-', '-00', ' ', '\t-x', 'ff'])
+    return ''.join(chars)
+
+
+def test_parse_traceparent_fuzz():
+    rng = random.Random(0)
+    valid = 0
+    for _ in range(20000):
+        header = TRACEPARENT
+        for _ in range(rng.randint(1, 3)):
+            header = _mutations(rng, header)
+        parsed = _parse_traceparent(header)
+        assert parsed == _reference_parse(header), header
+        valid += parsed is not None
+
+        # malformed headers never raise
+        W3CHTTPPropagator().extract({'traceparent': header, 'tracestate': header})
+    assert valid
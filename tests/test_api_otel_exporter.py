@@ -12,13 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
 import mock
 from unittest import TestCase
 
 from oteltrace.span import Span
 from oteltrace.context import Context
+from opentelemetry.sdk.trace.export import SpanExportResult
 from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
-from oteltrace.api_otel_exporter import APIOtel
+from oteltrace.api_otel_exporter import APIOtel, SpanView
+from opentelemetry import trace as trace_api
 
 
 class MockSpan(mock.Mock):
@@ -47,6 +51,8 @@ class TestAPIOtelExporter(TestCase):
         )
 
         api.send_traces(traces)
+        # spans are exported in the background
+        self.assertTrue(api.flush(timeout=5))
 
         # flat traces to 1 dimension tuple
         traces_tuple = tuple([item for sublist in traces for item in sublist])
@@ -125,3 +131,126 @@ class TestAPIOtelExporter(TestCase):
         otel_span = api._span_to_otel_span(span)
 
         self.assertIsNone(otel_span.parent)
+
+
+class SlowExporter(InMemorySpanExporter):
+    def __init__(self, delay, results=()):
+        super(SlowExporter, self).__init__()
+        self.delay = delay
+        self.results = list(results)
+
+    def export(self, spans):
+        time.sleep(self.delay)
+        if self.results:
+            return self.results.pop(0)
+        return super(SlowExporter, self).export(spans)
+
+
+class TestAPIOtelExporterPipeline(TestCase):
+    def test_send_traces_does_not_block(self):
+        exporter = SlowExporter(delay=0.2)
+        api = APIOtel(exporter=exporter)
+        api._span_to_otel_span = lambda span: span
+
+        start = time.time()
+        api.send_traces([(MockSpan(), )])
+        self.assertLess(time.time() - start, 0.2)
+        self.assertEqual(api.pipeline.in_flight, 1)
+
+        self.assertTrue(api.shutdown(timeout=5))
+        self.assertEqual(len(exporter.get_finished_spans()), 1)
+
+    def test_send_traces_retry(self):
+        exporter = SlowExporter(delay=0, results=[SpanExportResult.FAILED_RETRYABLE])
+        api = APIOtel(exporter=exporter)
+        api.pipeline.backoff_base = 0.01
+        api._span_to_otel_span = lambda span: span
+
+        api.send_traces([(MockSpan(), MockSpan())])
+        deadline = time.time() + 5
+        while not exporter.get_finished_spans() and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(len(exporter.get_finished_spans()), 2)
+        self.assertEqual(api.pipeline.retries, 1)
+        self.assertEqual(api.pipeline.dropped, 0)
+        api.shutdown()
+
+    def test_send_traces_not_retryable(self):
+        exporter = SlowExporter(delay=0, results=[SpanExportResult.FAILED_NOT_RETRYABLE])
+        api = APIOtel(exporter=exporter)
+        api._span_to_otel_span = lambda span: span
+
+        api.send_traces([(MockSpan(), )])
+        self.assertTrue(api.flush(timeout=5))
+        self.assertEqual(len(exporter.get_finished_spans()), 0)
+        self.assertEqual(api.pipeline.retries, 0)
+        self.assertEqual(api.pipeline.dropped, 1)
+        api.shutdown()
+
+
+class TestSpanView(TestCase):
+    def setUp(self):
+        self.ctx = Context()
+        self.ctx.sampling_priority = 1
+        self.span = Span(
+            tracer=None,
+            name='test_span',
+            trace_id=1,
+            span_id=2,
+            parent_id=3,
+            context=self.ctx,
+            start=10,
+            service='foo_service',
+            span_type='foo_span',
+        )
+        self.span.duration = 1.5
+
+    def test_attributes(self):
+        self.span.set_tag('out.host', 'opentelemetry.io')
+        self.span.set_tag('out.port', 443)
+        self.span.set_tag('component', 'overridden')
+        view = SpanView(self.span)
+
+        self.assertEqual(dict(view.attributes), {
+            'component': 'overridden',
+            'service.name': 'foo_service',
+            'resource.name': 'test_span',
+            'sampling.priority': 1,
+            'peer.hostname': 'opentelemetry.io',
+            'peer.port': '443',
+        })
+        self.assertEqual(len(view.attributes), 6)
+        self.assertNotIn('out.host', view.attributes)
+        with self.assertRaises(KeyError):
+            view.attributes['out.port']
+
+    def test_attributes_are_read_lazily(self):
+        view = SpanView(self.span)
+        attributes = view.attributes
+        self.assertNotIn('peer.hostname', attributes)
+
+        self.span.set_tag('out.host', 'opentelemetry.io')
+        self.assertEqual(attributes['peer.hostname'], 'opentelemetry.io')
+
+    def test_span_interface(self):
+        view = SpanView(self.span)
+        self.assertEqual(view.name, 'test_span')
+        self.assertEqual(view.get_context().trace_id, 1)
+        self.assertEqual(view.context.span_id, 2)
+        self.assertEqual(view.parent.span_id, 3)
+        self.assertEqual(view.start_time, 10 * 10 ** 9)
+        self.assertEqual(view.end_time, int(11.5 * 10 ** 9))
+        self.assertEqual(view.kind, trace_api.SpanKind.INTERNAL)
+        self.assertEqual(tuple(view.events), ())
+        self.assertEqual(tuple(view.links), ())
+        self.assertFalse(view.is_recording_events())
+
+    def test_read_only(self):
+        view = SpanView(self.span)
+        with self.assertRaises(AttributeError):
+            view.name = 'other'
+        with self.assertRaises(AttributeError):
+            view.foo = 'bar'
+        with self.assertRaises(TypeError):
+            view.attributes['foo'] = 'bar'
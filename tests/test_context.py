@@ -23,7 +23,7 @@ from tests.test_tracer import get_dummy_tracer
 import pytest
 
 from oteltrace.span import Span
-from oteltrace.context import Context
+from oteltrace.context import Context, PartialFlushPolicy
 from oteltrace.constants import HOSTNAME_KEY
 from oteltrace.ext.priority import USER_REJECT, AUTO_REJECT, AUTO_KEEP, USER_KEEP
 
@@ -104,6 +104,17 @@ class TestTracingContext(BaseTestCase):
         assert sampled is True
         assert ctx.sampling_priority is None
 
+    def test_context_not_sampled(self):
+        # a context is not sampled if none of its spans is sampled
+        ctx = Context()
+        span = Span(tracer=None, name='fake_span')
+        span.sampled = False
+        ctx.add_span(span)
+        span.finish()
+        trace, sampled = ctx.get()
+        assert [span] == trace
+        assert sampled is False
+
     def test_context_priority(self):
         # a context is sampled if the spans are sampled
         ctx = Context()
@@ -379,6 +390,152 @@ class TestTracingContext(BaseTestCase):
             set([span.name for span in ctx._trace]),
         )
 
+    def test_partial_flush_then_complete(self):
+        """
+        When calling `Context.get`
+            When partial flushing is enabled
+            When the remaining spans finish after a partial flush
+                We return the spans finished since the partial flush with the trace sampling decision
+        """
+        tracer = get_dummy_tracer()
+        ctx = Context()
+
+        root = Span(tracer=tracer, name='root')
+        ctx.add_span(root)
+        children = []
+        for i in range(4):
+            child = Span(tracer=tracer, name='child_{}'.format(i), trace_id=root.trace_id, parent_id=root.span_id)
+            child._parent = root
+            ctx.add_span(child)
+            children.append(child)
+
+        with self.override_partial_flush(ctx, enabled=True, min_spans=2):
+            for child in children[:2]:
+                child.finished = True
+                ctx.close_span(child)
+            trace, sampled = ctx.get()
+            self.assertEqual(trace, children[:2])
+            self.assertTrue(sampled)
+            self.assertEqual(ctx._trace, [root] + children[2:])
+            self.assertEqual(ctx._finished, [])
+
+            for span in children[2:] + [root]:
+                span.finished = True
+                ctx.close_span(span)
+            trace, sampled = ctx.get()
+            self.assertEqual(trace, [root] + children[2:])
+            self.assertTrue(sampled)
+            self.assertEqual(ctx._trace, [])
+            self.assertEqual(ctx._finished, [])
+
+    def test_partial_flush_order(self):
+        """
+        When calling `Context.get`
+            When partial flushing is enabled
+                We return the finished spans in the order they were added, not the order they finished
+        """
+        ctx = Context()
+        root = Span(tracer=None, name='root')
+        ctx.add_span(root)
+        children = []
+        for i in range(6):
+            child = Span(tracer=None, name='child_{}'.format(i))
+            child._parent = root
+            ctx.add_span(child)
+            children.append(child)
+
+        policy = PartialFlushPolicy(enabled=True, min_spans=3)
+        for i in (4, 1, 2):
+            children[i].finish()
+        trace, _ = ctx.get(policy)
+        self.assertEqual(trace, [children[1], children[2], children[4]])
+        self.assertEqual(ctx._trace, [root, children[0], children[3], children[5]])
+
+        # the root finishes before the remaining children
+        for span in (children[5], root, children[3]):
+            span.finish()
+        trace, _ = ctx.get(policy)
+        self.assertEqual(trace, [root, children[3], children[5]])
+        self.assertEqual(ctx._trace, [children[0]])
+        self.assertIs(ctx.get_current_root_span(), children[0])
+
+        children[0].finish()
+        trace, _ = ctx.get(policy)
+        self.assertEqual(trace, [children[0]])
+        self.assertEqual(ctx._trace, [])
+        self.assertIsNone(ctx.get_current_root_span())
+
+    def test_partial_flush_max_bytes(self):
+        """
+        When calling `Context.get`
+            When the finished spans are estimated to use more than the byte budget
+                We return the finished spans
+        """
+        ctx = Context()
+        root = Span(tracer=None, name='root')
+        ctx.add_span(root)
+        policy = PartialFlushPolicy(enabled=True, min_spans=100, max_bytes=10000)
+
+        small = Span(tracer=None, name='small')
+        small._parent = root
+        ctx.add_span(small)
+        small.finish()
+        self.assertEqual(ctx.get(policy), (None, None))
+
+        big = Span(tracer=None, name='big')
+        big._parent = root
+        ctx.add_span(big)
+        big.set_tag('sql.query', 'x' * 10000)
+        big.finish()
+        trace, sampled = ctx.get(policy)
+        self.assertEqual(trace, [small, big])
+        self.assertTrue(sampled)
+        self.assertEqual(ctx._trace, [root])
+
+        # the estimated size is reset once flushed
+        small = Span(tracer=None, name='small')
+        small._parent = root
+        ctx.add_span(small)
+        small.finish()
+        self.assertEqual(ctx.get(policy), (None, None))
+
+    def test_partial_flush_max_age(self):
+        """
+        When calling `Context.get`
+            When the oldest finished span is older than the maximum age
+                We return the finished spans
+        """
+        ctx = Context()
+        root = Span(tracer=None, name='root')
+        ctx.add_span(root)
+        policy = PartialFlushPolicy(enabled=True, min_spans=100, max_age=10)
+
+        child = Span(tracer=None, name='child')
+        child._parent = root
+        ctx.add_span(child)
+        child.finish()
+        self.assertEqual(ctx.get(policy), (None, None))
+
+        with mock.patch('time.time', return_value=child.start + child.duration + 10):
+            trace, sampled = ctx.get(policy)
+        self.assertEqual(trace, [child])
+        self.assertEqual(ctx._trace, [root])
+
+    def test_partial_flush_policy_disabled(self):
+        # the policy given to `get()` replaces the settings of the context
+        ctx = Context()
+        root = Span(tracer=None, name='root')
+        ctx.add_span(root)
+        child = Span(tracer=None, name='child')
+        child._parent = root
+        ctx.add_span(child)
+        child.finish()
+
+        with self.override_partial_flush(ctx, enabled=True, min_spans=1):
+            self.assertEqual(ctx.get(PartialFlushPolicy(enabled=False, min_spans=1)), (None, None))
+            trace, _ = ctx.get()
+        self.assertEqual(trace, [child])
+
     def test_finished(self):
         # a Context is finished if all spans inside are finished
         ctx = Context()
@@ -445,6 +602,59 @@ class TestTracingContext(BaseTestCase):
 
         assert 100 == len(ctx._trace)
 
+    def test_owner_thread(self):
+        # the thread creating the context updates it without the lock
+        ctx = Context()
+        span = Span(tracer=None, name='fake_span')
+        ctx.add_span(span)
+        ctx.close_span(span)
+        assert ctx._owner is not None
+        assert ctx.get() == ([span], True)
+        assert ctx._owner is not None
+
+    def test_shared_with_another_thread(self):
+        # a context updated by another thread is shared and updated with the lock
+        ctx = Context()
+        ctx.add_span(Span(tracer=None, name='owner_span'))
+
+        def _fill_ctx():
+            ctx.add_span(Span(tracer=None, name='fake_span'))
+
+        thread = threading.Thread(target=_fill_ctx)
+        thread.start()
+        thread.join()
+
+        assert ctx._owner is None
+        ctx.add_span(Span(tracer=None, name='owner_span'))
+        assert [span.name for span in ctx._trace] == ['owner_span', 'fake_span', 'owner_span']
+
+    def test_thread_safe_with_owner(self):
+        # updates of the owner thread racing with the switch to the shared mode are never lost
+        ctx = Context()
+        barrier = threading.Event()
+
+        def _fill_ctx():
+            barrier.wait()
+            for _ in range(1000):
+                span = Span(tracer=None, name='fake_span')
+                ctx.add_span(span)
+                ctx.close_span(span)
+
+        threads = [threading.Thread(target=_fill_ctx) for _ in range(4)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        barrier.set()
+        # the owner thread keeps updating the context while the other threads start
+        _fill_ctx()
+        for t in threads:
+            t.join()
+
+        assert ctx._owner is None
+        assert 5000 == len(ctx._trace)
+        assert 5000 == len(ctx._finished)
+
     def test_clone(self):
         ctx = Context()
         ctx.sampling_priority = 2
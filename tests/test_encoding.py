@@ -0,0 +1,103 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+import pytest
+
+from oteltrace.encoding import SpanBatch, encode_traces
+from oteltrace.span import Span
+
+
+def _traces():
+    root = Span(None, 'web.request', service='web', resource='GET /', span_type='web', start=1000)
+    root.duration = 0.5
+    root.set_tag('http.method', 'GET')
+    root.set_metric('_sampling_priority_v1', 1)
+    child = Span(
+        None, 'postgres.query', service='db', resource='SELECT 1',
+        trace_id=root.trace_id, parent_id=root.span_id, start=1000.1,
+    )
+    child.duration = 0.1
+    child.error = True
+    child.set_tag('sql.query', 'SELECT 1')
+    child.set_tag('out.host', 'localhost')
+    other = Span(None, 'postgres.query', service='db', resource='SELECT 1', start=1001)
+    other.duration = 0.2
+    return [[root, child], [other]]
+
+
+class TestSpanBatch(TestCase):
+    def test_encode(self):
+        traces = _traces()
+        batch = encode_traces(traces)
+
+        assert len(batch) == 3
+        assert list(batch.trace_lengths) == [2, 1]
+        assert list(batch.parent_ids) == [0, traces[0][0].span_id, 0]
+        assert list(batch.errors) == [0, 1, 0]
+        assert list(batch.durations) == [0.5, 0.1, 0.2]
+        # repeated strings are stored once
+        assert batch.strings.count('postgres.query') == 1
+        assert batch.strings.count('SELECT 1') == 1
+        assert batch.names[1] == batch.names[2]
+        assert batch.strings[batch.span_types[1]] is None
+
+    def test_iter_dicts(self):
+        traces = _traces()
+        batch = encode_traces(traces)
+        assert list(batch.iter_dicts()) == [span.to_dict() for trace in traces for span in trace]
+
+    def test_traces(self):
+        traces = _traces()
+        decoded = encode_traces(traces).traces()
+        assert [len(trace) for trace in decoded] == [2, 1]
+        for trace, decoded_trace in zip(traces, decoded):
+            for span, decoded_span in zip(trace, decoded_trace):
+                assert decoded_span.finished
+                assert decoded_span.to_dict() == span.to_dict()
+
+    def test_bytes_round_trip(self):
+        traces = _traces()
+        batch = encode_traces(traces)
+        data = batch.to_bytes()
+        assert len(data) == batch.nbytes
+
+        loaded = SpanBatch.from_bytes(data)
+        assert isinstance(loaded.trace_ids, memoryview)
+        assert len(loaded) == 3
+        assert loaded.strings == batch.strings
+        assert list(loaded.iter_dicts()) == list(batch.iter_dicts())
+
+    def test_128_bits_trace_ids(self):
+        traces = _traces()
+        for span in traces[0]:
+            span.trace_id = (1 << 100) + 42
+        batch = encode_traces(traces)
+        assert list(batch.trace_ids) == [42, 42, traces[1][0].trace_id]
+        assert list(batch.trace_ids_high) == [1 << 36, 1 << 36, 0]
+
+        loaded = SpanBatch.from_bytes(batch.to_bytes())
+        assert [d['trace_id'] for d in loaded.iter_dicts()] == [(1 << 100) + 42, (1 << 100) + 42, traces[1][0].trace_id]
+
+    def test_empty(self):
+        batch = encode_traces([])
+        assert len(batch) == 0
+        loaded = SpanBatch.from_bytes(batch.to_bytes())
+        assert list(loaded.iter_dicts()) == []
+        assert loaded.traces() == []
+
+    def test_from_bytes_invalid(self):
+        with pytest.raises(ValueError):
+            SpanBatch.from_bytes(b'XXXX' + b'\0' * 20)
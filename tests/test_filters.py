@@ -14,7 +14,7 @@
 
 from unittest import TestCase
 
-from oteltrace.filters import FilterRequestsOnUrl
+from oteltrace.filters import FilterRequestsOnUrl, PerTraceFilter, batch_filter
 from oteltrace.span import Span
 from oteltrace.ext.http import URL
 
@@ -47,3 +47,56 @@ class FilterRequestOnUrlTests(TestCase):
         filtr = FilterRequestsOnUrl([r'http://domain\.example\.com', r'http://anotherdomain\.example\.com'])
         trace = filtr.process_trace([span])
         self.assertIsNotNone(trace)
+
+    def test_process_traces(self):
+        traces = []
+        for url in ('http://example.com/health', 'http://example.com/users', None):
+            root = Span(name='Name', tracer=None)
+            if url is not None:
+                root.set_tag(URL, url)
+            traces.append([Span(name='Child', tracer=None, parent_id=1), root])
+        filtr = FilterRequestsOnUrl([r'http://example\.com/health', r'http://example\.com/admin'])
+        self.assertEqual(filtr.process_traces(traces), traces[1:])
+        self.assertEqual(filtr._cache, {'http://example.com/health': True, 'http://example.com/users': False})
+
+    def test_cache_size(self):
+        filtr = FilterRequestsOnUrl(r'http://example\.com/health')
+        filtr.CACHE_SIZE = 10
+        for i in range(25):
+            span = Span(name='Name', tracer=None)
+            span.set_tag(URL, 'http://example.com/{}'.format(i))
+            self.assertIsNotNone(filtr.process_trace([span]))
+        self.assertEqual(len(filtr._cache), 5)
+
+    def test_patterns_not_combined(self):
+        # inline flags and backreferences only apply to their own pattern
+        filtr = FilterRequestsOnUrl([r'(?i)http://EXAMPLE\.com', r'http://(a)\1\.com'])
+        self.assertTrue(filtr._match('http://example.com'))
+        self.assertTrue(filtr._match('http://aa.com'))
+        self.assertFalse(filtr._match('HTTP://aa.com'))
+
+        filtr = FilterRequestsOnUrl([r'http://(a)\1\.com', r'http://(b)\1\.com'])
+        self.assertTrue(filtr._match('http://bb.com'))
+        self.assertFalse(filtr._match('http://ba.com'))
+
+    def test_no_patterns(self):
+        filtr = FilterRequestsOnUrl([])
+        span = Span(name='Name', tracer=None)
+        span.set_tag(URL, 'http://example.com')
+        self.assertIsNotNone(filtr.process_trace([span]))
+
+
+class BatchFilterTests(TestCase):
+    def test_batch_filter(self):
+        filtr = FilterRequestsOnUrl('http://example.com')
+        self.assertIs(batch_filter(filtr), filtr)
+
+    def test_per_trace_filter(self):
+        class DropEven(object):
+            def process_trace(self, trace):
+                return None if trace[0].span_id % 2 == 0 else trace
+
+        traces = [[Span(name='Name', tracer=None, span_id=i)] for i in range(1, 6)]
+        filtr = batch_filter(DropEven())
+        self.assertIsInstance(filtr, PerTraceFilter)
+        self.assertEqual(filtr.process_traces(traces), traces[::2])
@@ -0,0 +1,84 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+
+import pytest
+
+from oteltrace.ids import RandomIdGenerator, SystemRandomIdGenerator
+
+
+@pytest.mark.parametrize('generator_class', [RandomIdGenerator, SystemRandomIdGenerator])
+def test_ids(generator_class):
+    generator = generator_class()
+    span_ids = set(generator.span_id() for _ in range(10000))
+    trace_ids = set(generator.trace_id() for _ in range(10000))
+    assert len(span_ids) == 10000
+    assert len(trace_ids) == 10000
+    assert all(0 <= i < 2 ** 64 for i in span_ids | trace_ids)
+
+
+@pytest.mark.parametrize('generator_class', [RandomIdGenerator, SystemRandomIdGenerator])
+def test_128_bits_trace_ids(generator_class):
+    generator = generator_class(trace_id_bits=128)
+    trace_ids = [generator.trace_id() for _ in range(1000)]
+    assert all(0 <= i < 2 ** 128 for i in trace_ids)
+    # some of them use the upper bits
+    assert any(i >= 2 ** 64 for i in trace_ids)
+    # span ids are still 64 bits
+    assert all(0 <= generator.span_id() < 2 ** 64 for _ in range(1000))
+
+
+@pytest.mark.parametrize('generator_class', [RandomIdGenerator, SystemRandomIdGenerator])
+def test_invalid_trace_id_bits(generator_class):
+    with pytest.raises(ValueError):
+        generator_class(trace_id_bits=32)
+
+
+def test_random_generator_per_thread():
+    generator = RandomIdGenerator()
+    ids = []
+
+    def target():
+        ids.extend(generator.span_id() for _ in range(1000))
+
+    threads = [threading.Thread(target=target) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(ids)) == 8000
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork is not available')
+def test_random_generator_reseeded_after_fork():
+    generator = RandomIdGenerator()
+    generator.span_id()
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            os.write(write_fd, str(generator.span_id()).encode())
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as f:
+        child_id = int(f.read())
+    # without reseeding the child would generate the same id as its parent
+    assert child_id != generator.span_id()
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 from __future__ import division
+import collections
 import contextlib
 import mock
 import re
@@ -25,9 +26,10 @@ from oteltrace.constants import SAMPLING_PRIORITY_KEY, SAMPLE_RATE_METRIC_KEY
 from oteltrace.constants import SAMPLING_AGENT_DECISION, SAMPLING_RULE_DECISION, SAMPLING_LIMIT_DECISION
 from oteltrace.ext.priority import AUTO_KEEP, AUTO_REJECT
 from oteltrace.internal.rate_limiter import RateLimiter
-from oteltrace.sampler import OpenTelemetrySampler, SamplingRule
+from oteltrace.sampler import AdaptiveSampler, OpenTelemetrySampler, SamplingRule
 from oteltrace.sampler import RateSampler, AllSampler, RateByServiceSampler
 from oteltrace.span import Span
+from oteltrace.vendor import monotonic
 
 from .test_tracer import get_dummy_tracer
 
@@ -856,3 +858,130 @@ def test_opentelemetry_sampler_tracer_start_span(dummy_tracer):
     assert span.sampled is True
     assert span._context.sampling_priority is AUTO_KEEP
     assert_sampling_decision_tags(span, rule=1.0)
+
+
+def test_opentelemetry_sampler_rule_matcher():
+    rules = [
+        SamplingRule(sample_rate=0.1, service='db', name='db.query'),
+        SamplingRule(sample_rate=0.2, service=re.compile('^cache')),
+        SamplingRule(sample_rate=0.3, service='web'),
+        SamplingRule(sample_rate=0.4, name='web.request'),
+        SamplingRule(sample_rate=0.5, service=None),
+        SamplingRule(sample_rate=0.6, name=re.compile('.*\\.worker$')),
+        SamplingRule(sample_rate=0.7),
+        SamplingRule(sample_rate=0.8, service='never'),
+    ]
+    sampler = OpenTelemetrySampler(rules=rules)
+    assert sampler._matcher._compiled
+
+    for service in ('db', 'cache-redis', 'web', 'other', None, 1, ['unhashable']):
+        for name in ('db.query', 'web.request', 'celery.worker', 'other', None):
+            span = Span(tracer=None, name=name, service=service)
+            expected = next((rule for rule in rules if rule.matches(span)), None)
+            # the first match is cached
+            assert sampler._matcher.match(span) is expected
+            assert sampler._matcher.match(span) is expected
+
+    # no catch-all rule
+    sampler.rules = rules[:3]
+    assert sampler._matcher.match(Span(tracer=None, name='other', service='other')) is None
+    assert sampler._matcher.match(Span(tracer=None, name='other', service='web')) is rules[2]
+
+
+def test_opentelemetry_sampler_rule_matcher_cache():
+    sampler = OpenTelemetrySampler(rules=[SamplingRule(sample_rate=0.5, name=re.compile('^web'))])
+    for i in range(sampler._matcher.CACHE_SIZE + 10):
+        sampler._matcher.match(Span(tracer=None, name='web.{}'.format(i)))
+    assert len(sampler._matcher._cache) <= sampler._matcher.CACHE_SIZE
+
+
+def test_opentelemetry_sampler_rule_matcher_function():
+    # rules matching with functions are checked for every span
+    pattern = mock.Mock(return_value=True)
+    rule = SamplingRule(sample_rate=0.5, service=pattern)
+    sampler = OpenTelemetrySampler(rules=[rule])
+    assert not sampler._matcher._compiled
+
+    span = Span(tracer=None, name='test.span', service='test')
+    assert sampler._matcher.match(span) is rule
+    assert sampler._matcher.match(span) is rule
+    assert pattern.call_count == 2
+
+    pattern.return_value = False
+    assert sampler._matcher.match(span) is None
+
+
+def _simulate_traffic(sampler, traffic, seconds, start):
+    """Send root spans to the sampler at the given rates per ``(service, name)`` against a fake clock.
+
+    :return: the number of traces kept by key during the last 5 seconds.
+    """
+    kept = collections.Counter()
+    trace_id = 0
+    ticks = 100
+    with mock.patch('oteltrace.vendor.monotonic.monotonic') as mock_time:
+        for tick in range(seconds * ticks):
+            mock_time.return_value = start + tick / ticks
+            for key, rate in traffic.items():
+                # spread the spans of every key evenly over the second
+                n = (tick + 1) * rate // ticks - tick * rate // ticks
+                for _ in range(n):
+                    trace_id += 1
+                    span = Span(tracer=None, service=key[0], name=key[1], trace_id=trace_id)
+                    if sampler.sample(span) and tick >= (seconds - 5) * ticks:
+                        kept[key] += 1
+    return kept
+
+
+def test_adaptive_sampler_target_rate():
+    start = monotonic.monotonic()
+    with mock.patch('oteltrace.vendor.monotonic.monotonic', return_value=start):
+        sampler = AdaptiveSampler(target_rate=50, window=5.0)
+
+    traffic = {
+        ('web', 'GET /health'): 1000,
+        ('web', 'GET /users'): 100,
+        ('web', 'POST /users'): 20,
+        ('worker', 'export'): 1,
+    }
+    kept = _simulate_traffic(sampler, traffic, 20, start)
+
+    # about 50 traces per second are kept in total
+    assert abs(sum(kept.values()) / 5 - 50) <= 5
+    # rare endpoints keep all their traces
+    assert kept[('worker', 'export')] == 5
+    assert sampler.sample_rate('worker', 'export') == 1.0
+    # the rest of the budget is shared between the busy endpoints
+    share = 49 / 3
+    assert sampler.sample_rate('web', 'POST /users') == pytest.approx(share / 20, rel=0.05)
+    assert sampler.sample_rate('web', 'GET /users') == pytest.approx(share / 100, rel=0.05)
+    assert sampler.sample_rate('web', 'GET /health') == pytest.approx(share / 1000, rel=0.05)
+
+
+def test_adaptive_sampler_traffic_change():
+    start = monotonic.monotonic()
+    with mock.patch('oteltrace.vendor.monotonic.monotonic', return_value=start):
+        sampler = AdaptiveSampler(target_rate=10, window=5.0)
+
+    _simulate_traffic(sampler, {('web', 'GET /'): 100}, 10, start)
+    assert sampler.sample_rate('web', 'GET /') == pytest.approx(0.1, rel=0.05)
+
+    # the traffic drops, the sample rate goes up once the window moved past the busy period
+    kept = _simulate_traffic(sampler, {('web', 'GET /'): 5}, 10, start + 10)
+    assert sampler.sample_rate('web', 'GET /') == 1.0
+    assert kept[('web', 'GET /')] == 25
+
+
+def test_adaptive_sampler_max_keys():
+    sampler = AdaptiveSampler(target_rate=10, max_keys=2)
+    for name in ('a', 'b', 'c', 'd'):
+        sampler.sample(Span(tracer=None, service='s', name=name))
+    assert set(sampler._counts) == set([('s', 'a'), ('s', 'b'), AdaptiveSampler.OTHER_KEY])
+    assert sampler._counts[AdaptiveSampler.OTHER_KEY] == 2
+
+
+def test_adaptive_sampler_sample_rate_metric():
+    sampler = AdaptiveSampler(target_rate=10)
+    span = Span(tracer=None, name='test.span')
+    assert sampler.sample(span) is True
+    assert span.get_metric(SAMPLE_RATE_METRIC_KEY) == 1.0
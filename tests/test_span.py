@@ -12,13 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
+import threading
 import time
 
 from unittest.case import SkipTest
 
 from oteltrace.context import Context
 from oteltrace.constants import ANALYTICS_SAMPLE_RATE_KEY
-from oteltrace.span import Span
+from oteltrace.span import NonRecordingSpan, Span
 from oteltrace.ext import errors, priority
 from .base import BaseTracerTestCase
 
@@ -48,6 +50,59 @@ class SpanTestCase(BaseTracerTestCase):
         }
         assert d['meta'] == expected
 
+    def test_tags_small(self):
+        s = Span(tracer=None, name='test.span')
+        # no dictionary until tags are read through `meta`
+        assert s._meta == ()
+        s.set_tag('a', 'a')
+        s.set_tag('b', 'a')
+        s.set_tag('a', 'b')
+        assert s.get_tag('a') == 'b'
+        assert s.get_tag('b') == 'a'
+        assert s.get_tag('c') is None
+        assert type(s._meta) is tuple
+
+        s._remove_tag('a')
+        assert s.get_tag('a') is None
+        assert s.get_tag('b') == 'a'
+        assert s.to_dict()['meta'] == {'b': 'a'}
+
+    def test_tags_small_value_equal_to_key(self):
+        s = Span(tracer=None, name='test.span')
+        s.set_tag('a', 'b')
+        s.set_tag('b', 'c')
+        assert s.get_tag('b') == 'c'
+        assert s.get_tag('c') is None
+        s.set_tag('c', 'd')
+        assert s.meta == {'a': 'b', 'b': 'c', 'c': 'd'}
+
+    def test_tags_grow_to_dict(self):
+        s = Span(tracer=None, name='test.span')
+        for i in range(20):
+            s.set_tag('tag.{}'.format(i), i)
+            s.set_metric('metric.{}'.format(i), i)
+        assert type(s._meta) is dict
+        assert type(s._metrics) is dict
+        assert s.meta == {'tag.{}'.format(i): str(i) for i in range(20)}
+        assert s.metrics == {'metric.{}'.format(i): i for i in range(20)}
+
+    def test_meta_dict_is_live(self):
+        s = Span(tracer=None, name='test.span')
+        s.set_tag('a', 'a')
+        s.set_metric('m', 1)
+        s.meta['b'] = 'b'
+        s.metrics['n'] = 2
+        s.set_tag('c', 'c')
+        assert s.get_tag('b') == 'b'
+        assert s.get_metric('n') == 2
+        assert s.meta == {'a': 'a', 'b': 'b', 'c': 'c'}
+        assert s.to_dict()['meta'] is s.meta
+        assert s.to_dict()['metrics'] == {'m': 1, 'n': 2}
+
+        s.meta = {'d': 'd'}
+        assert s.get_tag('a') is None
+        assert s.get_tag('d') == 'd'
+
     def test_set_valid_metrics(self):
         s = Span(tracer=None, name='test.span')
         s.set_metric('a', 0)
@@ -320,3 +375,80 @@ class SpanTestCase(BaseTracerTestCase):
         s.set_tag('custom.key', None)
 
         assert s.meta == {'custom.key': 'None'}
+
+    def test_set_tag_non_string_key(self):
+        s = Span(tracer=None, name='root.span', service='s')
+        size = s._estimate_size()
+
+        s.set_tag(1, 'a')
+
+        assert s.meta == {1: 'a'}
+        assert s.get_tag(1) == 'a'
+        assert s._estimate_size() == size + 1
+
+    def test_set_tag_concurrent(self):
+        # tags are first stored in a tuple replaced on every write, no write must be lost
+        spans = [Span(tracer=None, name='root.span') for _ in range(2000)]
+        start = threading.Event()
+
+        def set_tags(i):
+            start.wait()
+            for s in spans:
+                s.set_tag('tag.{}'.format(i), i)
+                s.set_metric('metric.{}'.format(i), i)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=set_tags, args=(i, )) for i in range(12)]
+            for t in threads:
+                t.start()
+            start.set()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        for s in spans:
+            assert len(s.meta) == 12
+            assert len(s.metrics) == 12
+
+    def test_estimate_size(self):
+        s = Span(tracer=None, name='root.span', service='s')
+        size = s._estimate_size()
+
+        s.set_tag('custom.key', 'x' * 1000)
+        assert s._estimate_size() == size + len('custom.key') + 1000
+
+        s.set_metric('custom.metric', 1)
+        assert s._estimate_size() > size + 1000
+
+        s.resource = 'SELECT * FROM users'
+        assert s._estimate_size() > size + 1000 + len('SELECT * FROM users')
+
+    def test_non_recording_span(self):
+        ctx = Context()
+        s = NonRecordingSpan(tracer=None, name='root.span', service='s', resource='r', context=ctx)
+        assert s.is_recording is False
+        assert Span(tracer=None, name='root.span').is_recording is True
+
+        s.set_tag('custom.key', 'value')
+        s.set_tags({'other.key': 'value'})
+        s.set_metric('custom.metric', 1)
+        s.set_metrics({'other.metric': 1})
+        s.set_traceback()
+        assert s.meta == {}
+        assert s.metrics == {}
+
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            s.set_exc_info(*sys.exc_info())
+        assert s.error == 1
+        assert s.get_tag(errors.ERROR_MSG) is None
+
+        # the sampling priority is still propagated
+        s.set_tag('manual.keep')
+        assert ctx.sampling_priority == priority.USER_KEEP
+        s.set_tag('manual.drop')
+        assert ctx.sampling_priority == priority.USER_REJECT
@@ -0,0 +1,199 @@
+# Copyright 2019, OpenTelemetry Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from oteltrace.constants import TAIL_SAMPLE_RATE_METRIC_KEY
+from oteltrace.span import Span
+from oteltrace.tracer import Tracer
+from oteltrace.tail_sampling import TailSampler, KEEP_ERROR, KEEP_LATENCY, KEEP_PREDICATE, KEEP_SAMPLED, DROP
+
+
+def _trace(trace_id, duration=0.1, resource='GET /', error=0, n_spans=3):
+    """Return a synthetic finished trace, the root span is the last one like in traces flushed by the context."""
+    root = Span(None, 'web.request', resource=resource, trace_id=trace_id, span_id=1, start=1000)
+    root.duration = duration
+    trace = []
+    for i in range(n_spans - 1):
+        span = Span(None, 'child', trace_id=trace_id, span_id=i + 2, parent_id=1, start=1000)
+        span._parent = root
+        span.duration = duration / 2
+        trace.append(span)
+    trace.append(root)
+    trace[0].error = error
+    return trace
+
+
+def _decided(sampler, traces):
+    return sampler.process_traces(traces, flush=True)
+
+
+def test_keep_errors():
+    sampler = TailSampler(sample_rate=0)
+    error = _trace(1, error=1)
+    assert _decided(sampler, [_trace(2), error, _trace(3)]) == [error]
+    assert sampler.counts[KEEP_ERROR] == 1
+    assert sampler.counts[DROP] == 2
+
+
+def test_keep_slow_traces():
+    sampler = TailSampler(sample_rate=0, latency_percentile=90, history_size=100, min_history=20)
+    # not enough history yet
+    assert _decided(sampler, [_trace(i, duration=1.0 + i) for i in range(19)]) == []
+
+    traces = [_trace(100 + i, duration=0.1 * (i % 10)) for i in range(100)]
+    assert _decided(sampler, traces) == []
+    slow = _trace(1000, duration=0.95)
+    slow_other_resource = _trace(1001, duration=0.95, resource='GET /users')
+    assert _decided(sampler, [slow, _trace(1002, duration=0.85), slow_other_resource]) == [slow]
+    assert sampler.counts[KEEP_LATENCY] == 1
+
+
+def test_latency_percentile_disabled():
+    sampler = TailSampler(sample_rate=0, latency_percentile=None, min_history=1)
+    assert _decided(sampler, [_trace(i, duration=i) for i in range(100)]) == []
+
+
+def test_max_resources():
+    sampler = TailSampler(sample_rate=0, min_history=1, max_resources=2)
+    _decided(sampler, [_trace(i, resource=str(i)) for i in range(10)])
+    assert set(sampler._latencies) == {'0', '1', TailSampler.OTHER_RESOURCE}
+
+
+def test_keep_predicates():
+    def is_checkout(spans):
+        return any(span.resource == 'POST /checkout' for span in spans)
+
+    def broken(spans):
+        raise ValueError()
+
+    sampler = TailSampler(sample_rate=0, predicates=[broken, is_checkout])
+    checkout = _trace(1, resource='POST /checkout')
+    assert _decided(sampler, [checkout, _trace(2)]) == [checkout]
+    assert sampler.counts[KEEP_PREDICATE] == 1
+
+
+def test_sample_rest():
+    sampler = TailSampler(sample_rate=0.25, latency_percentile=None)
+    kept = _decided(sampler, [_trace(i * 7919) for i in range(1, 4001)])
+    assert 800 < len(kept) < 1200
+    assert sampler.counts[KEEP_SAMPLED] == len(kept)
+    assert kept[0][-1].get_metric(TAIL_SAMPLE_RATE_METRIC_KEY) == 0.25
+    assert kept[0][0].get_metric(TAIL_SAMPLE_RATE_METRIC_KEY) is None
+
+
+def test_distributed_trace_root():
+    sampler = TailSampler(sample_rate=1, latency_percentile=50, min_history=1)
+    # the local root span has a remote parent and the parent of the children is not kept, like for pooled spans
+    trace = _trace(1)
+    trace[-1].parent_id = 42
+    for span in trace:
+        span._parent = None
+    assert _decided(sampler, [trace]) == [trace]
+    assert sampler.counts[KEEP_SAMPLED] == 1
+    assert sampler._latencies == {}
+    assert all(span.get_metric(TAIL_SAMPLE_RATE_METRIC_KEY) is None for span in trace)
+
+
+def test_decision_wait():
+    with mock.patch('oteltrace.vendor.monotonic.monotonic') as monotonic:
+        monotonic.return_value = 100
+        sampler = TailSampler(sample_rate=1, decision_wait=2)
+        trace = _trace(1)
+        assert sampler.process_traces([trace]) == []
+        assert sampler.pending == 1
+        assert sampler.next_decision_in() == 2
+
+        monotonic.return_value = 101
+        assert sampler.process_traces([]) == []
+        assert sampler.next_decision_in() == 1
+
+        monotonic.return_value = 102
+        assert sampler.process_traces([]) == [trace]
+        assert sampler.pending == 0
+        assert sampler.next_decision_in() is None
+
+
+def test_chunks_decided_together():
+    with mock.patch('oteltrace.vendor.monotonic.monotonic') as monotonic:
+        monotonic.return_value = 100
+        sampler = TailSampler(sample_rate=0, decision_wait=1)
+        trace = _trace(1, n_spans=5)
+        # the error is in the first chunk, flushed before the root span finished
+        first, second, late = trace[:2], trace[2:4], trace[4:]
+        first[0].error = 1
+        assert sampler.process_traces([first, _trace(2)]) == []
+        assert sampler.process_traces([second]) == []
+        assert sampler.pending == 2
+
+        monotonic.return_value = 101
+        assert sampler.process_traces([]) == [first, second]
+        assert sampler.counts[DROP] == 1
+
+        # chunks flushed after the decision follow it
+        assert sampler.process_traces([late, _trace(2)]) == [late]
+        assert sampler.pending == 0
+
+
+def test_max_bytes():
+    with mock.patch('oteltrace.vendor.monotonic.monotonic') as monotonic:
+        monotonic.return_value = 100
+        sampler = TailSampler(sample_rate=1, decision_wait=60, max_bytes=10 * 1024)
+        traces = [_trace(i, n_spans=4) for i in range(1, 21)]
+        kept = []
+        for trace in traces:
+            kept.extend(sampler.process_traces([trace]))
+            assert sampler.pending_bytes <= 10 * 1024
+
+        # the oldest traces were decided early
+        assert kept == traces[:len(kept)]
+        assert kept
+        assert sampler.process_traces([], flush=True) == traces[len(kept):]
+        assert sampler.pending_bytes == 0
+
+
+def test_max_decisions():
+    sampler = TailSampler(sample_rate=1, max_decisions=10)
+    _decided(sampler, [_trace(i) for i in range(100)])
+    assert list(sampler._decisions) == list(range(90, 100))
+
+
+def test_tracer_tail_sampler():
+    tracer = Tracer()
+    sampler = TailSampler()
+    tracer.configure(api=mock.Mock(), tail_sampler=sampler)
+    writer = tracer.writer
+    assert tracer._tail_sampler is sampler
+    assert writer.tail_sampler is sampler
+
+    # kept when the writer is recreated
+    tracer.configure(api=mock.Mock())
+    assert tracer.writer is not writer
+    assert tracer.writer.tail_sampler is sampler
+
+    tracer.configure(tail_sampler=False)
+    assert tracer._tail_sampler is None
+    assert tracer.writer.tail_sampler is None
+
+    writer.stop()
+    tracer.writer.stop()
+
+
+def test_reset():
+    sampler = TailSampler(sample_rate=1, decision_wait=60)
+    assert sampler.process_traces([_trace(1), _trace(2)]) == []
+    sampler.reset()
+    assert sampler.pending == 0
+    assert sampler.pending_bytes == 0
+    assert sampler.process_traces([], flush=True) == []
@@ -21,9 +21,16 @@ import sys
 
 from unittest.case import SkipTest
 
+import mock
+
 import oteltrace
 from oteltrace.ext import system
 from oteltrace.context import Context
+from oteltrace.ids import RandomIdGenerator
+from oteltrace.internal.writer import DROP_NEWEST
+from oteltrace.sampler import AllSampler
+from oteltrace.span import NonRecordingSpan
+from oteltrace.tracer import Tracer
 
 from .base import BaseTracerTestCase
 from .utils.tracer import DummyTracer
@@ -448,6 +455,94 @@ class TracerTestCase(BaseTracerTestCase):
         self.start_span('child', service='two', child_of=context)
         self.assertSetEqual(self.tracer._services, set(['one', 'two']))
 
+    def test_configure_flush_thresholds(self):
+        tracer = Tracer()
+        tracer.configure(api=mock.Mock(), flush_max_spans=10, flush_max_age=0.5)
+        self.assertEqual(tracer.writer.flush_max_spans, 10)
+        self.assertEqual(tracer.writer.flush_max_age, 0.5)
+
+        # thresholds are kept when the writer is recreated
+        tracer.configure(priority_sampling=True, flush_max_bytes=1024)
+        self.assertEqual(tracer.writer.flush_max_spans, 10)
+        self.assertEqual(tracer.writer.flush_max_bytes, 1024)
+        self.assertEqual(tracer.writer.flush_max_age, 0.5)
+        tracer.writer.stop()
+
+    def test_configure_queue_drop_policy(self):
+        tracer = Tracer()
+        tracer.configure(api=mock.Mock(), queue_drop_policy=DROP_NEWEST)
+        self.assertEqual(tracer.writer._trace_queue.drop_policy, DROP_NEWEST)
+
+        # the policy is kept when the writer is recreated
+        tracer.configure(priority_sampling=True)
+        self.assertEqual(tracer.writer._trace_queue.drop_policy, DROP_NEWEST)
+        tracer.writer.stop()
+
+        with self.assertRaises(ValueError):
+            tracer.configure(queue_drop_policy='random')
+
+    def test_configure_partial_flush(self):
+        self.tracer.configure(partial_flush_enabled=True, partial_flush_min_spans=2)
+        self.assertTrue(self.tracer._partial_flush.enabled)
+        self.assertEqual(self.tracer._partial_flush.min_spans, 2)
+
+        root = self.start_span('root')
+        for _ in range(3):
+            self.start_span('child', child_of=root).finish()
+        # the first two children are flushed, the last one waits for the root span
+        self.assertEqual(len(self.tracer.writer.pop()), 2)
+
+        # settings are updated independently
+        self.tracer.configure(partial_flush_max_bytes=1024)
+        self.assertEqual(self.tracer._partial_flush.min_spans, 2)
+        self.assertEqual(self.tracer._partial_flush.max_bytes, 1024)
+
+        root.finish()
+        self.assertEqual(len(self.tracer.writer.pop()), 2)
+
+    def test_non_recording_spans(self):
+        # spans of traces dropped by the sampler don't record tags
+        self.tracer.configure(sampler=mock.Mock(**{'sample.return_value': False}))
+
+        root = self.tracer.start_span('root', service='s')
+        child = self.tracer.start_span('child', child_of=root)
+        for span in (root, child):
+            self.assertIsInstance(span, NonRecordingSpan)
+            self.assertFalse(span.is_recording)
+            self.assertFalse(span.sampled)
+            span.set_tag('key', 'value')
+            self.assertIsNone(span.get_tag('key'))
+
+        # ids are still set for propagation
+        self.assertEqual(child.trace_id, root.trace_id)
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertEqual(root.context.span_id, child.span_id)
+
+        child.finish()
+        root.finish()
+        self.assertEqual(self.tracer.writer.pop(), [])
+
+        # sampled traces record their tags
+        self.tracer.configure(sampler=AllSampler())
+        with self.tracer.trace('root') as span:
+            self.assertTrue(span.is_recording)
+            self.assertNotIsInstance(span, NonRecordingSpan)
+
+    def test_configure_id_generator(self):
+        id_generator = RandomIdGenerator(trace_id_bits=128)
+        self.tracer.configure(id_generator=id_generator)
+
+        with mock.patch.object(id_generator, 'trace_id', return_value=1 << 100), \
+                mock.patch.object(id_generator, 'span_id', side_effect=[1, 2]):
+            root = self.start_span('root')
+            child = self.start_span('child', child_of=root)
+
+        self.assertEqual(root.trace_id, 1 << 100)
+        self.assertEqual(root.span_id, 1)
+        self.assertEqual(child.trace_id, 1 << 100)
+        self.assertEqual(child.span_id, 2)
+        self.assertEqual(child.parent_id, 1)
+
     def _test_configure_runtime_worker(self):
         # by default runtime worker not started though runtime id is set
         self.assertIsNone(self.tracer._runtime_worker)
@@ -12,9 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
+import weakref
+
 import pytest
 
 from oteltrace import _worker
+from oteltrace.internal import forksafe
 
 
 def test_start():
@@ -70,3 +74,55 @@ def test_restart():
 
     with pytest.raises(RuntimeError):
         w.start()
+
+
+def test_after_fork():
+    # what the fork hook does in the child process, where the thread of the worker doesn't exist
+    running = _worker.PeriodicWorkerThread(name='running')
+    running.start()
+    thread = running._thread
+    running._after_fork()
+    assert running._thread is not thread
+    assert running._thread.name == 'running'
+    assert running.is_alive()
+    running.stop()
+    running.join()
+    thread.join()
+
+    stopped = _worker.PeriodicWorkerThread()
+    stopped.start()
+    stopped.stop()
+    stopped.join()
+    stopped._after_fork()
+    assert stopped._stop.is_set()
+    assert not stopped.is_alive()
+
+    not_started = _worker.PeriodicWorkerThread()
+    not_started._after_fork()
+    assert not not_started.is_alive()
+    not_started.start()
+    not_started.stop()
+    not_started.join()
+
+
+def test_discarded_worker():
+    after_fork = []
+
+    class MyWorker(_worker.PeriodicWorkerThread):
+        def _after_fork(self):
+            after_fork.append(self)
+            super(MyWorker, self)._after_fork()
+
+    w = MyWorker()
+    w.start()
+    w.stop()
+    w.join()
+    ref = weakref.ref(w)
+    assert w in _worker._WORKERS
+    del w
+    gc.collect()
+    assert ref() is None
+    assert not any(isinstance(worker, MyWorker) for worker in _worker._WORKERS)
+
+    forksafe._after_fork_in_child()
+    assert after_fork == []
@@ -182,3 +182,96 @@ class TestHeaders(object):
             'cOnTeNt-TyPe': 'some;value',
         }, span, integration_config)
         assert span.get_tag('http.response.headers.content-type') == 'some;value'
+
+    def test_repeated_header_last_value(self, span, integration_config):
+        """
+        :type span: Span
+        :type integration_config: IntegrationConfig
+        """
+        integration_config.http.trace_headers('Accept')
+        store_request_headers([('Accept', 'text/html'), ('Accept', 'text/plain')], span, integration_config)
+        assert span.get_tag('http.request.headers.accept') == 'text/plain'
+        # like with a dict, spellings of the same header are stored in the same tag
+        store_request_headers([('Accept', 'text/html'), ('accept', 'application/json')], span, integration_config)
+        assert span.get_tag('http.request.headers.accept') == 'application/json'
+
+    def test_headers_object_with_items(self, span, integration_config):
+        """
+        :type span: Span
+        :type integration_config: IntegrationConfig
+        """
+        class Headers(object):
+            # like the multi-dicts of web frameworks, can't be converted to a dict
+            def __init__(self, items):
+                self._items = items
+
+            def items(self):
+                return iter(self._items)
+
+        integration_config.http.trace_headers('Content-Type')
+        store_request_headers(Headers([('Content-Type', 'some;value')]), span, integration_config)
+        assert span.get_tag('http.request.headers.content-type') == 'some;value'
+
+    def test_it_does_not_break_if_headers_are_invalid(self, span, integration_config):
+        integration_config.http.trace_headers('Content-Type')
+        store_request_headers(['Content-Type'], span, integration_config)
+        store_request_headers([(1, 'value'), (b'Content-Type', 'value')], span, integration_config)
+        store_request_headers(42, span, integration_config)
+        assert span.get_tag('http.request.headers.content-type') is None
+
+    def test_it_stores_nothing_if_some_headers_are_invalid(self, span, integration_config):
+        integration_config.http.trace_headers('Content-Type')
+        store_request_headers([('Content-Type', 'value'), 'Accept'], span, integration_config)
+        assert span.get_tag('http.request.headers.content-type') is None
+
+    def test_it_skips_unhashable_header_names(self, span, integration_config):
+        integration_config.http.trace_headers('Content-Type')
+        store_request_headers([(['X-List'], 'value'), ('Content-Type', 'value')], span, integration_config)
+        assert span.get_tag('http.request.headers.content-type') == 'value'
+
+    def test_capture_plan_cache(self, span, integration_config):
+        """
+        :type span: Span
+        :type integration_config: IntegrationConfig
+        """
+        integration_config.http.trace_headers('Content-Type')
+        store_request_headers({'Content-Type': 'a', 'content-type ': 'b', 'Other': 'c'}, span, integration_config)
+        plan = integration_config._header_capture_plan('request')
+        assert plan.tag_names == {
+            'Content-Type': 'http.request.headers.content-type',
+            'content-type ': 'http.request.headers.content-type',
+            'Other': None,
+        }
+        # the plan is kept until the whitelist changes
+        assert integration_config._header_capture_plan('request') is plan
+        assert integration_config._header_capture_plan('response') is not plan
+        integration_config.http.trace_headers('Other')
+        assert integration_config._header_capture_plan('request') is not plan
+        store_request_headers({'Other': 'c'}, span, integration_config)
+        assert span.get_tag('http.request.headers.other') == 'c'
+
+    def test_capture_plan_cache_size(self, integration_config):
+        """
+        :type integration_config: IntegrationConfig
+        """
+        integration_config.http.trace_headers('Content-Type')
+        plan = integration_config._header_capture_plan('request')
+        for i in range(plan.CACHE_SIZE + 10):
+            plan.add('X-Header-{}'.format(i))
+        assert len(plan.tag_names) <= plan.CACHE_SIZE
+
+    def test_global_whitelist(self, span, config, integration_config):
+        """
+        :type span: Span
+        :type integration_config: IntegrationConfig
+        """
+        store_request_headers({'Content-Type': 'a'}, span, integration_config)
+        config.trace_headers('Content-Type')
+        store_request_headers({'Content-Type': 'b'}, span, integration_config)
+        assert span.get_tag('http.request.headers.content-type') == 'b'
+
+        # the whitelist of the integration has precedence
+        integration_config.http.trace_headers('Other')
+        store_request_headers({'Content-Type': 'c', 'Other': 'd'}, span, integration_config)
+        assert span.get_tag('http.request.headers.content-type') == 'b'
+        assert span.get_tag('http.request.headers.other') == 'd'
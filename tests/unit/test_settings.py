@@ -12,7 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from oteltrace.settings import Config, HttpConfig, IntegrationConfig
+import copy
+
+import pytest
+
+from oteltrace import config as global_config
+from oteltrace.settings import Config, HttpConfig, IntegrationConfig, IntegrationConfigSnapshot
 
 from ..base import BaseTestCase
 
@@ -209,3 +214,110 @@ class TestIntegrationConfig(BaseTestCase):
             config = Config()
             ic = IntegrationConfig(config, 'foo')
             self.assertIsNone(ic.get_analytics_sample_rate(use_global_config=True))
+
+
+class TestIntegrationConfigSnapshot(BaseTestCase):
+    def setUp(self):
+        self.config = Config()
+        self.config._add('test', dict(service_name='svc', distributed_tracing=True, error_codes={500}))
+
+    def test_resolved_values(self):
+        self.config.analytics_enabled = True
+        self.config.trace_headers('x-global')
+        snapshot = self.config.test.snapshot()
+
+        assert isinstance(snapshot, IntegrationConfigSnapshot)
+        assert snapshot.integration_name == 'test'
+        assert snapshot.service_name == 'svc'
+        assert snapshot['distributed_tracing'] is True
+        assert snapshot.get('missing', 'default') == 'default'
+        assert 'service_name' in snapshot
+        with pytest.raises(AttributeError):
+            snapshot.missing
+
+        # fallbacks on the global settings
+        assert snapshot.get_analytics_sample_rate(use_global_config=True) == 1.0
+        assert snapshot.get_analytics_sample_rate() is None
+        assert snapshot.trace_query_string is None
+        assert snapshot.header_is_traced('X-Global')
+        assert snapshot.hooks is self.config.test.hooks
+
+    def test_immutable(self):
+        snapshot = self.config.test.snapshot()
+        with pytest.raises(AttributeError):
+            snapshot.service_name = 'other'
+        with pytest.raises(AttributeError):
+            del snapshot.service_name
+        with pytest.raises(TypeError):
+            snapshot['service_name'] = 'other'
+        assert copy.deepcopy(snapshot) is snapshot
+
+    def test_cached_until_changed(self):
+        snapshot = self.config.test.snapshot()
+        assert self.config.test.snapshot() is snapshot
+        # mutable values are shared
+        self.config.test['error_codes'].add(501)
+        assert self.config.test.snapshot() is snapshot
+        assert snapshot.error_codes == {500, 501}
+
+    def test_runtime_overrides(self):
+        snapshot = self.config.test.snapshot()
+
+        self.config.test.service_name = 'attr'
+        assert self.config.test.snapshot().service_name == 'attr'
+
+        self.config.test['service_name'] = 'item'
+        assert self.config.test.snapshot().service_name == 'item'
+
+        del self.config.test['distributed_tracing']
+        assert 'distributed_tracing' not in self.config.test.snapshot()
+        self.config.test.setdefault('distributed_tracing', False)
+        assert self.config.test.snapshot().distributed_tracing is False
+        self.config.test.pop('distributed_tracing')
+        assert 'distributed_tracing' not in self.config.test.snapshot()
+
+        self.config.test.analytics_enabled = True
+        self.config.test.analytics_sample_rate = 0.5
+        assert self.config.test.snapshot().get_analytics_sample_rate() == 0.5
+
+        self.config.test.http.trace_query_string = True
+        assert self.config.test.snapshot().trace_query_string is True
+
+        self.config.test.http.trace_headers('x-integration')
+        assert self.config.test.snapshot().header_is_traced('X-Integration')
+
+        assert self.config.test.snapshot() is not snapshot
+        assert snapshot.service_name == 'svc'
+
+    def test_override_config(self):
+        global_config._add('snapshot_test', dict(service_name='svc', distributed_tracing=True))
+        snapshot = global_config.snapshot_test.snapshot()
+        with self.override_config('snapshot_test', dict(service_name='override', distributed_tracing=False)):
+            assert global_config.snapshot_test.snapshot().service_name == 'override'
+            assert global_config.snapshot_test.snapshot().distributed_tracing is False
+        assert global_config.snapshot_test.snapshot().service_name == 'svc'
+        assert snapshot.service_name == 'svc'
+
+        with self.override_global_config(dict(analytics_enabled=True)):
+            assert global_config.snapshot_test.snapshot().get_analytics_sample_rate(use_global_config=True) == 1.0
+        assert global_config.snapshot_test.snapshot().get_analytics_sample_rate(use_global_config=True) is None
+
+        with self.override_http_config('snapshot_test', dict(trace_query_string=True)):
+            assert global_config.snapshot_test.snapshot().trace_query_string is True
+        assert global_config.snapshot_test.snapshot().trace_query_string is None
+
+    def test_global_overrides(self):
+        snapshot = self.config.test.snapshot()
+        assert snapshot.get_analytics_sample_rate(use_global_config=True) is None
+
+        self.config.analytics_enabled = True
+        assert self.config.test.snapshot().get_analytics_sample_rate(use_global_config=True) == 1.0
+
+        self.config._http.trace_query_string = True
+        assert self.config.test.snapshot().trace_query_string is True
+
+    def test_replaced_integration(self):
+        snapshot = self.config.test.snapshot()
+        self.config._add('test', dict(service_name='new'), merge=False)
+        assert self.config.test.snapshot() is not snapshot
+        assert self.config.test.snapshot().service_name == 'new'